@@ -1,7 +1,22 @@
+import sys
+import time
+# Start-up timing: a cold start (first run in this process) includes every import below
+_script_start = time.perf_counter()
+_cold_start = "backend" not in sys.modules
+
 import streamlit as st
+import io
 import json
-from backend import CallMosaicBackend
-from utils import create_pdf_report
+import uuid
+from backend import get_backend
+from reports import render_report
+from json_stream import IncrementalJSONParser
+from instrumentation import get_tracer, start_metrics_server
+from jobs import FINISHED, get_job_manager, report_output
+from cache import content_hash
+from financial_facts import extract_facts, format_fact_table
+from json_repair import SUMMARY_SCHEMA
+from corpus import guess_metadata
 
 st.set_page_config(page_title="CallMosaic AI", page_icon="📊", layout="wide")
 
@@ -42,105 +57,410 @@ st.markdown("""
 st.markdown('<div class="main-header">CallMosaic AI</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Earnings Transcript Intelligence Engine</div>', unsafe_allow_html=True)
 
-backend = CallMosaicBackend()
+@st.cache_resource
+def load_backend():
+    # One backend (and one pooled keep-alive Groq client) per process, shared by every session and rerun
+    return get_backend()
+
+backend = load_backend()
+start_metrics_server()  # No-op unless METRICS_PORT is set; starts once per process
+show_timings = st.sidebar.checkbox("Show pipeline timings", value=False)
+save_to_corpus = st.sidebar.checkbox("Save analyses to corpus", value=True)
+jobs = get_job_manager()
+session_id = st.session_state.setdefault("session_id", uuid.uuid4().hex)
+setup_span = get_tracer().record("app_cold_start" if _cold_start else "app_rerun", time.perf_counter() - _script_start)
+if show_timings:
+    st.sidebar.caption(f"{'Cold start' if _cold_start else 'Rerun setup'}: {setup_span['seconds']:.3f}s")
+JOB_POLL_SECONDS = 0.5
+REPORT_FORMATS = {"PDF": ("pdf", "application/pdf"), "HTML": ("html", "text/html"), "Markdown": ("md", "text/markdown")}
+
+FIELD_LABELS = {
+    "Business Performance Overview": "Business Performance",
+    "Revenue and Margin Discussion": "Revenue & Margin",
+    "Forward Guidance & Outlook": "Forward Guidance",
+    "Cost & Operational Commentary": "Operational Commentary",
+    "Capital Allocation / Capex Commentary": "Capital Allocation",
+}
+LIST_SECTIONS = {"Key Positives", "Key Risks / Challenges", "Strategic / Growth Initiatives"}
+SECTION_DEFAULTS = {"Management Tone": "Neutral", **{key: [] for key in LIST_SECTIONS}}
+
+def render_section(slot, key, value):
+    """
+    Renders one summary section into its placeholder.
+    """
+    if key == "Management Tone":
+        # Tone
+        tone_color = "gray"
+        tone = str(value)
+        if "Positive" in tone or "Optimistic" in tone:
+            tone_color = "green"
+        elif "Caution" in tone or "Negative" in tone:
+            tone_color = "red"
+        slot.markdown(f"**Management Tone:** <span style='color:{tone_color};font-weight:bold'>{tone}</span>", unsafe_allow_html=True)
+    elif key in FIELD_LABELS:
+        slot.markdown(f"**{FIELD_LABELS[key]}:** {value}")
+    elif key in LIST_SECTIONS:
+        with slot.container():
+            for item in value if isinstance(value, list) else [value]:
+                st.write(f"• {item}")
+    elif key == "Executive One-Page Summary Paragraph":
+        slot.info(value)
+    else:
+        slot.write(value)
+
+def layout_summary() -> dict:
+    """
+    Lays out every summary section up front and returns their placeholders by key,
+    so each one can be filled as its key streams in.
+    """
+    st.subheader("📊 Executive Summary")
+    slots = {"Management Tone": st.empty()}
+
+    st.markdown("---")
+
+    # Layout
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("### 📈 Performance & Financials")
+        slots["Business Performance Overview"] = st.empty()
+        slots["Revenue and Margin Discussion"] = st.empty()
+        slots["Forward Guidance & Outlook"] = st.empty()
+
+        st.markdown("### ✅ Key Positives")
+        slots["Key Positives"] = st.empty()
+
+    with col2:
+        st.markdown("### ⚙️ Operations & Strategy")
+        slots["Cost & Operational Commentary"] = st.empty()
+        slots["Capital Allocation / Capex Commentary"] = st.empty()
+
+        st.markdown("### ⚠️ Key Risks")
+        slots["Key Risks / Challenges"] = st.empty()
+
+    st.markdown("---")
+    st.markdown("### 🚀 Strategic Initiatives")
+    slots["Strategic / Growth Initiatives"] = st.empty()
+
+    st.markdown("### 💬 Q&A Insights")
+    slots["Q&A Insights"] = st.empty()
+
+    st.markdown("---")
+    st.markdown("### 📝 One-Page Summary")
+    slots["Executive One-Page Summary Paragraph"] = st.empty()
+    return slots
+
+def render_partial_summary(output):
+    """
+    Draws the sections completed so far in a job's streamed summary JSON.
+    """
+    slots = layout_summary()
+    for key, value in IncrementalJSONParser().feed(output):
+        if key in slots:
+            render_section(slots[key], key, value)
+
+def render_report_export(summary_data, doc_key):
+    """
+    Report export: rendered only once requested with Prepare Report, then served
+    from the render cache, so reruns don't pay for building the file.
+    """
+    report_format = st.selectbox("Report format", list(REPORT_FORMATS))
+    fmt, mime = REPORT_FORMATS[report_format]
+    prepared = st.session_state.setdefault("prepared_reports", set())
+    if st.button("Prepare Report"):
+        prepared.add((doc_key, fmt))
+    if (doc_key, fmt) in prepared:
+        st.download_button(
+            label=f"Download Report as {report_format}",
+            data=render_report(summary_data, fmt),
+            file_name=f"earnings_summary.{fmt}",
+            mime=mime
+        )
+
+def summarize_job(backend, text, use_cache):
+    """
+    Background job body: streams the summary into the job's output so polling
+    sessions can render sections early, and returns the final (repaired) JSON with its spans.
+    """
+    with get_tracer().collect() as job_spans:
+        parts = []
+        for delta in backend.generate_summary_stream(text, use_cache=use_cache):
+            parts.append(delta)
+            report_output(delta)
+        summary = backend.finalize_summary(text, "".join(parts))
+    return {"summary": summary, "spans": job_spans}
+
+def compare_job(backend, files, labels, use_cache):
+    """
+    Background job body for comparative mode; returns the comparison with its spans.
+    """
+    with get_tracer().collect() as job_spans:
+        result = backend.compare_transcripts([io.BytesIO(data) for data in files], labels, use_cache=use_cache)
+    return {**result, "spans": job_spans}
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def watch_job(job_id, render_output=None):
+    """
+    Shows a running job's progress. As a fragment it re-runs on its own every
+    JOB_POLL_SECONDS, so the rest of the page stays interactive while the job
+    runs; once the job finishes the whole app reruns to show the result.
+    render_output, if given, draws the job's streamed output so far.
+    """
+    job = jobs.get(job_id)
+    if job is None or job["status"] in FINISHED:
+        st.rerun()
+    if render_output is not None:
+        render_output(job["output"])
+    progress = f" ({job['done']} of {job['total']})" if job["total"] else ""
+    st.info(f"⏳ {job['stage']}{progress}...")
+
+def render_comparison_mode():
+    """
+    Comparative mode: N transcripts (e.g. last four quarters or a peer set) are
+    summarized in parallel and compared from their compact summaries.
+    """
+    st.markdown("### 🔀 Compare Transcripts")
+    uploaded_files = st.file_uploader("Upload two or more transcripts (PDF), oldest quarter or focus company first", type="pdf", accept_multiple_files=True)
+    if len(uploaded_files) < 2:
+        st.info("Please upload at least two PDF transcripts to compare.")
+        return []
+
+    labels = [st.text_input(f"Label for {f.name}", value=f.name.rsplit(".", 1)[0], key=f"label:{f.name}") for f in uploaded_files]
+    force_refresh = st.checkbox("Ignore cached analysis", value=False)
+    files = [f.getvalue() for f in uploaded_files]
+    compare_key = content_hash(json.dumps([labels, [content_hash(data) for data in files]]).encode("utf-8"))
+    compare_jobs = st.session_state.setdefault("compare_jobs", {})
+    if st.button("Compare Transcripts"):
+        compare_jobs[compare_key] = jobs.submit(
+            compare_job, backend, files, labels, not force_refresh,
+            owner=session_id, key=None if force_refresh else f"compare:{compare_key}",
+        )
+
+    job_id = compare_jobs.get(compare_key)
+    if job_id is None:
+        # Still running from before a refresh
+        job_id = jobs.find(f"compare:{compare_key}")
+        if job_id is not None:
+            compare_jobs[compare_key] = job_id
+    job = jobs.get(job_id) if job_id is not None else None
+    if job is None:
+        return []
+    if job["status"] not in FINISHED:
+        watch_job(job_id)
+        return []
+    if job["status"] == "failed":
+        st.error(f"Comparison failed: {job['error']}")
+        return []
+
+    result = job["result"]
+    for document in result["documents"]:
+        if document["error"]:
+            st.warning(f"⚠️ {document['label']}: {document['error']}")
+    try:
+        comparison = json.loads(result["comparison"])
+    except json.JSONDecodeError:
+        st.error(result["comparison"])
+        return result["spans"]
+
+    for key, value in comparison.items():
+        st.markdown(f"**{key}:**")
+        if isinstance(value, list):
+            for item in value:
+                st.write(f"• {item}")
+        else:
+            st.write(value)
+
+    with st.expander("Per-document summaries"):
+        for document in result["documents"]:
+            if document["summary"]:
+                st.markdown(f"#### {document['label']}")
+                st.json(document["summary"])
+    return result["spans"]
+
+def describe_transcript(record):
+    label = " ".join(part for part in (record["ticker"], record["quarter"]) if part) or record["title"] or record["doc_id"][:12]
+    return f"{label} ({record['call_date']})" if record["call_date"] else label
+
+def render_corpus_mode():
+    """
+    Corpus mode: keyword search across every stored transcript, and reopening a
+    past one from its stored extraction and summary, with no upload, OCR or LLM call.
+    """
+    st.markdown("### 🗂️ Transcript Corpus")
+    transcripts = backend.corpus.list_transcripts()
+    if not transcripts:
+        st.info("No transcripts stored yet. Analyses are added as they finish (or with batch.py --corpus).")
+        return
+
+    cols = st.columns([3, 1, 1])
+    query = cols[0].text_input("Search every stored call", placeholder='"gross margin" China')
+    ticker = cols[1].selectbox("Ticker", ["All"] + sorted({t["ticker"] for t in transcripts if t["ticker"]}))
+    quarter = cols[2].selectbox("Quarter", ["All"] + sorted({t["quarter"] for t in transcripts if t["quarter"]}, reverse=True))
+    ticker = None if ticker == "All" else ticker
+    quarter = None if quarter == "All" else quarter
+    if query.strip():
+        start = time.perf_counter()
+        hits = backend.corpus.search(query, ticker=ticker, quarter=quarter)
+        st.caption(f"{len(hits)} matching passages in {(time.perf_counter() - start) * 1000:.0f} ms")
+        for hit in hits:
+            st.markdown(f"**{describe_transcript(hit)}:** {hit['snippet']}")
+
+    st.markdown("---")
+    shown = [t for t in transcripts if (ticker is None or t["ticker"] == ticker) and (quarter is None or t["quarter"] == quarter)]
+    choice = st.selectbox("Open a stored transcript", shown, format_func=describe_transcript)
+    if choice is None:
+        return
+    record = backend.corpus.get(choice["doc_id"])
+    extraction = record["extraction"]
+    cols = st.columns(3)
+    cols[0].metric("Pages Processed", extraction["page_count"])
+    cols[1].metric("Total Words", extraction.get("word_count", len(extraction["text"].split())))
+    with st.expander("View Extracted Text"):
+        st.text(extraction["text"][:2000] + "...")
+    if not record["summary"]:
+        st.info("No summary was stored for this transcript.")
+        return
+
+    summary_data = json.loads(record["summary"])
+    st.subheader("📊 Executive Summary")
+    for key in SUMMARY_SCHEMA:
+        render_section(st.empty(), key, summary_data.get(key, SECTION_DEFAULTS.get(key, "N/A")))
+    render_report_export(summary_data, content_hash(extraction["text"].encode("utf-8")))
+
+def render_timings(spans):
+    """
+    Shows the spans recorded during this run: stage, duration and the counters each one reported.
+    """
+    st.markdown("### ⏱️ Pipeline Timings")
+    rows = []
+    for record in sorted(spans, key=lambda r: r["start"]):
+        row = {"Stage": record["name"], "Seconds": round(record["seconds"], 3)}
+        for field in ("pages", "ocr_pages", "chunks", "prompt_tokens", "completion_tokens", "retries", "sleep_seconds", "cache_hit", "corpus_hit", "coalesced", "error"):
+            if record.get(field) is not None:
+                row[field] = record[field]
+        rows.append(row)
+    st.dataframe(rows, use_container_width=True)
+
+mode = st.sidebar.radio("Mode", ["Single transcript", "Compare transcripts", "Search corpus"])
+if mode == "Search corpus":
+    render_corpus_mode()
+    st.stop()
+if mode == "Compare transcripts":
+    compare_spans = render_comparison_mode()
+    if show_timings and compare_spans:
+        render_timings(compare_spans)
+    st.stop()
 
 uploaded_file = st.file_uploader("Upload Earnings Call Transcript (PDF)", type="pdf")
 
 if uploaded_file is not None:
-    with st.spinner("Processing PDF..."):
-        try:
-            # Step 1: Extract
-            extraction_result = backend.extract_text_from_pdf(uploaded_file)
+    with get_tracer().collect() as spans:
+        with st.spinner("Processing PDF..."):
+            try:
+                # Step 1: Extract
+                extraction_result = backend.extract_text_from_pdf(uploaded_file)
             
-            # Validation
-            # Validation
-            if extraction_result.get("is_scanned", False):
-                st.error("🚨 Error: This appears to be a scanned PDF and OCR failed to extract text. Please ensure the file is legible or upload a text-based PDF.")
-                st.stop()
-            elif extraction_result["word_count"] < 800:
-                st.warning(f"⚠️ Warning: Extracted text is very short ({extraction_result['word_count']} words). This might not be a full transcript.")
+                # Validation
+                # Validation
+                if extraction_result.get("is_scanned", False):
+                    st.error("🚨 Error: This appears to be a scanned PDF and OCR failed to extract text. Please ensure the file is legible or upload a text-based PDF.")
+                    st.stop()
+                elif extraction_result["word_count"] < 800:
+                    st.warning(f"⚠️ Warning: Extracted text is very short ({extraction_result['word_count']} words). This might not be a full transcript.")
                 
-            cols = st.columns(3)
-            with cols[0]:
-                st.metric("Pages Processed", extraction_result["page_count"])
-            with cols[1]:
-                st.metric("Total Words", extraction_result["word_count"])
+                cols = st.columns(3)
+                with cols[0]:
+                    st.metric("Pages Processed", extraction_result["page_count"])
+                with cols[1]:
+                    st.metric("Total Words", extraction_result["word_count"])
                 
-            with st.expander("View Extracted Text"):
-                st.text(extraction_result["text"][:2000] + "...")
+                with st.expander("View Extracted Text"):
+                    st.text(extraction_result["text"][:2000] + "...")
+
+                with st.expander("Key Figures"):
+                    st.text(format_fact_table(extract_facts(extraction_result["text"])) or "No figures found.")
                 
-            # Step 2: Analyze
-            if st.button("Generate Intelligence Report"):
-                with st.spinner("Analyzing transcript using Groq (Llama-3)..."):
-                    summary_json_str = backend.generate_summary(extraction_result["text"])
+                # Step 2: Analyze
+                force_refresh = st.checkbox("Ignore cached analysis", value=False)
+                doc_key = content_hash(extraction_result["text"].encode("utf-8"))
+                if save_to_corpus:
+                    with st.expander("Corpus details"):
+                        guessed = guess_metadata(extraction_result["text"], uploaded_file.name)
+                        metadata = {
+                            field: st.text_input(label, value=guessed[field] or "", key=f"{field}:{doc_key}").strip() or None
+                            for field, label in (("ticker", "Ticker"), ("quarter", "Quarter (e.g. Q3 2024)"), ("call_date", "Call date (YYYY-MM-DD)"))
+                        }
+                summary_jobs = st.session_state.setdefault("summary_jobs", {})
+                if st.button("Generate Intelligence Report"):
+                    # Runs on the shared job workers, so a rerun or refresh doesn't lose the work;
+                    # identical in-flight requests from any session share one job
+                    summary_jobs[doc_key] = jobs.submit(
+                        summarize_job, backend, extraction_result["text"], not force_refresh,
+                        owner=session_id, key=None if force_refresh else f"summary:{doc_key}",
+                    )
+
+                job_id = summary_jobs.get(doc_key)
+                if job_id is None:
+                    # A refresh starts a new session; an analysis still in flight is found by its content key
+                    job_id = jobs.find(f"summary:{doc_key}")
+                    if job_id is not None:
+                        summary_jobs[doc_key] = job_id
+                job = jobs.get(job_id) if job_id is not None else None
+                if job is not None and job["status"] not in FINISHED:
+                    # Sections fill in as their keys stream in, without holding up the rest of the page
+                    watch_job(job_id, render_partial_summary)
+                elif job is not None:
+                    if job["status"] == "failed":
+                        st.error(f"Analysis failed: {job['error']}")
+                        st.stop()
+                    slots = layout_summary()
+                    summary_json_str = job["result"]["summary"]
+                    spans.extend(job["result"]["spans"])
                     
                     try:
                         summary_data = json.loads(summary_json_str)
-                        
-                        # Display
-                        st.subheader("📊 Executive Summary")
-                        
-                        # Tone
-                        tone_color = "gray"
-                        tone = summary_data.get("Management Tone", "Neutral")
-                        if "Positive" in tone or "Optimistic" in tone:
-                            tone_color = "green"
-                        elif "Caution" in tone or "Negative" in tone:
-                            tone_color = "red"
-                            
-                        st.markdown(f"**Management Tone:** <span style='color:{tone_color};font-weight:bold'>{tone}</span>", unsafe_allow_html=True)
-
-                        st.markdown("---")
-                        
-                        # Layout
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("### 📈 Performance & Financials")
-                            st.write("**Business Performance:**", summary_data.get("Business Performance Overview", "N/A"))
-                            st.write("**Revenue & Margin:**", summary_data.get("Revenue and Margin Discussion", "N/A"))
-                            st.write("**Forward Guidance:**", summary_data.get("Forward Guidance & Outlook", "N/A"))
-                            
-                            st.markdown("### ✅ Key Positives")
-                            for item in summary_data.get("Key Positives", []):
-                                st.write(f"• {item}")
-                                
-                        with col2:
-                            st.markdown("### ⚙️ Operations & Strategy")
-                            st.write("**Operational Commentary:**", summary_data.get("Cost & Operational Commentary", "N/A"))
-                            st.write("**Capital Allocation:**", summary_data.get("Capital Allocation / Capex Commentary", "N/A"))
-                            
-                            st.markdown("### ⚠️ Key Risks")
-                            for item in summary_data.get("Key Risks / Challenges", []):
-                                st.write(f"• {item}")
-                                
-                        st.markdown("---")
-                        st.markdown("### 🚀 Strategic Initiatives")
-                        for item in summary_data.get("Strategic / Growth Initiatives", []):
-                            st.write(f"• {item}")
-                            
-                        st.markdown("### 💬 Q&A Insights")
-                        st.write(summary_data.get("Q&A Insights", "N/A"))
-                        
-                        st.markdown("---")
-                        st.markdown("### 📝 One-Page Summary")
-                        st.info(summary_data.get("Executive One-Page Summary Paragraph", "N/A"))
-                        
-                        # PDF Export
-                        pdf_file = create_pdf_report(summary_data)
-                        st.download_button(
-                            label="Download Report as PDF",
-                            data=pdf_file,
-                            file_name="earnings_summary.pdf",
-                            mime="application/pdf"
-                        )
-                        
+
+                        # Keep the finished analysis so it can be searched and reopened without re-uploading
+                        if save_to_corpus:
+                            archived = st.session_state.setdefault("archived", set())
+                            archive_key = (doc_key, content_hash(summary_json_str.encode("utf-8")), tuple(metadata.values()))
+                            if archive_key not in archived:
+                                backend.archive_transcript(content_hash(uploaded_file.getvalue()), extraction_result, summary_json_str, title=uploaded_file.name, **metadata)
+                                archived.add(archive_key)
+
+                        # Re-render from the repaired summary: streamed sections may have been
+                        # fixed or filled in since, and anything still missing gets the usual defaults
+                        for key, slot in slots.items():
+                            render_section(slot, key, summary_data.get(key, SECTION_DEFAULTS.get(key, "N/A")))
+                    
+                        render_report_export(summary_data, doc_key)
+                    
                     except json.JSONDecodeError:
-                        st.error("Error parsing LLM response. The model might not have returned valid JSON.")
-                        st.code(summary_json_str)
+                        # finalize_summary repairs anything that holds a summary, so this is an error message
+                        if summary_json_str.startswith("Error generating summary"):
+                            st.error(summary_json_str)
+                        else:
+                            st.error("Error parsing LLM response. The model might not have returned valid JSON.")
+                            st.code(summary_json_str)
                         
-        except Exception as e:
-            st.error(f"An error occurred: {str(e)}")
+                # Step 3: Follow-up questions, answered from the most relevant passages only
+                st.markdown("---")
+                st.markdown("### 🔎 Ask a Follow-up Question")
+                question = st.text_input("Question about this call", placeholder="What did they say about China margins?")
+                if st.button("Ask") and question.strip():
+                    with st.spinner("Searching the transcript..."):
+                        qa = backend.answer_question(extraction_result["text"], question)
+                    st.write(qa["answer"])
+                    if qa["passages"]:
+                        with st.expander(f"Transcript passages used ({len(qa['passages'])})"):
+                            for passage in qa["passages"]:
+                                st.text(passage)
+
+            except Exception as e:
+                st.error(f"An error occurred: {str(e)}")
+
+    if show_timings and spans:
+        render_timings(spans)
 
 else:
     st.info("Please upload a PDF transcript to begin.")
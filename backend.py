@@ -1,92 +1,159 @@
+import io
 import os
-import fitz  # PyMuPDF
-from groq import Groq
+import re
+import json
+import mmap
+import time
+import importlib
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from utils import clean_text
-try:
-    from pdf2image import convert_from_bytes
-    import pytesseract
-except ImportError as e:
-    print(f"Warning: OCR dependencies not found: {e}")
-    convert_from_bytes = None
-    pytesseract = None
+from utils import count_tokens
+from normalize import StreamingNormalizer, normalize_pages
+from chunking import ChunkBuilder, chunk_transcript, CHUNK_TARGET_TOKENS
+from cache import EXTRACTION_VERSION, ExtractionCache, SummaryCache, content_hash, get_extraction_cache, get_summary_cache
+from rate_limiter import get_rate_limiter
+from providers import ProviderRouter, build_providers
+from ocr import PageOCR, needs_ocr, ocr_available
+from instrumentation import Tracer, add, annotate, span
+from jobs import report_progress
+from financial_facts import extract_facts, format_fact_table
+from retrieval import RETRIEVAL_TOP_K, get_index, select_context
+from comparison import COMPARE_CONCURRENCY, format_documents
+from singleflight import get_singleflight
+from corpus import get_corpus
+from json_repair import canonical_key, parse_lenient, repair_summary, validate_summary
 
 load_dotenv()
 
-class CallMosaicBackend:
-    def __init__(self):
-        self.api_key = os.getenv("GROQ_API_KEY")
-        if not self.api_key:
-            raise ValueError("GROQ_API_KEY not found in environment variables")
-        self.client = Groq(api_key=self.api_key)
-        self.model = "meta-llama/llama-4-maverick-17b-128e-instruct" # Using the requested model
+# Heavy dependencies are imported on first use rather than at module load, so the
+# app starts (and batch workers fork) without paying for PyMuPDF and the Groq SDK
+# until a PDF is opened or a client is built. They stay reachable as module
+# attributes (backend.fitz, backend.Groq) and can be patched as such.
+_LAZY_IMPORTS = {
+    "fitz": ("fitz", None),  # PyMuPDF
+    "Groq": ("groq", "Groq"),
+    "DefaultHttpxClient": ("groq", "DefaultHttpxClient"),
+}
 
-    def extract_text_from_pdf(self, pdf_file) -> dict:
-        """
-        Extracts text from a PDF file stream.
-        If no text is found, attempts OCR using pytesseract.
-        Returns a dict with 'text', 'page_count', 'word_count', 'is_scanned'.
-        """
-        pdf_bytes = pdf_file.read()
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        full_text = ""
-        page_count = doc.page_count
-        
-        text_content_found = False
-        
-        # unique_set needed to avoid re-reading if we seek(0) but we have bytes 
-        # Actually pdf_file is a Streamlit UploadedFile, so .read() moves cursor. 
-        # We stored bytes in pdf_bytes so we can reuse if needed for OCR.
-        
-        for page in doc:
-            page_text = page.get_text()
-            full_text += page_text + "\n"
-            if len(page_text.strip()) > 50: 
-                text_content_found = True
-            
-        is_scanned = not text_content_found and page_count > 0
-        
-        if is_scanned:
-            # Fallback to OCR
-            if convert_from_bytes is None or pytesseract is None:
-                print("Error: OCR dependencies (pdf2image, pytesseract) are not available.")
-                # We can't do anything, so it will return empty text and is_scanned=True
-            else:
-                # This might be slow for large PDFs, but necessary for scans
-                # Convert PDF to list of images
-                try:
-                    images = convert_from_bytes(pdf_bytes)
-                    full_text = ""
-                    for img in images:
-                        text = pytesseract.image_to_string(img)
-                        full_text += text + "\n"
-                    
-                    # Re-evaluate text content
-                    if len(full_text.strip()) > 50:
-                         text_content_found = True
-                         is_scanned = False # Treated as text now
-                except Exception as e:
-                    # If OCR fails (e.g. missing poppler), return original empty result but keep is_scanned=True
-                    print(f"OCR Failed: {e}")
-                    pass
 
-        cleaned_text = clean_text(full_text)
-        word_count = len(cleaned_text.split())
-        
-        return {
-            "text": cleaned_text,
-            "page_count": page_count,
-            "word_count": word_count,
-            "is_scanned": is_scanned # If OCR worked, this is now False. If OCR failed/not installed, remains True.
-        }
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
 
 
-    def generate_summary(self, transcript_text: str) -> str:
-        """
-        Sends the transcript to Groq for summarization.
-        Handles chunking if necessary (basic implementation for now).
-        """
-        system_prompt = """You are a professional equity research analyst.
+def _lazy(name):
+    # Module globals win, so a patched backend.Groq / backend.fitz is what the code uses
+    return globals()[name] if name in globals() else __getattr__(name)
+
+# Development mode: talk to a local OpenAI-compatible mock server (see benchmarks/mock_llm_server.py)
+MOCK_LLM = os.getenv("MOCK_LLM", "false").lower() == "true"
+MOCK_LLM_URL = os.getenv("MOCK_LLM_URL", "http://127.0.0.1:8765")
+
+LLM_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct" # Using the requested model
+
+# Tokens reserved for the completion when budgeting a request (reconciled with actual usage afterwards)
+LLM_COMPLETION_TOKEN_RESERVE = int(os.getenv("LLM_COMPLETION_TOKEN_RESERVE", "1000"))
+# Transcripts above this are summarized chunk by chunk
+SINGLE_PASS_TOKEN_LIMIT = int(os.getenv("SINGLE_PASS_TOKEN_LIMIT", "3500"))
+LLM_MAX_RATE_LIMIT_RETRIES = int(os.getenv("LLM_MAX_RATE_LIMIT_RETRIES", "3"))
+# Chunk summaries in flight at once during the map stage, and retries per failing chunk
+LLM_MAP_CONCURRENCY = int(os.getenv("LLM_MAP_CONCURRENCY", "4"))
+LLM_CHUNK_MAX_RETRIES = int(os.getenv("LLM_CHUNK_MAX_RETRIES", "2"))
+# Upper bound on intermediate reduce levels before the final JSON consolidation
+LLM_REDUCE_MAX_LEVELS = int(os.getenv("LLM_REDUCE_MAX_LEVELS", "4"))
+# Summary keys still missing or invalid after local JSON repair are re-requested from the
+# model, unless more than this many are (0 disables the follow-up request)
+SUMMARY_REPAIR_MAX_KEYS = int(os.getenv("SUMMARY_REPAIR_MAX_KEYS", "6"))
+
+# What _map_prompts returns for a chunk or group that failed every retry
+_ERROR_PLACEHOLDER = re.compile(r"\[Error (?:summarizing chunk|merging group) \d+:")
+# Why the analysis in progress must not be stored (see CallMosaicBackend._analysis)
+_analysis_issues = contextvars.ContextVar("callmosaic_analysis_issues", default=None)
+
+
+def _note_issue(reason):
+    issues = _analysis_issues.get()
+    if issues is not None:
+        issues.append(reason)
+
+
+@contextmanager
+def _collecting_issues():
+    """
+    Gives the block its own issue list, e.g. to decide whether one result may be
+    cached, and passes whatever it collected on to the enclosing analysis.
+    """
+    parent = _analysis_issues.get()
+    issues = []
+    token = _analysis_issues.set(issues)
+    try:
+        yield issues
+    finally:
+        _analysis_issues.reset(token)
+        if parent is not None:
+            parent.extend(issues)
+
+
+@contextmanager
+def open_pdf_buffer(pdf_source):
+    """
+    Yields the PDF's bytes as a zero-copy buffer for hashing and parsing:
+    paths and real files are memory-mapped (the OS pages them in and out as
+    needed) and BytesIO objects such as Streamlit uploads are viewed in place.
+    Any other file object is read into memory as a fallback; bytes-like
+    sources are used as they are.
+    """
+    if isinstance(pdf_source, (bytes, bytearray, memoryview, mmap.mmap)):
+        yield pdf_source
+        return
+
+    if isinstance(pdf_source, (str, os.PathLike)):
+        with open(pdf_source, "rb") as f:
+            with open_pdf_buffer(f) as buffer:
+                yield buffer
+        return
+
+    if isinstance(pdf_source, io.BytesIO):
+        view = pdf_source.getbuffer()
+        try:
+            yield view
+        finally:
+            view.release()
+        return
+
+    try:
+        fileno = pdf_source.fileno()
+        mapped = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) if os.fstat(fileno).st_size else None
+    except (AttributeError, OSError, ValueError):
+        mapped = None
+    if mapped is None:
+        yield pdf_source.read()
+        return
+    view = memoryview(mapped)
+    try:
+        yield view
+    finally:
+        view.release()
+        mapped.close()
+
+
+def _is_rate_limit_error(error) -> bool:
+    """
+    True for 429 (quota exhausted) and 413 (request larger than the TPM limit) API errors.
+    """
+    return getattr(error, "status_code", None) in (413, 429)
+
+SYSTEM_PROMPT = """You are a professional equity research analyst.
 Your task is to analyze an earnings call transcript.
 
 STRICT RULES:
@@ -97,12 +164,7 @@ STRICT RULES:
 * Cover ALL major sections discussed.
 """
 
-        user_prompt = f"""Analyze the following full earnings call transcript:
-
-{transcript_text}
-
-Generate a structured JSON response with the following keys:
-1. "Management Tone" (Optimistic / Neutral / Cautious / Pessimistic)
+SUMMARY_KEYS = """1. "Management Tone" (Optimistic / Neutral / Cautious / Pessimistic)
 2. "Business Performance Overview"
 3. "Revenue and Margin Discussion"
 4. "Cost & Operational Commentary"
@@ -113,79 +175,924 @@ Generate a structured JSON response with the following keys:
 9. "Capital Allocation / Capex Commentary"
 10. "Q&A Insights"
 11. "Executive One-Page Summary Paragraph"
+"""
+
+SUMMARY_PROMPT_TEMPLATE = """Analyze the following full earnings call transcript:
 
+{transcript}
+
+Generate a structured JSON response with the following keys:
+{keys}
 Ensure the JSON is valid and values are concise but comprehensive.
 """
+
+CHUNK_PROMPT_TEMPLATE = "Summarize this section of the earnings call (Part {part}/{total}). Extract key financial figures, tone, and strategic points:\n\n{chunk}"
+# Pipelined mode sends chunks before the total is known
+STREAM_CHUNK_PROMPT_TEMPLATE = "Summarize this section of the earnings call (Part {part}). Extract key financial figures, tone, and strategic points:\n\n{chunk}"
+
+CONSOLIDATION_PROMPT_TEMPLATE = """Analyze the following summarized sections of an earnings call transcript:
+
+{summaries}
+
+Key figures quoted in the full transcript (use these exact numbers):
+{facts}
+
+Generate a final structured JSON response merging all insights with the following keys:
+{keys}"""
+
+REDUCE_PROMPT_TEMPLATE = """Merge the following partial summaries of consecutive sections of an earnings call (Group {part}/{total}) into one condensed summary.
+Keep every financial figure, guidance item, risk and notable analyst question; drop repetition:
+
+{summaries}"""
+
+KEY_REPAIR_PROMPT_TEMPLATE = """Transcript excerpts:
+
+{passages}
+
+An earlier structured summary of this earnings call was missing these keys or had invalid values for them.
+Generate a JSON response with ONLY the following keys:
+{keys}"""
+
+QA_SYSTEM_PROMPT = """You are a professional equity research analyst answering a question about an earnings call.
+Use ONLY the transcript excerpts provided. Quote figures exactly. If the excerpts don't answer the question, say so."""
+
+QA_PROMPT_TEMPLATE = """Transcript excerpts:
+
+{passages}
+
+Question: {question}
+
+Answer concisely, citing the speaker where relevant."""
+
+COMPARISON_SYSTEM_PROMPT = """You are a professional equity research analyst comparing earnings calls.
+Use ONLY the summaries provided. Do NOT fabricate numbers.
+Produce structured output in JSON format."""
+
+COMPARISON_KEYS = """1. "Tone Comparison" (How management tone differs or shifted across the documents)
+2. "Guidance Changes" (Raised / maintained / lowered guidance and the figures behind it)
+3. "Revenue & Margin Trends"
+4. "Common Themes" (List of strings)
+5. "Key Differences" (List of strings, naming the documents involved)
+6. "Overall Comparison" (One paragraph)
+"""
+
+COMPARISON_PROMPT_TEMPLATE = """Compare the following earnings call summaries, one JSON object per document (in the order given, e.g. oldest quarter first or the focus company first):
+
+{documents}
+
+Generate a structured JSON response with the following keys:
+{keys}"""
+
+# Derived from the templates themselves, so any prompt edit invalidates cached summaries
+PROMPT_VERSION = content_hash("\x00".join([
+    SYSTEM_PROMPT, SUMMARY_KEYS, SUMMARY_PROMPT_TEMPLATE, CHUNK_PROMPT_TEMPLATE, CONSOLIDATION_PROMPT_TEMPLATE,
+    REDUCE_PROMPT_TEMPLATE, STREAM_CHUNK_PROMPT_TEMPLATE, KEY_REPAIR_PROMPT_TEMPLATE,
+]).encode("utf-8"))[:12]
+
+QA_PROMPT_VERSION = content_hash((QA_SYSTEM_PROMPT + "\x00" + QA_PROMPT_TEMPLATE).encode("utf-8"))[:12]
+COMPARISON_PROMPT_VERSION = content_hash("\x00".join([COMPARISON_SYSTEM_PROMPT, COMPARISON_KEYS, COMPARISON_PROMPT_TEMPLATE]).encode("utf-8"))[:12]
+
+class TranscriptExtractor:
+    """
+    PDF extraction and its caches, without an API client, rate limiter or any
+    other LLM state, so batch worker processes can build one cheaply.
+    CallMosaicBackend adds the LLM pipeline on top.
+    """
+    def __init__(self):
+        self.model = LLM_MODEL  # Names the summary a fresh extraction maps to (see _extract_and_cache)
+        self.extraction_cache = get_extraction_cache()
+        self.summary_cache = get_summary_cache()
+        # Identical concurrent extractions and analyses (e.g. several analysts uploading the same call) run once
+        self.singleflight = get_singleflight()
+        # Past transcripts kept indefinitely, so reopening one skips extraction and the LLM
+        self.corpus = get_corpus()
+
+    def extract_text_from_pdf(self, pdf_file, on_page=None) -> dict:
+        """
+        Extracts text from a PDF, given as a file path or a file object.
+        Pages with no usable embedded text are rasterized with PyMuPDF and OCR'd
+        with pytesseract across a process pool; other pages keep their native text.
+        The PDF is memory-mapped or viewed in place rather than copied, and pages
+        are processed one at a time (see iter_pages), so memory stays flat with
+        page count.
+        Returns a dict with 'text', 'page_count', 'word_count', 'is_scanned',
+        'ocr_page_count', per-page 'page_timings', and the token count after
+        normalization ('tokens') along with how many it saved ('tokens_saved').
+        Results are cached by a hash of the PDF bytes, so Streamlit reruns and
+        repeat uploads skip parsing and OCR entirely, and concurrent requests for
+        the same PDF share one extraction. PDFs archived in the transcript corpus
+        are served from it once the cache has evicted them.
+        on_page, if given, is called with each page dict from iter_pages as it is
+        extracted (not on a cache hit), e.g. to start work before the last page.
+        """
+        with span("extract_text_from_pdf") as record, open_pdf_buffer(pdf_file) as buffer:
+            record["bytes"] = len(buffer)
+            cache_key = ExtractionCache.key_for(buffer)
+            cached = self.extraction_cache.get(cache_key)
+            record["cache_hit"] = cached is not None
+            if cached is not None:
+                get_index(cached["text"])  # Warm the follow-up question index
+                return cached
+
+            result = dict(self.singleflight.do(f"extract:{cache_key}", self._extract_and_cache, buffer, cache_key, on_page))
+            record["pages"] = result["page_count"]
+            record["ocr_pages"] = result.get("ocr_page_count", 0)
+            return result
+
+    def _extract_and_cache(self, buffer, cache_key, on_page=None) -> dict:
+        cached = self.extraction_cache.get(cache_key)
+        if cached is not None:
+            return cached  # Finished by another process while this one waited for the lock
+        stored = self.corpus.get(content_hash(buffer))
+        if stored is not None and stored["extraction_version"] == EXTRACTION_VERSION:
+            # Evicted from the cache but kept in the corpus; older extractions are redone
+            annotate(corpus_hit=True)
+            self.extraction_cache.put(cache_key, stored["extraction"])
+            get_index(stored["extraction"]["text"])
+            return stored["extraction"]
+        result = self._extract(self._iter_buffer_pages(buffer), on_page)
+        # Don't cache OCR failures: they usually mean missing system dependencies,
+        # and the same file should be retried once those are installed.
+        if not result["is_scanned"]:
+            self.extraction_cache.put(cache_key, result)
+            # Lets summarize_pdf find this PDF's summary before it has the text again (see _document_summary)
+            summary_key = SummaryCache.key_for(result["text"], self.model, PROMPT_VERSION)
+            self.summary_cache.put(self._document_key(cache_key), summary_key, self.model, PROMPT_VERSION, kind="document")
+        with span("build_index"):
+            get_index(result["text"])
+        return result
+
+    def iter_pages(self, pdf_file):
+        """
+        Yields each page of a PDF (path or file object) as soon as its text is
+        ready, in page order: {"page", "page_count", "text", "method", "seconds"}.
+        Text is the raw page text, before normalization.
+        """
+        with open_pdf_buffer(pdf_file) as buffer:
+            yield from self._iter_buffer_pages(buffer)
+
+    def _iter_buffer_pages(self, buffer):
+        doc = _lazy("fitz").open(stream=buffer, filetype="pdf")
+        try:
+            yield from self._iter_doc_pages(doc)
+        finally:
+            doc.close()  # Before the caller releases the buffer the document points into
+
+    def _iter_doc_pages(self, doc):
+        # Pages needing OCR are rendered as they are reached and OCR'd in the
+        # background; later text pages wait behind them so output keeps page order.
+        # Once OCR_WINDOW rendered pages are outstanding, the oldest is awaited first.
+        page_count = doc.page_count
+        pending = deque()  # (index, native text, seconds, OCR future or None)
+        outstanding = 0  # OCR futures in pending
+        ocr_ready = None
+        with PageOCR() as ocr:
+            for index, page in enumerate(doc):
+                report_progress("Extracting text", index + 1, page_count)
+                start = time.perf_counter()
+                page_text = page.get_text()
+                seconds = time.perf_counter() - start
+                future = None
+                if needs_ocr(page_text):
+                    if ocr_ready is None:
+                        ocr_ready = ocr_available()
+                        if not ocr_ready:
+                            print("Error: OCR dependencies (pytesseract, Pillow) are not available.")
+                    if ocr_ready:
+                        future = ocr.submit(page)
+                        outstanding += 1
+                pending.append((index, page_text, seconds, future))
+
+                while pending and (pending[0][3] is None or pending[0][3].done() or outstanding >= ocr.window):
+                    item = pending.popleft()
+                    if item[3] is not None:
+                        report_progress("Running OCR", index + 1, page_count)
+                        outstanding -= 1
+                    yield self._finish_page(*item, page_count)
+            while pending:
+                yield self._finish_page(*pending.popleft(), page_count)
+
+    def _finish_page(self, index, page_text, seconds, future, page_count) -> dict:
+        page = {"page": index + 1, "page_count": page_count, "text": page_text, "method": "text", "seconds": seconds}
+        if future is None:
+            return page
+        try:
+            text, ocr_seconds = future.result()
+        except Exception as e:
+            # If OCR fails (e.g. missing tesseract binary), keep whatever native text we had
+            print(f"OCR Failed: {e}")
+            return page
+        if len(text.strip()) > len(page_text.strip()):
+            page["text"] = text
+        page.update(method="ocr", seconds=seconds + ocr_seconds)
+        return page
+
+    def _extract(self, pages, on_page=None) -> dict:
+        page_texts = []
+        page_timings = []
+        for page in pages:
+            if on_page is not None:
+                on_page(page)
+            page_texts.append(page["text"])
+            page_timings.append({"page": page["page"], "method": page["method"], "seconds": page["seconds"]})
+        page_count = len(page_texts)
+
+        # Scanned means no page yielded any text, natively or via OCR
+        is_scanned = page_count > 0 and not any(text.strip() for text in page_texts)
+
+        # Drop running headers/footers and boilerplate before anything is sent to the LLM
+        with span("normalize", pages=page_count) as record:
+            normalized = normalize_pages(page_texts)
+            record["tokens_saved"] = normalized["tokens_saved"]
+        cleaned_text = normalized["text"]
+        word_count = len(cleaned_text.split())
+        
+        return {
+            "text": cleaned_text,
+            "page_count": page_count,
+            "word_count": word_count,
+            "is_scanned": is_scanned, # If OCR worked, this is now False. If OCR failed/not installed, remains True.
+            "ocr_page_count": sum(1 for timing in page_timings if timing["method"] == "ocr"),
+            "page_timings": page_timings,
+            "tokens": normalized["tokens"],
+            "tokens_saved": normalized["tokens_saved"],
+        }
+
+    def _document_key(self, pdf_key):
+        return SummaryCache.key_for(pdf_key, self.model, PROMPT_VERSION)
+
+
+class CallMosaicBackend(TranscriptExtractor):
+    def __init__(self):
+        self.api_key = os.getenv("GROQ_API_KEY") or ("mock" if MOCK_LLM else None)
+        if not self.api_key:
+            raise ValueError("GROQ_API_KEY not found in environment variables")
+        super().__init__()
+        self.rate_limiter = get_rate_limiter()
+        # Every HTTP response (including 429s) feeds its rate-limit headers back into the
+        # shared limiter. SDK retries are disabled so all retries are paced by the limiter.
+        self.client = _lazy("Groq")(
+            api_key=self.api_key,
+            base_url=MOCK_LLM_URL if MOCK_LLM else (os.getenv("GROQ_BASE_URL") or None),
+            max_retries=0,
+            http_client=_lazy("DefaultHttpxClient")(event_hooks={"response": [self._observe_response]}),
+        )
+        # Primary Groq model plus any configured fallbacks; hedges only fire with spare quota
+        self.router = ProviderRouter(build_providers(self.client), can_hedge=self._can_hedge, release_hedge=self._release_hedge)
+        self.tokens_used = 0  # Total tokens billed by the API for this instance
+        self._usage_lock = threading.Lock()
+        # Summary cache keys whose latest analysis was built from degraded inputs
+        self._incomplete = set()
+        self._incomplete_lock = threading.Lock()
+
+    def generate_summary(self, transcript_text: str, use_cache: bool = True) -> str:
+        """
+        Sends the transcript to Groq for summarization.
+        Handles chunking if necessary (basic implementation for now).
+        Successful results are cached by transcript hash, model and prompt version;
+        pass use_cache=False to force a fresh analysis.
+        """
+        with span("generate_summary") as record:
+            cache_key = SummaryCache.key_for(transcript_text, self.model, PROMPT_VERSION)
+            if use_cache:
+                cached = self._stored_summary(cache_key)
+                record["cache_hit"] = cached is not None
+                if cached is not None:
+                    return cached
+
+            # Concurrent requests for the same transcript, model and prompt version share one analysis;
+            # a forced refresh never joins a run that may answer from the cache, nor the reverse
+            return self.singleflight.do(f"summary:{cache_key}:{use_cache}", self._summarize_and_cache, transcript_text, cache_key, use_cache)
+
+    def _summarize_and_cache(self, transcript_text, cache_key, use_cache=True) -> str:
+        if use_cache:
+            cached = self._stored_summary(cache_key)
+            if cached is not None:
+                return cached  # Finished by another process while this one waited for the lock
+        with self._analysis(cache_key):
+            return self.finalize_summary(transcript_text, self._generate_summary(transcript_text, use_cache))
+
+    def finalize_summary(self, transcript_text: str, summary: str) -> str:
+        """
+        Turns raw model output into the summary JSON without re-running the
+        analysis: code fences, trailing commas, truncation and misspelled keys
+        are repaired locally (see json_repair), and keys that are still missing
+        or invalid are re-requested in one small request over the transcript
+        passages that match them. Output with no recoverable summary (e.g. an
+        error message) is returned unchanged. Only complete summaries are cached:
+        one with keys still missing (e.g. too many to re-request), or from an
+        analysis that consolidated failed chunks or was partly answered by a
+        fallback model, is returned but not stored, so the next request runs the
+        analysis again.
+        """
+        with span("finalize_summary") as record:
+            data, problems = repair_summary(summary)
+            if data is None:
+                return summary  # Errors and unparseable output are never cached
+            record["invalid_keys"] = len(problems)
+            with _collecting_issues() as issues:
+                if problems and len(problems) <= SUMMARY_REPAIR_MAX_KEYS:
+                    data, problems = self._repair_keys(transcript_text, data, problems)
+            record["unrepaired_keys"] = len(problems)
+            summary = json.dumps(data, ensure_ascii=False)
+            cache_key = SummaryCache.key_for(transcript_text, self.model, PROMPT_VERSION)
+            if not problems and not issues and self._storable(cache_key):
+                self.summary_cache.put(cache_key, summary, self.model, PROMPT_VERSION)
+            return summary
+
+    def _repair_keys(self, transcript_text, data, keys) -> tuple:
+        with span("repair_summary", keys=len(keys)):
+            index = get_index(transcript_text)
+            results = {}
+            for key in keys:
+                for score, position, passage in index.search(key, RETRIEVAL_TOP_K):
+                    if score > results.get(position, (0,))[0]:
+                        results[position] = (score, position, passage)
+            # Keys like "Management Tone" may match no passage; the opening remarks are the best stand-in
+            ranked = sorted(results.values(), reverse=True) or [(0, i, passage) for i, passage in enumerate(index.passages)]
+            passages = select_context(ranked)
+            key_lines = [line for line in SUMMARY_KEYS.splitlines() if any(f'"{key}"' in line for key in keys)]
+            user_prompt = KEY_REPAIR_PROMPT_TEMPLATE.format(passages="\n\n".join(passages), keys="\n".join(key_lines))
+            report_progress("Repairing summary")
+            try:
+                patch = parse_lenient(self._call_llm(SYSTEM_PROMPT, user_prompt, json_mode=True))
+            except Exception as e:
+                print(f"Summary repair failed: {e}")
+                return data, keys
+            patch = {key: value for key, value in (patch or {}).items() if canonical_key(key) in keys}
+            patched, _ = validate_summary({**data, **patch})
+            return patched, [key for key in keys if key not in patched]
+
+    def _document_summary(self, pdf_key):
+        """
+        The stored summary of a PDF's extracted text, looked up by the PDF's
+        extraction cache key, or None. Unlike _stored_summary it needs no text,
+        so it works while the extraction itself is no longer cached.
+        """
+        summary_key = self.summary_cache.get(self._document_key(pdf_key), kind="document")
+        return self._stored_summary(summary_key) if summary_key is not None else None
+
+    def _stored_summary(self, cache_key):
+        # The corpus keeps summaries the cache has expired or evicted
+        cached = self.summary_cache.get(cache_key)
+        return cached if cached is not None else self.corpus.summary_for(cache_key)
+
+    @contextmanager
+    def _analysis(self, cache_key):
+        """
+        Collects anything that makes the summary analyzed inside the block unfit
+        to store, e.g. a chunk that failed every retry and reached the reduce as
+        an error placeholder, or an answer from a fallback model (summaries are
+        keyed by self.model). When the block ends cache_key is marked incomplete
+        (or cleared), so output finalized later, as the UI does after streaming,
+        is still kept out of the cache and the corpus. A nested block shares the
+        enclosing one's issues.
+        """
+        parent = _analysis_issues.get()
+        issues = parent if parent is not None else []
+        token = _analysis_issues.set(issues)
+        try:
+            yield issues
+        finally:
+            try:
+                _analysis_issues.reset(token)
+            except ValueError:
+                # A generator finished in a different context than it started in
+                _analysis_issues.set(parent)
+            with self._incomplete_lock:
+                if issues:
+                    self._incomplete.add(cache_key)
+                else:
+                    self._incomplete.discard(cache_key)
+
+    def _storable(self, cache_key) -> bool:
+        issues = _analysis_issues.get()
+        if issues is not None:
+            return not issues  # Inside the analysis itself; an older run's mark doesn't apply
+        with self._incomplete_lock:
+            return cache_key not in self._incomplete
+
+    def archive_transcript(self, doc_id: str, extraction: dict, summary: str = None, ticker=None, quarter=None, call_date=None, title=None):
+        """
+        Stores a finished analysis in the transcript corpus under doc_id (the PDF's
+        content hash), where it is searchable and can be reopened later without
+        extraction or an LLM call. summary is the finalized summary JSON; error
+        text and summaries with keys still missing or built from failed chunks are
+        not stored, as in the cache.
+        """
+        summary_key = SummaryCache.key_for(extraction["text"], self.model, PROMPT_VERSION)
+        if summary is not None:
+            data, problems = repair_summary(summary)
+            if data is None or problems or not self._storable(summary_key):
+                summary = None
+        summary_key = summary_key if summary is not None else None
+        with span("archive_transcript"):
+            self.corpus.add(doc_id, extraction, summary, summary_key, ticker=ticker, quarter=quarter, call_date=call_date, title=title)
+
+    def generate_summary_stream(self, transcript_text: str, use_cache: bool = True):
+        """
+        Streaming variant of generate_summary: yields the JSON text as the final
+        (single-pass or consolidation) call produces it, so the UI can render
+        sections before generation finishes. Feed the deltas to
+        json_stream.IncrementalJSONParser to get completed top-level keys.
+        """
+        with span("generate_summary", stream=True):
+            yield from self._generate_summary_stream(transcript_text, use_cache)
+
+    def _generate_summary_stream(self, transcript_text, use_cache):
+        cache_key = SummaryCache.key_for(transcript_text, self.model, PROMPT_VERSION)
+        if use_cache:
+            cached = self._stored_summary(cache_key)
+            if cached is not None:
+                yield cached
+                return
+        # Streams within a process are already de-duplicated by the job manager; across
+        # processes, a second stream for the same transcript waits for the first to finish
+        with self.singleflight.process_lock(f"summary:{cache_key}:{use_cache}"):
+            cached = self._stored_summary(cache_key) if use_cache else None
+            if cached is not None:
+                yield cached
+                return
+            with self._analysis(cache_key):
+                yield from self._stream_summary(transcript_text, cache_key, use_cache)
+
+    def _stream_summary(self, transcript_text, cache_key, use_cache):
+
+        system_prompt = SYSTEM_PROMPT
+        single_pass = count_tokens(transcript_text) <= SINGLE_PASS_TOKEN_LIMIT
+        if single_pass:
+            user_prompt = SUMMARY_PROMPT_TEMPLATE.format(transcript=transcript_text, keys=SUMMARY_KEYS)
+        else:
+            user_prompt = self._consolidation_prompt(transcript_text, system_prompt, use_cache)
+
+        report_progress("Analyzing transcript" if single_pass else "Consolidating summaries")
+        parts = []
+        try:
+            for delta in self._call_llm_stream(system_prompt, user_prompt, json_mode=True):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            if parts:
+                raise  # Can't take back text the caller has already rendered
+            if _is_rate_limit_error(e) and single_pass:
+                # Same fallback as generate_summary: chunk, then stream the consolidation
+                user_prompt = self._consolidation_prompt(transcript_text, system_prompt, use_cache)
+                report_progress("Consolidating summaries")
+                for delta in self._call_llm_stream(system_prompt, user_prompt, json_mode=True):
+                    parts.append(delta)
+                    yield delta
+            else:
+                yield f"Error generating summary: {str(e)}"
+                return
+
+        # Cached when local repair alone completes it; callers pass the streamed text to
+        # finalize_summary to have any keys that are still missing re-requested
+        data, problems = repair_summary("".join(parts))
+        if data is not None and not problems and self._storable(cache_key):
+            self.summary_cache.put(cache_key, json.dumps(data, ensure_ascii=False), self.model, PROMPT_VERSION)
+
+    def answer_question(self, transcript_text: str, question: str, top_k: int = RETRIEVAL_TOP_K, use_cache: bool = True) -> dict:
+        """
+        Answers a follow-up question from the transcript's BM25 index: only the
+        best-matching speaker-turn passages (bounded by RETRIEVAL_CONTEXT_TOKENS)
+        are sent, not the whole call. Returns {"answer", "passages"}; answers are
+        cached like summaries.
+        """
+        with span("answer_question") as record:
+            passages = select_context(get_index(transcript_text).search(question, top_k))
+            record["passages"] = len(passages)
+            if not passages:
+                return {"answer": "No part of the transcript matches this question.", "passages": []}
+
+            cache_key = SummaryCache.key_for(question.strip() + "\x00" + transcript_text, self.model, QA_PROMPT_VERSION)
+            if use_cache:
+                cached = self.summary_cache.get(cache_key, kind="answer")
+                if cached is not None:
+                    return {"answer": cached, "passages": passages}
+
+            user_prompt = QA_PROMPT_TEMPLATE.format(passages="\n\n".join(passages), question=question)
+            try:
+                with _collecting_issues() as issues:
+                    answer = self._call_llm(QA_SYSTEM_PROMPT, user_prompt, json_mode=False)
+            except Exception as e:
+                return {"answer": f"Error answering question: {str(e)}", "passages": passages}
+            if not issues:  # A fallback model's answer is not cached under self.model
+                self.summary_cache.put(cache_key, answer, self.model, QA_PROMPT_VERSION, kind="answer")
+            return {"answer": answer, "passages": passages}
+
+    def summarize_pdf(self, pdf_file, use_cache: bool = True) -> dict:
+        """
+        Pipelined extraction and summarization of one PDF. Pages are normalized
+        and chunked as they come out of extraction, and each chunk goes to the
+        map stage as soon as it is full, while later pages are still being parsed
+        or OCR'd. The reduce levels and the consolidation run once the last
+        chunk is summarized, so a long scanned call takes roughly
+        max(extraction, map) + reduce rather than their sum.
+        Returns {"extraction", "summary"}; both are cached exactly as by
+        extract_text_from_pdf and generate_summary, and summary is None when no
+        text could be extracted. A PDF whose summary is already stored skips the
+        pipeline even when its extraction has to be redone (e.g. evicted from the
+        cache), since the summary is found by the PDF's hash before any chunk is
+        dispatched. Concurrent calls for the same PDF share one run.
+        """
+        with open_pdf_buffer(pdf_file) as buffer:
+            key = ExtractionCache.key_for(buffer)
+            return self.singleflight.do(f"summarize_pdf:{key}:{use_cache}", self._summarize_pdf, buffer, key, use_cache)
+
+    def _summarize_pdf(self, buffer, pdf_key, use_cache=True) -> dict:
+        cached = self._document_summary(pdf_key) if use_cache else None
+        if cached is not None:
+            # Summarized before: only the extraction is needed, so no chunk is dispatched
+            return {"extraction": self.extract_text_from_pdf(buffer), "summary": cached}
+
+        system_prompt = SYSTEM_PROMPT
+        normalizer = StreamingNormalizer()
+        builder = ChunkBuilder(self._chunk_token_budget(system_prompt))
+        futures = []
+        held = []  # Chunks kept back until the transcript is known to need chunking
+        streamed_tokens = [0]
+
+        # Opened before any chunk is dispatched, so fallback answers in the map stage reach the analysis
+        with span("summarize_pdf", pipelined=True) as record, _collecting_issues(), \
+                ThreadPoolExecutor(max_workers=max(1, LLM_MAP_CONCURRENCY), thread_name_prefix="pipeline-map") as pool:
+
+            def dispatch(chunks):
+                for chunk in chunks:
+                    part = len(futures) + 1
+                    prompt = STREAM_CHUNK_PROMPT_TEMPLATE.format(part=part, chunk=chunk)
+                    futures.append(pool.submit(Tracer.wrap(self._map_memoized), [chunk], [prompt], system_prompt, "summarizing chunk", use_cache, [part]))
+
+            def on_page(page):
+                text = normalizer.add_page(page["text"])
+                if not text:
+                    return
+                streamed_tokens[0] += count_tokens(text)
+                held.extend(builder.feed(text))
+                # Short transcripts are summarized in a single pass, so nothing is mapped until the limit is passed
+                if streamed_tokens[0] > SINGLE_PASS_TOKEN_LIMIT:
+                    dispatch(held)
+                    held.clear()
+
+            extraction = self.extract_text_from_pdf(buffer, on_page=on_page)
+            if extraction["is_scanned"]:
+                return {"extraction": extraction, "summary": None}
+            text = extraction["text"]
+            if not futures:
+                # Extraction cache hit, or a transcript short enough for one request
+                return {"extraction": extraction, "summary": self.generate_summary(text, use_cache)}
+
+            held.extend(builder.feed(normalizer.finish()) + builder.finish())
+            dispatch(held)
+            record["chunks"] = len(futures)
+
+            cache_key = SummaryCache.key_for(text, self.model, PROMPT_VERSION)
+            cached = self._stored_summary(cache_key) if use_cache else None
+            if cached is not None:
+                for future in futures:
+                    future.cancel()
+                return {"extraction": extraction, "summary": cached}
+
+            chunk_summaries = [summary for future in futures for summary in future.result()]
+            with self._analysis(cache_key):
+                try:
+                    final_prompt = self._reduce_prompt(text, chunk_summaries, system_prompt, use_cache)
+                    report_progress("Consolidating summaries")
+                    summary = self._call_llm(system_prompt, final_prompt, json_mode=True)
+                except Exception as e:
+                    return {"extraction": extraction, "summary": f"Error generating summary: {str(e)}"}
+                return {"extraction": extraction, "summary": self.finalize_summary(text, summary)}
+
+    def compare_transcripts(self, pdf_files, labels=None, use_cache: bool = True) -> dict:
+        """
+        Comparative mode (quarter over quarter or a peer set): extracts and
+        summarizes every PDF concurrently, each through the usual cached
+        single-document pipeline, then compares the compact per-document
+        summaries in one request. labels name the documents in the prompt
+        (default: Document 1..N) and must match pdf_files one to one. Returns
+        {"comparison", "documents"}, where documents holds each label, its
+        extraction stats and summary (or error).
+        """
+        labels = list(labels) if labels else [f"Document {i + 1}" for i in range(len(pdf_files))]
+        if len(labels) != len(pdf_files):
+            raise ValueError(f"got {len(labels)} labels for {len(pdf_files)} transcripts")
+        with span("compare_transcripts", documents=len(pdf_files)):
+            completed = [0]
+            lock = threading.Lock()
+            report_progress("Summarizing transcripts", 0, len(pdf_files))
+
+            def process(label, pdf_file):
+                document = {"label": label, "summary": None, "error": None}
+                try:
+                    result = self.summarize_pdf(pdf_file, use_cache=use_cache)
+                    extraction, summary = result["extraction"], result["summary"]
+                    document.update(page_count=extraction["page_count"], word_count=extraction["word_count"])
+                    if summary is None or not extraction["text"].strip():
+                        document["error"] = "No text could be extracted."
+                    else:
+                        try:
+                            document["summary"] = json.loads(summary)
+                        except (TypeError, ValueError):
+                            document["error"] = summary
+                except Exception as e:
+                    document["error"] = str(e)
+                with lock:
+                    completed[0] += 1
+                    report_progress("Summarizing transcripts", completed[0], len(pdf_files))
+                return document
+
+            tasks = [Tracer.wrap(process) for _ in pdf_files]
+            workers = max(1, min(COMPARE_CONCURRENCY, len(pdf_files)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compare") as pool:
+                documents = list(pool.map(lambda task, label, pdf_file: task(label, pdf_file), tasks, labels, pdf_files))
+
+            summaries = [(document["label"], document["summary"]) for document in documents if isinstance(document["summary"], dict)]
+            if len(summaries) < 2:
+                comparison = "Error comparing transcripts: at least two transcripts must be summarized successfully."
+            else:
+                comparison = self.compare_summaries(summaries, use_cache=use_cache)
+            return {"comparison": comparison, "documents": documents}
+
+    def compare_summaries(self, summaries, use_cache: bool = True) -> str:
+        """
+        Compares (label, summary_data) pairs with one JSON-mode request over their
+        compact form (see comparison.format_documents), so the prompt size is
+        bounded by COMPARE_CONTEXT_TOKENS regardless of how many documents or how
+        long the transcripts were. Results are cached by the compact input.
+        """
+        with span("compare_summaries", documents=len(summaries)) as record:
+            user_prompt = COMPARISON_PROMPT_TEMPLATE.format(documents=format_documents(summaries), keys=COMPARISON_KEYS)
+            cache_key = SummaryCache.key_for(user_prompt, self.model, COMPARISON_PROMPT_VERSION)
+            if use_cache:
+                cached = self.summary_cache.get(cache_key, kind="comparison")
+                record["cache_hit"] = cached is not None
+                if cached is not None:
+                    return cached
+
+            report_progress("Comparing transcripts")
+            try:
+                with _collecting_issues() as issues:
+                    comparison = self._call_llm(COMPARISON_SYSTEM_PROMPT, user_prompt, json_mode=True)
+            except Exception as e:
+                return f"Error comparing transcripts: {str(e)}"
+            try:
+                json.loads(comparison)
+            except (TypeError, ValueError):
+                return comparison
+            if issues:
+                return comparison  # Answered by a fallback model; not cached under self.model
+            self.summary_cache.put(cache_key, comparison, self.model, COMPARISON_PROMPT_VERSION, kind="comparison")
+            return comparison
+
+    def _generate_summary(self, transcript_text: str, use_cache: bool = True) -> str:
+        system_prompt = SYSTEM_PROMPT
+        user_prompt = SUMMARY_PROMPT_TEMPLATE.format(transcript=transcript_text, keys=SUMMARY_KEYS)
         
         # Chunking Strategy
         # User reported 6000 TPM limit on Groq 'on_demand'. 
         # We must stay well below this.
         
-        estimated_tokens = len(transcript_text.split()) / 0.75
+        estimated_tokens = count_tokens(transcript_text)
         
         # Lower threshold to trigger chunking earlier to avoid Rate Limit Exceeded
-        if estimated_tokens > 3500: 
-             return self._chunked_summary(transcript_text, system_prompt)
+        if estimated_tokens > SINGLE_PASS_TOKEN_LIMIT: 
+             return self._chunked_summary(transcript_text, system_prompt, use_cache)
         
         try:
+            report_progress("Analyzing transcript")
             return self._call_llm(system_prompt, user_prompt, json_mode=True)
         except Exception as e:
-            if "rate_limit_exceeded" in str(e) or "413" in str(e):
+            if _is_rate_limit_error(e):
                  # Fallback to chunking if we hit a limit even with a smaller doc
-                 return self._chunked_summary(transcript_text, system_prompt)
+                 return self._chunked_summary(transcript_text, system_prompt, use_cache)
             return f"Error generating summary: {str(e)}"
 
-    def _chunked_summary(self, text, system_prompt):
+    def _chunked_summary(self, text, system_prompt, use_cache=True):
         """
         Splits text into chunks, summarizes each, then consolidates.
-        Respects strict rate limits.
+        Pacing between requests is handled by the shared rate limiter in _call_llm.
+        """
+        final_prompt = self._consolidation_prompt(text, system_prompt, use_cache)
+        report_progress("Consolidating summaries")
+        return self._call_llm(system_prompt, final_prompt, json_mode=True)
+
+    def _consolidation_prompt(self, text, system_prompt, use_cache=True) -> str:
         """
-        import time
-        words = text.split()
-        chunk_size = 2000 # Reduced chunk size (~2600 tokens)
-        chunks = [" ".join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size)]
+        Runs the map stage and the intermediate reduce levels, and returns the
+        prompt for the final consolidation call.
+        """
+        report_progress("Chunking transcript")
+        with span("chunking") as record:
+            chunks = chunk_transcript(text, self._chunk_token_budget(system_prompt))
+            record["chunks"] = len(chunks)
         
-        chunk_summaries = []
-        for i, chunk in enumerate(chunks):
-            # STAGE 1: Summarize Chunks
-            chunk_prompt = f"Summarize this section of the earnings call (Part {i+1}/{len(chunks)}). Extract key financial figures, tone, and strategic points:\n\n{chunk}"
-            try:
-                summary = self._call_llm(system_prompt, chunk_prompt, json_mode=False)
-                chunk_summaries.append(summary)
-            except Exception as e:
-                chunk_summaries.append(f"[Error summarizing chunk {i+1}: {e}]")
-            
-            # Rate Limit Safety: Wait between chunks to reset TPM window (approx 1 min window)
-            # 2600 tokens + response ~ 3000 tokens. Limit is 6000. 
-            # Two requests might hit it. Safe to wait 20s.
-            if i < len(chunks) - 1:
-                time.sleep(20) 
-            
-        combined_summary = "\n\n".join(chunk_summaries)
+        # STAGE 1: Summarize Chunks (concurrently, in original order)
+        chunk_summaries = self._map_chunks(chunks, system_prompt, use_cache)
+        return self._reduce_prompt(text, chunk_summaries, system_prompt, use_cache)
+
+    def _reduce_prompt(self, text, chunk_summaries, system_prompt, use_cache=True) -> str:
+        """
+        Everything after the map stage: the fact table, the intermediate reduce
+        levels and the final consolidation prompt. Chunks that failed every retry
+        are consolidated as their error placeholders, and the analysis is marked
+        incomplete so its summary is not stored.
+        """
+        if any(_ERROR_PLACEHOLDER.match(summary) for summary in chunk_summaries):
+            _note_issue("failed chunk")
+        # Figures are pulled from the full text locally, so none are lost between map and reduce
+        with span("extract_facts") as record:
+            facts = extract_facts(text)
+            fact_table = format_fact_table(facts) or "None found."
+            record["facts"] = len(facts)
+
+        # STAGE 2: Merge summaries level by level until they fit one final request
+        combined_summary = "\n\n".join(self._reduce_summaries(chunk_summaries, system_prompt, reserved_tokens=count_tokens(fact_table), use_cache=use_cache))
         
-        # Rate Limit Safety: Wait before final consolidation
-        time.sleep(20)
+        return CONSOLIDATION_PROMPT_TEMPLATE.format(summaries=combined_summary, facts=fact_table, keys=SUMMARY_KEYS)
 
-        final_prompt = f"""Analyze the following summarized sections of an earnings call transcript:
+    def _chunk_token_budget(self, system_prompt) -> int:
+        """
+        Largest chunk that still fits in one TPM window together with the system
+        prompt, the chunk instructions and the completion reserve, so a chunk can
+        never be rejected with a 413.
+        """
+        overhead = count_tokens(system_prompt) + count_tokens(CHUNK_PROMPT_TEMPLATE) + LLM_COMPLETION_TOKEN_RESERVE
+        return max(256, min(CHUNK_TARGET_TOKENS, self.rate_limiter.tokens_per_minute - overhead))
 
-{combined_summary}
+    def _reduce_token_budget(self, system_prompt) -> int:
+        """
+        Largest amount of summary text one reduce or consolidation request may carry,
+        by the same rule as _chunk_token_budget.
+        """
+        template_tokens = max(count_tokens(REDUCE_PROMPT_TEMPLATE), count_tokens(CONSOLIDATION_PROMPT_TEMPLATE) + count_tokens(SUMMARY_KEYS))
+        overhead = count_tokens(system_prompt) + template_tokens + LLM_COMPLETION_TOKEN_RESERVE
+        return max(256, min(CHUNK_TARGET_TOKENS, self.rate_limiter.tokens_per_minute - overhead))
 
-Generate a final structured JSON response merging all insights with the following keys:
-1. "Management Tone" (Optimistic / Neutral / Cautious / Pessimistic)
-2. "Business Performance Overview"
-3. "Revenue and Margin Discussion"
-4. "Cost & Operational Commentary"
-5. "Key Positives" (List of strings)
-6. "Key Risks / Challenges" (List of strings)
-7. "Forward Guidance & Outlook"
-8. "Strategic / Growth Initiatives" (List of strings)
-9. "Capital Allocation / Capex Commentary"
-10. "Q&A Insights"
-11. "Executive One-Page Summary Paragraph"
-"""
-        return self._call_llm(system_prompt, final_prompt, json_mode=True)
+    def _reduce_summaries(self, summaries, system_prompt, reserved_tokens=0, use_cache=True) -> list:
+        """
+        Tree reduce: while the summaries don't fit one consolidation request, packs
+        neighbouring summaries into groups under the token budget and merges each
+        group with one LLM call, all groups of a level in parallel. Every request
+        stays bounded and the number of serial calls grows only logarithmically
+        with the transcript length. reserved_tokens is room kept free in the final
+        consolidation request (e.g. for the fact table). A group whose merge fails
+        every retry goes up to the next level as its inputs, unmerged.
+        """
+        budget = self._reduce_token_budget(system_prompt)
+        final_budget = max(256, budget - reserved_tokens)
+        for _ in range(LLM_REDUCE_MAX_LEVELS):
+            if len(summaries) <= 1 or count_tokens("\n\n".join(summaries)) <= final_budget:
+                break
+            groups = ["\n\n".join(group) for group in self._group_summaries(summaries, budget)]
+            prompts = [
+                REDUCE_PROMPT_TEMPLATE.format(part=index + 1, total=len(groups), summaries=group)
+                for index, group in enumerate(groups)
+            ]
+            # Groups made only of unchanged summaries are memoized like chunks
+            merged = self._map_memoized(groups, prompts, system_prompt, "merging group", use_cache)
+            summaries = [group if _ERROR_PLACEHOLDER.match(result) else result for group, result in zip(groups, merged)]
+        return summaries
+
+    def _group_summaries(self, summaries, budget) -> list:
+        groups = []
+        current = []
+        current_tokens = 0
+        for summary in summaries:
+            summary_tokens = count_tokens(summary)
+            if current and current_tokens + summary_tokens > budget:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += summary_tokens
+        if current:
+            groups.append(current)
+        if len(groups) == len(summaries) and len(summaries) > 1:
+            # Every summary fills the budget on its own: pair them so the level still shrinks the count
+            groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+        return groups
+
+    def _map_chunks(self, chunks, system_prompt, use_cache=True) -> list:
+        """
+        Summarizes chunks on a bounded thread pool; see _map_prompts and _map_memoized.
+        """
+        prompts = [
+            CHUNK_PROMPT_TEMPLATE.format(part=index + 1, total=len(chunks), chunk=chunk)
+            for index, chunk in enumerate(chunks)
+        ]
+        return self._map_memoized(chunks, prompts, system_prompt, "summarizing chunk", use_cache)
+
+    def _map_memoized(self, contents, prompts, system_prompt, action, use_cache=True, numbers=None) -> list:
+        """
+        Memoizes each map/reduce result by its content, the model and the prompt
+        version, not by its position: when a revised transcript differs in a few
+        paragraphs, only the chunks around the edits go back to the LLM.
+        With use_cache=False everything is recomputed (and the memo refreshed).
+        Failures, merges of content holding a failure and answers from a fallback
+        model are never memoized.
+        numbers are the 1-based positions used in error messages (default: list order).
+        """
+        keys = [SummaryCache.key_for(system_prompt + "\x00" + action + "\x00" + content, self.model, PROMPT_VERSION) for content in contents]
+        results = [self.summary_cache.get(key, kind="memo") if use_cache else None for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+        add("memo_hits", len(contents) - len(missing))
+
+        numbers = numbers or list(range(1, len(contents) + 1))
+        degraded = set()
+        fresh = self._map_prompts([prompts[index] for index in missing], system_prompt, action, numbers=[numbers[index] for index in missing], degraded=degraded)
+        for position, (index, result) in enumerate(zip(missing, fresh)):
+            results[index] = result
+            if position in degraded:
+                continue
+            if not _ERROR_PLACEHOLDER.match(result) and not _ERROR_PLACEHOLDER.search(contents[index]):
+                self.summary_cache.put(keys[index], result, self.model, PROMPT_VERSION, kind="memo")
+        return results
+
+    def _map_prompts(self, prompts, system_prompt, action, numbers=None, degraded=None) -> list:
+        """
+        Runs independent text prompts on a bounded thread pool. The shared rate limiter
+        keeps the fan-out inside the per-minute token budget, so with enough quota a
+        level takes roughly as long as its slowest call. Results keep input order, and
+        a failing prompt is retried on its own without restarting the others.
+        numbers are the 1-based positions used in error messages (default: list order).
+        degraded, if given, is a set that receives the indices of prompts answered
+        by a fallback model.
+        """
+        numbers = numbers or list(range(1, len(prompts) + 1))
+        stage = action.capitalize() + "s"
+        completed = [0]
+        lock = threading.Lock()
+        report_progress(stage, 0, len(prompts))
+
+        def finished():
+            with lock:
+                completed[0] += 1
+                report_progress(stage, completed[0], len(prompts))
+
+        def run(index, prompt):
+            for attempt in range(LLM_CHUNK_MAX_RETRIES + 1):
+                try:
+                    with _collecting_issues() as issues:
+                        result = self._call_llm(system_prompt, prompt, json_mode=False)
+                    if issues and degraded is not None:
+                        degraded.add(index)
+                    finished()
+                    return result
+                except Exception as e:
+                    if attempt == LLM_CHUNK_MAX_RETRIES:
+                        finished()
+                        return f"[Error {action} {numbers[index]}: {e}]"
+                    add("retries", 1)
+                    add("sleep_seconds", 2 ** attempt)
+                    time.sleep(2 ** attempt)
+
+        # One context copy per task so each thread's llm_call spans nest under the caller's span
+        tasks = [Tracer.wrap(run) for _ in prompts]
+        workers = max(1, min(LLM_MAP_CONCURRENCY, len(prompts)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chunk-map") as pool:
+            return list(pool.map(lambda task, index, prompt: task(index, prompt), tasks, range(len(prompts)), prompts))
 
     def _call_llm(self, system_prompt, user_prompt, json_mode=True):
+        with span("llm_call", json_mode=json_mode):
+            kwargs = self._completion_kwargs(system_prompt, user_prompt, json_mode)
+            estimated_tokens = self._estimate_request_tokens(system_prompt, user_prompt)
+            completion, provider = self._create_completion(kwargs, estimated_tokens)
+            self._record_usage(estimated_tokens, getattr(completion, "usage", None))
+            self._note_provider(provider)
+            return completion.choices[0].message.content
+
+    def _call_llm_stream(self, system_prompt, user_prompt, json_mode=True):
+        """
+        Streaming variant of _call_llm: yields content deltas as the model produces them.
+        If the provider refuses to stream this request (e.g. JSON mode without
+        streaming support), falls back to one blocking call and yields it whole.
+        """
+        kwargs = self._completion_kwargs(system_prompt, user_prompt, json_mode)
+        kwargs["stream"] = True
+        estimated_tokens = self._estimate_request_tokens(system_prompt, user_prompt)
+        with span("llm_stream", json_mode=json_mode) as record:
+            try:
+                stream, provider = self._create_completion(kwargs, estimated_tokens)
+            except Exception as e:
+                if getattr(e, "status_code", None) != 400:
+                    raise
+                self.rate_limiter.refund(estimated_tokens)
+                record["fallback"] = True
+                yield self._call_llm(system_prompt, user_prompt, json_mode=json_mode)
+                return
+
+            self._note_provider(provider)
+            usage = None
+            for chunk in stream:
+                if chunk.choices:
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if "first_token_seconds" not in record:
+                            record["first_token_seconds"] = time.time() - record["start"]
+                        yield delta
+                # Groq reports usage on the final chunk under x_groq; OpenAI-compatible servers use .usage
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None) or getattr(chunk, "usage", None) or usage
+            self._record_usage(estimated_tokens, usage)
+
+    def _completion_kwargs(self, system_prompt, user_prompt, json_mode):
         kwargs = {
             "model": self.model,
             "messages": [
@@ -197,7 +1104,73 @@ Generate a final structured JSON response merging all insights with the followin
         }
         if json_mode:
             kwargs["response_format"] = {"type": "json_object"}
-            
-        completion = self.client.chat.completions.create(**kwargs)
-        return completion.choices[0].message.content
+        return kwargs
+
+    def _estimate_request_tokens(self, system_prompt, user_prompt) -> int:
+        return count_tokens(system_prompt) + count_tokens(user_prompt) + LLM_COMPLETION_TOKEN_RESERVE
+
+    def _create_completion(self, kwargs, estimated_tokens) -> tuple:
+        """
+        Returns (completion, provider that answered); see ProviderRouter.create_with_provider.
+        """
+        # Reserve the estimated cost up front; the limiter sleeps only as long as the budget requires
+        add("sleep_seconds", self.rate_limiter.acquire(estimated_tokens))
+
+        attempt = 0
+        while True:
+            try:
+                return self.router.create_with_provider(kwargs)
+            except Exception as e:
+                # 413 means the request can never fit, so only 429s are retried.
+                # The response hook has already recorded Retry-After for the next acquire.
+                if getattr(e, "status_code", None) != 429 or attempt >= LLM_MAX_RATE_LIMIT_RETRIES:
+                    raise
+                attempt += 1
+                add("retries", 1)
+                self.rate_limiter.refund(estimated_tokens)  # The rejected request consumed nothing
+                add("sleep_seconds", self.rate_limiter.acquire(estimated_tokens))
+
+    def _note_provider(self, provider):
+        annotate(provider=provider.name)
+        if provider.model not in (None, self.model):
+            # Cache keys name self.model, so this answer must not be stored under them
+            _note_issue(f"answered by {provider.name}")
+
+    def _hedge_tokens(self, kwargs) -> int:
+        system_prompt, user_prompt = (message["content"] for message in kwargs["messages"])
+        return self._estimate_request_tokens(system_prompt, user_prompt)
+
+    def _can_hedge(self, kwargs) -> bool:
+        return self.rate_limiter.try_acquire(self._hedge_tokens(kwargs))
+
+    def _release_hedge(self, kwargs):
+        # Usage is reconciled against the request's own reservation, whichever attempt won
+        self.rate_limiter.refund(self._hedge_tokens(kwargs))
+
+    def _record_usage(self, estimated_tokens, usage):
+        total_tokens = getattr(usage, "total_tokens", None)
+        annotate(prompt_tokens=getattr(usage, "prompt_tokens", None), completion_tokens=getattr(usage, "completion_tokens", None))
+        if isinstance(total_tokens, int):
+            self.rate_limiter.refund(estimated_tokens - total_tokens)
+            with self._usage_lock:
+                self.tokens_used += total_tokens
+
+    def _observe_response(self, response):
+        self.rate_limiter.update_from_headers(response.headers)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
 
+def get_backend() -> CallMosaicBackend:
+    """
+    Returns the process-wide backend, so every Streamlit session and rerun shares
+    one Groq client and its keep-alive connection pool.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            with span("backend_init"):
+                _backend = CallMosaicBackend()
+        return _backend
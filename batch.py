@@ -0,0 +1,249 @@
+"""
+Headless batch runner: extracts and summarizes a directory (or manifest) of PDF
+transcripts without the Streamlit UI.
+
+    python batch.py transcripts/ --output-dir reports/
+    python batch.py manifest.txt --output-dir reports/ --workers 8
+
+Extraction runs in worker processes; all LLM calls go through the main process's
+shared rate limiter. With --pipelined, each document is instead extracted in the
+main process and its chunks are summarized while later pages are still being read. A JSON-lines journal in the output directory records finished
+files so an interrupted run picks up where it left off. With --corpus, every
+finished transcript is also added to the searchable transcript corpus.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import ocr
+from backend import LLM_MAP_CONCURRENCY, TranscriptExtractor, get_backend, open_pdf_buffer
+from cache import content_hash
+from corpus import guess_metadata
+from utils import create_pdf_report
+
+_worker_backend = None
+
+
+def _init_worker():
+    global _worker_backend
+    # Documents already run in parallel, so each worker OCRs its pages serially
+    ocr.OCR_WORKERS = 1
+    # Workers only extract; the API client, rate limiter and provider router stay in the main process
+    _worker_backend = TranscriptExtractor()
+
+
+def _extract_file(path):
+    # A path is memory-mapped by the backend, so large PDFs are never copied into memory
+    return _worker_backend.extract_text_from_pdf(path)
+
+
+def load_inputs(sources) -> list:
+    """
+    Expands directories (recursively, *.pdf), manifests (.txt with one path per line,
+    or .json with a list of paths) and plain PDF paths into a de-duplicated list.
+    """
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in os.walk(source):
+                paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".pdf"))
+        elif source.lower().endswith(".json"):
+            with open(source, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            base = os.path.dirname(os.path.abspath(source))
+            paths.extend(os.path.join(base, entry) for entry in entries)
+        elif source.lower().endswith(".txt"):
+            base = os.path.dirname(os.path.abspath(source))
+            with open(source, "r", encoding="utf-8") as f:
+                paths.extend(os.path.join(base, line.strip()) for line in f if line.strip() and not line.startswith("#"))
+        else:
+            paths.append(source)
+
+    seen = set()
+    unique = []
+    for path in paths:
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            unique.append(path)
+    return unique
+
+
+class JobJournal:
+    """
+    Append-only JSON-lines record of processed files, keyed by content hash so a
+    renamed or moved file is still recognised as done.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # A torn final line from a crash
+                    self.entries[entry["sha256"]] = entry
+
+    def is_done(self, sha256) -> bool:
+        return self.entries.get(sha256, {}).get("status") == "done"
+
+    def record(self, entry: dict):
+        with self._lock:
+            self.entries[entry["sha256"]] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _output_stem(path, sha256, taken):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem in taken:
+        stem = f"{stem}-{sha256[:8]}"
+    taken.add(stem)
+    return stem
+
+
+def _pipeline_and_write(backend, path, sha256, output_dir, stem, use_cache, archive=False):
+    result = backend.summarize_pdf(path, use_cache=use_cache)
+    if result["summary"] is None:
+        raise ValueError("no text could be extracted")
+    return _summarize_and_write(backend, path, sha256, result["extraction"], output_dir, stem, use_cache, result["summary"], archive)
+
+
+def _summarize_and_write(backend, path, sha256, extraction, output_dir, stem, use_cache, summary_json_str=None, archive=False):
+    if summary_json_str is None:
+        summary_json_str = backend.generate_summary(extraction["text"], use_cache=use_cache)
+    summary_data = json.loads(summary_json_str)
+    if archive:
+        backend.archive_transcript(sha256, extraction, summary_json_str, title=os.path.basename(path), **guess_metadata(extraction["text"], path))
+
+    json_path = os.path.join(output_dir, f"{stem}.json")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "source": path,
+            "sha256": sha256,
+            "page_count": extraction["page_count"],
+            "word_count": extraction["word_count"],
+            "summary": summary_data,
+        }, f, indent=2)
+
+    pdf_path = os.path.join(output_dir, f"{stem}.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(create_pdf_report(summary_data).getvalue())
+    return [json_path, pdf_path]
+
+
+def run_batch(paths, output_dir, workers=None, llm_concurrency=LLM_MAP_CONCURRENCY, journal_path=None, use_cache=True, pipelined=False, archive=False) -> dict:
+    """
+    Processes every PDF in paths and returns run statistics. With archive, each
+    finished transcript is also stored in the transcript corpus.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    journal = JobJournal(journal_path or os.path.join(output_dir, "journal.jsonl"))
+    backend = get_backend()
+
+    pending = []
+    skipped = 0
+    taken = set()
+    for path in paths:
+        with open_pdf_buffer(path) as buffer:
+            sha256 = content_hash(buffer)
+        if journal.is_done(sha256):
+            skipped += 1
+            continue
+        pending.append((path, sha256, _output_stem(path, sha256, taken)))
+
+    stats = {"done": 0, "failed": 0, "skipped": skipped}
+    stats_lock = threading.Lock()
+    start = time.perf_counter()
+
+    def fail(path, sha256, error):
+        print(f"FAILED {path}: {error}")
+        with stats_lock:
+            stats["failed"] += 1
+        journal.record({"sha256": sha256, "path": path, "status": "failed", "error": str(error), "finished_at": time.time()})
+
+    def finish(future, path, sha256):
+        # Journal each file the moment it completes, so a crash never loses finished work
+        try:
+            outputs = future.result()
+        except Exception as e:
+            fail(path, sha256, e)
+            return
+        print(f"done   {path}")
+        with stats_lock:
+            stats["done"] += 1
+        journal.record({"sha256": sha256, "path": path, "status": "done", "outputs": outputs, "finished_at": time.time()})
+
+    if pipelined:
+        with ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="batch-pipeline") as pipeline_pool:
+            for path, sha256, stem in pending:
+                future = pipeline_pool.submit(_pipeline_and_write, backend, path, sha256, output_dir, stem, use_cache, archive=archive)
+                future.add_done_callback(lambda f, path=path, sha256=sha256: finish(f, path, sha256))
+    else:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1, initializer=_init_worker) as extract_pool, \
+                ThreadPoolExecutor(max_workers=max(1, llm_concurrency), thread_name_prefix="batch-llm") as llm_pool:
+            extract_futures = {extract_pool.submit(_extract_file, path): (path, sha256, stem) for path, sha256, stem in pending}
+
+            # Summaries start as soon as each document is extracted
+            for future in as_completed(extract_futures):
+                path, sha256, stem = extract_futures[future]
+                try:
+                    extraction = future.result()
+                except Exception as e:
+                    fail(path, sha256, e)
+                    continue
+                if extraction["is_scanned"] or not extraction["text"]:
+                    fail(path, sha256, "no text could be extracted")
+                    continue
+                llm_future = llm_pool.submit(_summarize_and_write, backend, path, sha256, extraction, output_dir, stem, use_cache, archive=archive)
+                llm_future.add_done_callback(lambda f, path=path, sha256=sha256: finish(f, path, sha256))
+
+    elapsed = time.perf_counter() - start
+    minutes = max(elapsed, 1e-9) / 60.0
+    stats.update({
+        "seconds": elapsed,
+        "tokens": backend.tokens_used,
+        "docs_per_minute": stats["done"] / minutes,
+        "tokens_per_minute": backend.tokens_used / minutes,
+        "rate_limit_wait_seconds": backend.rate_limiter.total_wait,
+    })
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-summarize earnings call transcripts.")
+    parser.add_argument("inputs", nargs="+", help="PDF files, directories of PDFs, or .txt/.json manifests")
+    parser.add_argument("-o", "--output-dir", default="reports", help="Where JSON/PDF reports and the journal are written")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Extraction worker processes (default: CPU count)")
+    parser.add_argument("--llm-concurrency", type=int, default=LLM_MAP_CONCURRENCY, help="Documents summarized at once")
+    parser.add_argument("--journal", default=None, help="Job journal path (default: <output-dir>/journal.jsonl)")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore cached summaries")
+    parser.add_argument("--pipelined", action="store_true", help="Summarize chunks while later pages are still being extracted")
+    parser.add_argument("--corpus", action="store_true", help="Also add every finished transcript to the searchable transcript corpus")
+    args = parser.parse_args(argv)
+
+    paths = load_inputs(args.inputs)
+    if not paths:
+        print("No PDF files found.")
+        return 1
+
+    stats = run_batch(paths, args.output_dir, args.workers, args.llm_concurrency, args.journal, use_cache=not args.no_cache, pipelined=args.pipelined, archive=args.corpus)
+    print(
+        f"\n{stats['done']} done, {stats['failed']} failed, {stats['skipped']} already done "
+        f"in {stats['seconds']:.1f}s | {stats['docs_per_minute']:.2f} docs/min, "
+        f"{stats['tokens_per_minute']:.0f} tokens/min, {stats['rate_limit_wait_seconds']:.1f}s waiting on rate limits"
+    )
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
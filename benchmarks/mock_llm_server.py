@@ -0,0 +1,210 @@
+"""
+Local OpenAI-compatible chat completions server for benchmarks and MOCK_LLM=true.
+
+    python -m benchmarks.mock_llm_server --port 8765 --latency 0.5 --tpm 6000
+
+Serves POST /openai/v1/chat/completions (Groq SDK path) and /v1/chat/completions,
+with configurable latency, token/request rate limits (x-ratelimit-* headers and
+429 + Retry-After when exceeded), injected random 429s, and SSE streaming.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from chunking import count_tokens
+
+SUMMARY_KEYS = [
+    "Management Tone",
+    "Business Performance Overview",
+    "Revenue and Margin Discussion",
+    "Cost & Operational Commentary",
+    "Key Positives",
+    "Key Risks / Challenges",
+    "Forward Guidance & Outlook",
+    "Strategic / Growth Initiatives",
+    "Capital Allocation / Capex Commentary",
+    "Q&A Insights",
+    "Executive One-Page Summary Paragraph",
+]
+LIST_KEYS = {"Key Positives", "Key Risks / Challenges", "Strategic / Growth Initiatives"}
+
+
+def mock_summary_json() -> str:
+    summary = {}
+    for key in SUMMARY_KEYS:
+        if key == "Management Tone":
+            summary[key] = "Optimistic"
+        elif key in LIST_KEYS:
+            summary[key] = [f"Mock {key.lower()} item {i}" for i in range(1, 4)]
+        else:
+            summary[key] = f"Mock {key.lower()} generated by the local benchmark server. " * 3
+    return json.dumps(summary)
+
+
+class MockLLMServer:
+    """
+    Threaded mock server. Use as a context manager or call start()/stop().
+    """
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, latency_per_1k_tokens=0.0, tokens_per_minute=0, requests_per_minute=0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = []  # (timestamp, tokens) within the last minute
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self, tokens):
+        """
+        Applies the configured limits. Returns (status, headers).
+        """
+        with self._lock:
+            self.request_count += 1
+            now = time.time()
+            self._window = [(t, n) for t, n in self._window if now - t < 60]
+            used_tokens = sum(n for _, n in self._window)
+            used_requests = len(self._window)
+
+            retry_after = None
+            if self.error_rate and self._random.random() < self.error_rate:
+                retry_after = 1.0
+            elif self.tokens_per_minute and used_tokens + tokens > self.tokens_per_minute:
+                retry_after = max(0.1, 60 - (now - self._window[0][0])) if self._window else 1.0
+            elif self.requests_per_minute and used_requests + 1 > self.requests_per_minute:
+                retry_after = max(0.1, 60 - (now - self._window[0][0]))
+
+            if retry_after is not None:
+                self.rate_limited_count += 1
+                return 429, {"retry-after": f"{retry_after:.2f}", "x-ratelimit-remaining-tokens": "0"}
+
+            self._window.append((now, tokens))
+            headers = {}
+            if self.tokens_per_minute:
+                headers["x-ratelimit-limit-tokens"] = str(self.tokens_per_minute)
+                headers["x-ratelimit-remaining-tokens"] = str(self.tokens_per_minute - used_tokens - tokens)
+                headers["x-ratelimit-reset-tokens"] = "60s"
+            if self.requests_per_minute:
+                headers["x-ratelimit-limit-requests"] = str(self.requests_per_minute)
+                headers["x-ratelimit-remaining-requests"] = str(self.requests_per_minute - used_requests - 1)
+                headers["x-ratelimit-reset-requests"] = "60s"
+            return 200, headers
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                prompt_tokens = sum(count_tokens(m.get("content") or "") for m in request.get("messages", []))
+                json_mode = (request.get("response_format") or {}).get("type") == "json_object"
+                content = mock_summary_json() if json_mode else "Mock section summary: revenue up 12%, margins stable, outlook reiterated."
+                completion_tokens = count_tokens(content)
+
+                status, headers = server._admit(prompt_tokens + completion_tokens)
+                if status != 200:
+                    self._send_json(status, {"error": {"message": "Rate limit reached (rate_limit_exceeded)", "type": "tokens", "code": "rate_limit_exceeded"}}, headers)
+                    return
+
+                time.sleep(server.latency + server.latency_per_1k_tokens * (prompt_tokens + completion_tokens) / 1000.0)
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+                base = {"id": "mock-completion", "created": int(time.time()), "model": request.get("model", "mock")}
+
+                if request.get("stream"):
+                    self._send_stream(base, content, usage, headers)
+                    return
+                self._send_json(200, {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                    "usage": usage,
+                }, headers)
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, base, content, usage, headers):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                pieces = [content[i:i + 16] for i in range(0, len(content), 16)]
+                for index, piece in enumerate(pieces):
+                    chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    if index == len(pieces) - 1:
+                        chunk["choices"][0]["finish_reason"] = "stop"
+                        chunk["x_groq"] = {"id": base["id"], "usage": usage}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock LLM server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fixed seconds per request")
+    parser.add_argument("--latency-per-1k-tokens", type=float, default=0.0)
+    parser.add_argument("--tpm", type=int, default=0, help="Tokens per minute limit (0 = unlimited)")
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute limit (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.latency_per_1k_tokens, args.tpm, args.rpm, args.error_rate)
+    print(f"Mock LLM server listening on {server.url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
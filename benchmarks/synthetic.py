@@ -0,0 +1,153 @@
+import random
+from io import BytesIO
+
+import fitz  # PyMuPDF
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+COMPANY = "Northwind Industrial"
+SEGMENTS = ["Automation", "Energy Solutions", "Aftermarket Services", "Digital Platforms", "Mobility"]
+REGIONS = ["North America", "EMEA", "China", "Latin America", "Southeast Asia"]
+EXECUTIVES = [
+    "Sarah Chen - Chief Executive Officer",
+    "David Okafor - Chief Financial Officer",
+    "Maria Lopez - Head of Investor Relations",
+]
+ANALYSTS = [
+    "Tom Becker - Morgan Stanley",
+    "Priya Nair - Goldman Sachs",
+    "Luis Ortega - JPMorgan",
+    "Emma Walsh - Barclays",
+]
+REMARK_TEMPLATES = [
+    "Revenue in {segment} grew {pct}% year over year to ${amount} million, driven by strong demand in {region}.",
+    "Gross margin expanded by {bps} basis points to {margin}%, reflecting pricing actions and a better mix.",
+    "We now expect full-year revenue of ${low} billion to ${high} billion, up from our prior outlook.",
+    "Operating expenses were ${amount} million, up {pct}% as we continued to invest in {segment}.",
+    "Free cash flow was ${amount} million and we returned ${buyback} million to shareholders through buybacks.",
+    "Diluted EPS was ${eps}, compared with ${prior_eps} in the prior-year quarter.",
+    "Capital expenditures are expected to be roughly ${capex} million for the year, weighted to {segment}.",
+    "Demand in {region} remained soft and we are cautious on the second half given inventory destocking.",
+]
+QUESTION_TEMPLATES = [
+    "Can you talk about pricing in {region} and how sustainable the {segment} margins are?",
+    "How should we think about capex phasing and the return profile on the {segment} investments?",
+    "What are you seeing in order intake for {segment}, and any update on the guidance range?",
+]
+ANSWER_TEMPLATES = [
+    "Sure. Pricing in {region} held up well and we think {segment} margins of about {margin}% are sustainable.",
+    "We expect capex to peak this year at around ${capex} million and returns above our {pct}% hurdle rate.",
+    "Orders in {segment} were up {pct}% and we are comfortable with the range of ${low} to ${high} billion.",
+]
+
+
+def _fill(template, rng):
+    low = rng.randint(8, 12)
+    return template.format(
+        segment=rng.choice(SEGMENTS),
+        region=rng.choice(REGIONS),
+        pct=rng.randint(2, 25),
+        amount=rng.randint(120, 2400),
+        bps=rng.randint(20, 250),
+        margin=round(rng.uniform(28, 46), 1),
+        low=low,
+        high=low + rng.randint(1, 2),
+        buyback=rng.randint(50, 500),
+        eps=round(rng.uniform(0.8, 3.5), 2),
+        prior_eps=round(rng.uniform(0.7, 3.0), 2),
+        capex=rng.randint(200, 900),
+    )
+
+
+def generate_transcript(pages: int, seed: int = 0, words_per_page: int = 450) -> str:
+    """
+    Produces a realistic-looking earnings call transcript of roughly `pages` pages:
+    operator intro, prepared remarks, then an analyst Q&A session.
+    """
+    rng = random.Random(seed)
+    target_words = pages * words_per_page
+    lines = [
+        f"{COMPANY} Q3 Earnings Call Transcript",
+        "Operator: Good morning and welcome to the third quarter earnings conference call. All participants are in listen-only mode.",
+    ]
+    words = sum(len(line.split()) for line in lines)
+
+    # Roughly 40% prepared remarks, the rest Q&A
+    while words < target_words * 0.4:
+        speaker = rng.choice(EXECUTIVES[:2])
+        turn = " ".join(_fill(rng.choice(REMARK_TEMPLATES), rng) for _ in range(rng.randint(3, 7)))
+        lines.append(f"{speaker}: {turn}")
+        words += len(turn.split())
+
+    lines.append("Operator: We will now begin the question-and-answer session. Our first question comes from the line of Tom Becker.")
+    while words < target_words:
+        question = _fill(rng.choice(QUESTION_TEMPLATES), rng)
+        answer = " ".join(_fill(rng.choice(ANSWER_TEMPLATES + REMARK_TEMPLATES), rng) for _ in range(rng.randint(2, 5)))
+        lines.append(f"{rng.choice(ANALYSTS)}: {question}")
+        lines.append(f"{rng.choice(EXECUTIVES[:2])}: {answer}")
+        words += len(question.split()) + len(answer.split())
+
+    lines.append("Operator: This concludes today's conference call. You may now disconnect.")
+    return "\n".join(lines)
+
+
+def _wrap(text, width):
+    wrapped = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + 1 + len(word) > width:
+                wrapped.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        wrapped.append(line)
+        wrapped.append("")
+    return wrapped
+
+
+def render_text_pdf(text: str, pages: int = None) -> bytes:
+    """
+    Renders the transcript as a text-based PDF with a repeated page header and
+    footer, like vendor transcripts. If `pages` is given, the output is padded or
+    truncated to exactly that many pages.
+    """
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4, invariant=1)
+    _, height = A4
+    lines = _wrap(text, 95)
+    per_page = 52
+    total = pages or max(1, -(-len(lines) // per_page))
+    for page in range(total):
+        c.setFont("Helvetica", 8)
+        c.drawString(60, height - 40, f"{COMPANY} (NWI) Q3 Earnings Call - Corrected Transcript")
+        c.drawString(60, 30, f"Page {page + 1} of {total}")
+        c.setFont("Helvetica", 9.5)
+        y = height - 70
+        for line in lines[page * per_page:(page + 1) * per_page]:
+            c.drawString(60, y, line)
+            y -= 14
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def render_scanned_pdf(text: str, pages: int = None, dpi: int = 150) -> bytes:
+    """
+    Renders the transcript as an image-only PDF (no text layer), like a scanned copy.
+    """
+    source = fitz.open(stream=render_text_pdf(text, pages), filetype="pdf")
+    scanned = fitz.open()
+    for page in source:
+        pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+        target = scanned.new_page(width=page.rect.width, height=page.rect.height)
+        target.insert_image(target.rect, pixmap=pixmap)
+    return scanned.tobytes(garbage=3, deflate=True)
+
+
+def generate_pdf(pages: int, scanned: bool = False, seed: int = 0) -> bytes:
+    """
+    Convenience wrapper: a synthetic transcript PDF of exactly `pages` pages.
+    """
+    text = generate_transcript(pages, seed=seed)
+    return render_scanned_pdf(text, pages) if scanned else render_text_pdf(text, pages)
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+# Cache settings are read once at import time so every Streamlit session in the
+# process shares the same configuration (and the same cache instances below).
+CACHE_DIR = os.getenv("CALLMOSAIC_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "32"))
+EXTRACTION_CACHE_DISK_MB = int(os.getenv("EXTRACTION_CACHE_DISK_MB", "256"))
+SUMMARY_CACHE_TTL_HOURS = float(os.getenv("SUMMARY_CACHE_TTL_HOURS", "168"))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1000"))
+# Chunk and group memos are cheap to recompute and far more numerous than final summaries
+SUMMARY_MEMO_MAX_ENTRIES = int(os.getenv("SUMMARY_MEMO_MAX_ENTRIES", "20000"))
+
+# Bump whenever extract_text_from_pdf changes what it returns for the same bytes,
+# so stale entries from older code are never served.
+EXTRACTION_VERSION = "5"
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Returns a stable hex digest for a blob of content (PDF bytes, cleaned text, ...).
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-tier cache for extract_text_from_pdf results, keyed by a hash of the PDF bytes.
+    The memory tier is an LRU bounded by entry count; the disk tier is a directory of
+    JSON files bounded by total size, evicting the least recently used files first.
+    """
+    def __init__(self, cache_dir=None, max_memory_entries=EXTRACTION_CACHE_MEMORY_ENTRIES, max_disk_bytes=EXTRACTION_CACHE_DISK_MB * 1024 * 1024):
+        self.cache_dir = os.path.join(cache_dir or CACHE_DIR, "extraction")
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key_for(pdf_bytes: bytes) -> str:
+        return f"v{EXTRACTION_VERSION}-{content_hash(pdf_bytes)}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return dict(self._memory[key])
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(path)  # Refresh mtime so disk eviction stays LRU
+        except (OSError, ValueError):
+            return None
+
+        self._remember(key, result)
+        return dict(result)
+
+    def put(self, key, result: dict):
+        self._remember(key, result)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)  # Atomic, so concurrent readers never see a partial file
+        except OSError as e:
+            print(f"Warning: could not write extraction cache entry: {e}")
+            return
+        self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory[key] = dict(result)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """
+    Returns the process-wide extraction cache, shared across Streamlit reruns and sessions.
+    """
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache()
+        return _extraction_cache
+
+
+class SummaryCache:
+    """
+    Durable SQLite cache for LLM summaries, keyed by the cleaned transcript hash,
+    the model name and the prompt version. Entries expire after a TTL and the
+    least recently used ones are evicted once the entry limit is exceeded.
+
+    Each entry has a kind ("summary", "memo", "answer", "comparison", ...) with
+    its own entry limit and hit/miss counts, so a long batch of chunk memos
+    never evicts final summaries. Memos are limited by max_memo_entries, every
+    other kind by max_entries.
+    """
+    def __init__(self, db_path=None, ttl_seconds=SUMMARY_CACHE_TTL_HOURS * 3600, max_entries=SUMMARY_CACHE_MAX_ENTRIES, max_memo_entries=SUMMARY_MEMO_MAX_ENTRIES):
+        self.db_path = db_path or os.path.join(CACHE_DIR, "summaries.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_memo_entries = max_memo_entries
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    kind TEXT NOT NULL DEFAULT 'summary'
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(summaries)")}
+            if "kind" not in columns:
+                # Databases from before kinds existed; their memos age out under the summary limit
+                conn.execute("ALTER TABLE summaries ADD COLUMN kind TEXT NOT NULL DEFAULT 'summary'")
+            conn.execute("CREATE INDEX IF NOT EXISTS summaries_kind_accessed ON summaries (kind, accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps this safe across threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key_for(text: str, model: str, prompt_version: str) -> str:
+        return content_hash(f"{model}\x00{prompt_version}\x00{text}".encode("utf-8"))
+
+    def _limit(self, kind) -> int:
+        return self.max_memo_entries if kind == "memo" else self.max_entries
+
+    def get(self, key, kind="summary"):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM summaries WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM summaries WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (now, key))
+
+        with self._lock:
+            if row is None:
+                self._counts[kind]["misses"] += 1
+                return None
+            self._counts[kind]["hits"] += 1
+            return row[0]
+
+    def put(self, key, value: str, model: str, prompt_version: str, kind="summary"):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, prompt_version, value, created_at, accessed_at, kind) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, prompt_version, value, now, now, kind),
+            )
+            conn.execute("DELETE FROM summaries WHERE created_at < ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM summaries WHERE key IN (SELECT key FROM summaries WHERE kind = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (kind, self._limit(kind)),
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM summaries")
+
+    def stats(self, kind="summary") -> dict:
+        """
+        Hits, misses and stored entries for one kind of entry.
+        """
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM summaries WHERE kind = ?", (kind,)).fetchone()[0]
+        with self._lock:
+            return {**self._counts[kind], "entries": entries}
+
+
+_summary_cache = None
+_summary_cache_lock = threading.Lock()
+
+
+def get_summary_cache() -> SummaryCache:
+    """
+    Returns the process-wide summary cache.
+    """
+    global _summary_cache
+    with _summary_cache_lock:
+        if _summary_cache is None:
+            _summary_cache = SummaryCache()
+        return _summary_cache
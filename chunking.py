@@ -0,0 +1,212 @@
+import os
+import re
+import zlib
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Target size of each map-stage chunk; kept under the TPM budget by the backend
+CHUNK_TARGET_TOKENS = int(os.getenv("CHUNK_TARGET_TOKENS", "2600"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Content-defined boundaries: a chunk may end after any turn whose hash is divisible by
+# CHUNK_BOUNDARY_DIVISOR once it holds CHUNK_BOUNDARY_MIN_FILL of the budget, so an edit
+# only moves nearby boundaries. The high fill keeps first-time analyses close to the
+# fully packed chunk count; edits far from a hit can still shift later boundaries.
+CONTENT_DEFINED_CHUNKS = os.getenv("CONTENT_DEFINED_CHUNKS", "true").lower() == "true"
+CHUNK_BOUNDARY_DIVISOR = int(os.getenv("CHUNK_BOUNDARY_DIVISOR", "4"))
+CHUNK_BOUNDARY_MIN_FILL = float(os.getenv("CHUNK_BOUNDARY_MIN_FILL", "0.8"))
+
+# "Operator:", "John Smith:", "Jane Doe - Chief Financial Officer:", "Analyst, Morgan Stanley:" ...
+SPEAKER_TURN_PATTERN = re.compile(
+    r"^(?:Operator|(?:[A-Z][\w.'’-]*[ \t]+){0,3}[A-Z][\w.'’-]*(?:[ \t]*[,–—-]{1,2}[ \t]*[^\n:]{1,80})?)[ \t]*:",
+    re.MULTILINE,
+)
+QA_BOUNDARY_PATTERN = re.compile(
+    r"question[- ]and[- ]answer|questions? (?:and|&) answers?|\bQ\s*&\s*A\b|open (?:up )?the (?:call|line|floor) (?:for|to) questions|first question",
+    re.IGNORECASE,
+)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+# Approximates BPE pre-tokenization: words, numbers in groups of up to three digits, single symbols
+_ESTIMATOR_PIECES = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                # Encodings are downloaded on first use; fall back to the estimator offline
+                print(f"Warning: tokenizer unavailable, using estimator: {e}")
+    return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline token estimate modeled on BPE splitting: common words are one token,
+    long words are split every ~8 characters, numbers in groups of three digits and
+    punctuation one token each.
+    """
+    total = 0
+    for piece in _ESTIMATOR_PIECES.findall(text):
+        total += 1 + (len(piece) - 1) // 8 if piece.isalpha() else 1
+    return total
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with the local tokenizer when available, else estimate_tokens.
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def split_speaker_turns(text: str) -> list:
+    """
+    Splits a transcript into speaker turns. Text before the first recognised
+    speaker label is kept as its own leading block.
+    """
+    starts = [match.start() for match in SPEAKER_TURN_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    bounds = starts + [len(text)]
+    return [text[a:b].strip() for a, b in zip(bounds, bounds[1:]) if text[a:b].strip()]
+
+
+def find_qa_boundary(turns: list) -> int:
+    """
+    Returns the index of the first turn that opens the Q&A session, or None.
+    """
+    for index, turn in enumerate(turns):
+        if index > 0 and QA_BOUNDARY_PATTERN.search(turn):
+            return index
+    return None
+
+
+def _split_oversized(turn: str, max_tokens: int) -> list:
+    """
+    Breaks a turn that alone exceeds the budget at sentence ends, then at words.
+    """
+    pieces = []
+    current = []
+    current_tokens = 0
+    for sentence in SENTENCE_PATTERN.split(turn):
+        sentence_tokens = count_tokens(sentence)
+        if sentence_tokens > max_tokens:
+            words = sentence.split()
+            # Words are at least one token each, so this step always fits the budget
+            step = max(1, int(len(words) * max_tokens / sentence_tokens))
+            parts = [" ".join(words[i:i + step]) for i in range(0, len(words), step)]
+        else:
+            parts = [sentence]
+        for part in parts:
+            part_tokens = count_tokens(part)
+            if current and current_tokens + part_tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def is_boundary(piece: str) -> bool:
+    """
+    True for pieces after which a content-defined chunk may end. Depends only on
+    the piece's own text (crc32 is stable across processes, unlike hash()).
+    """
+    return zlib.crc32(piece.encode("utf-8")) % CHUNK_BOUNDARY_DIVISOR == 0
+
+
+class ChunkBuilder:
+    """
+    Incremental chunk_transcript for text that arrives in pieces, e.g. page by
+    page while later pages are still being OCR'd: feed() returns the chunks
+    completed so far and finish() the rest. A turn is only packed once the next
+    speaker label has arrived, since it may continue on the next page. Prepared
+    remarks and the Q&A session are kept apart as in chunk_transcript.
+    """
+    def __init__(self, max_tokens: int = CHUNK_TARGET_TOKENS, content_defined: bool = CONTENT_DEFINED_CHUNKS, split_qa: bool = True):
+        self.max_tokens = max_tokens
+        self.content_defined = content_defined
+        self.split_qa = split_qa
+        self._tail = ""  # Text of the last, possibly unfinished, turn
+        self._turns = 0
+        self._in_qa = False
+        self._current = []
+        self._current_tokens = 0
+
+    def feed(self, text: str) -> list:
+        self._tail = f"{self._tail}\n{text}" if self._tail else text
+        turns = split_speaker_turns(self._tail)
+        if len(turns) < 2:
+            return []
+        self._tail = turns.pop()
+        return self._add_turns(turns)
+
+    def finish(self) -> list:
+        chunks = self._add_turns(split_speaker_turns(self._tail))
+        self._tail = ""
+        return chunks + self._flush()
+
+    def _flush(self) -> list:
+        if not self._current:
+            return []
+        chunk = "\n\n".join(self._current)
+        self._current, self._current_tokens = [], 0
+        return [chunk]
+
+    def _add_turns(self, turns) -> list:
+        chunks = []
+        for turn in turns:
+            if self.split_qa and not self._in_qa and self._turns > 0 and QA_BOUNDARY_PATTERN.search(turn):
+                self._in_qa = True
+                chunks.extend(self._flush())
+            self._turns += 1
+            turn_tokens = count_tokens(turn)
+            pieces = [turn] if turn_tokens <= self.max_tokens else _split_oversized(turn, self.max_tokens)
+            for piece in pieces:
+                piece_tokens = turn_tokens if len(pieces) == 1 else count_tokens(piece)
+                if self._current and self._current_tokens + piece_tokens > self.max_tokens:
+                    chunks.extend(self._flush())
+                self._current.append(piece)
+                self._current_tokens += piece_tokens
+                if self.content_defined and self._current_tokens >= self.max_tokens * CHUNK_BOUNDARY_MIN_FILL and is_boundary(piece):
+                    chunks.extend(self._flush())
+        return chunks
+
+
+def _pack(turns: list, max_tokens: int, content_defined: bool = False) -> list:
+    builder = ChunkBuilder(max_tokens, content_defined, split_qa=False)
+    return builder._add_turns(turns) + builder._flush()
+
+
+def chunk_transcript(text: str, max_tokens: int = CHUNK_TARGET_TOKENS, content_defined: bool = CONTENT_DEFINED_CHUNKS) -> list:
+    """
+    Splits a transcript into chunks of at most max_tokens, breaking only between
+    speaker turns (sentences only when a single turn is too long) and never mixing
+    prepared remarks with the Q&A session.
+
+    With content_defined, boundaries are also placed after turns picked by
+    is_boundary(), so a revised transcript re-chunks the same way except around
+    the edited turns and unchanged chunks keep their memoized summaries.
+    Otherwise chunks are packed as full as possible.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    turns = split_speaker_turns(text)
+    boundary = find_qa_boundary(turns)
+    sections = [turns] if boundary is None else [turns[:boundary], turns[boundary:]]
+    chunks = []
+    for section in sections:
+        chunks.extend(_pack(section, max_tokens, content_defined))
+    return chunks
@@ -0,0 +1,67 @@
+import os
+import json
+
+from chunking import count_tokens
+
+# Total size of the per-document summaries sent to the comparison prompt. Each
+# document gets an equal share, so the prompt stays the same size however many
+# transcripts are compared.
+COMPARE_CONTEXT_TOKENS = int(os.getenv("COMPARE_CONTEXT_TOKENS", "2400"))
+# Upper bound on one document's share when only a few are compared
+COMPARE_DOC_TOKENS = int(os.getenv("COMPARE_DOC_TOKENS", "600"))
+# Transcripts extracted and summarized at once
+COMPARE_CONCURRENCY = int(os.getenv("COMPARE_CONCURRENCY", "4"))
+
+# Summary sections carried into the comparison, most important first
+COMPARE_FIELDS = [
+    "Management Tone",
+    "Forward Guidance & Outlook",
+    "Revenue and Margin Discussion",
+    "Key Positives",
+    "Key Risks / Challenges",
+    "Capital Allocation / Capex Commentary",
+    "Strategic / Growth Initiatives",
+]
+COMPARE_LIST_ITEMS = 3
+
+
+def _clip(value, max_chars):
+    if isinstance(value, list):
+        return [_clip(item, max_chars) for item in value[:COMPARE_LIST_ITEMS]]
+    value = " ".join(str(value).split())
+    if len(value) <= max_chars:
+        return value
+    return value[:max_chars].rsplit(" ", 1)[0] + " …"
+
+
+def compact_summary(summary_data: dict, max_tokens: int) -> dict:
+    """
+    Reduces a structured summary to the COMPARE_FIELDS sections, clipping lists
+    and text until its JSON fits in max_tokens.
+    """
+    fields = {key: summary_data[key] for key in COMPARE_FIELDS if key in summary_data}
+    max_chars = max(40, max_tokens * 4 // max(1, len(fields)))
+    while True:
+        compact = {key: _clip(value, max_chars) for key, value in fields.items()}
+        if max_chars <= 40 or count_tokens(json.dumps(compact, ensure_ascii=False)) <= max_tokens:
+            return compact
+        max_chars = max(40, max_chars * 3 // 4)
+
+
+def document_budget(count: int) -> int:
+    """
+    Tokens each of count documents may use in the comparison prompt.
+    """
+    return max(80, min(COMPARE_DOC_TOKENS, COMPARE_CONTEXT_TOKENS // max(1, count)))
+
+
+def format_documents(documents) -> str:
+    """
+    Renders (label, summary_data) pairs as one compact JSON object per line,
+    in the order given (e.g. oldest quarter first).
+    """
+    budget = document_budget(len(documents))
+    return "\n".join(
+        json.dumps({"Document": label, **compact_summary(summary_data, budget)}, ensure_ascii=False)
+        for label, summary_data in documents
+    )
@@ -0,0 +1,263 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from cache import CACHE_DIR, EXTRACTION_VERSION, content_hash
+from retrieval import split_passages
+
+# Durable store of past transcripts; unlike the caches, nothing here expires or is evicted
+CORPUS_DB_PATH = os.getenv("CORPUS_DB_PATH") or os.path.join(CACHE_DIR, "corpus.sqlite3")
+CORPUS_SEARCH_LIMIT = int(os.getenv("CORPUS_SEARCH_LIMIT", "20"))
+
+# Metadata is guessed from the opening of the call, where the title block usually is
+_METADATA_SCAN_CHARS = 3000
+_ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4}
+_QUARTER = re.compile(
+    r"\b(?:Q([1-4])|(first|second|third|fourth)[ -]quarter)[\s,]*(?:of\s+)?(?:fiscal\s+(?:year\s+)?|FY\s*)?'?((?:19|20)\d{2}|\d{2})\b",
+    re.IGNORECASE,
+)
+_TICKER = re.compile(r"\((?:(?:NYSE|NASDAQ|Nasdaq|NasdaqGS|AMEX|TSX|LSE)\s*:\s*)?([A-Z]{1,5}(?:\.[A-Z])?)\)")
+_NOT_TICKERS = {"GAAP", "EPS", "CEO", "CFO", "COO", "IR", "USD", "FX", "AI", "Q", "A"}
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+_DATE = re.compile(r"\b(" + "|".join(_MONTHS) + r")\s+(\d{1,2}),?\s+((?:19|20)\d{2})\b", re.IGNORECASE)
+_FILENAME_TICKER = re.compile(r"^([A-Z]{1,5})(?=[\s.-])")
+_QUERY_TERM = re.compile(r'"([^"]+)"|(\S+)')
+
+
+def guess_metadata(text: str, filename: str = None) -> dict:
+    """
+    Best-effort ticker, quarter ("Q3 2024") and call date (ISO) from a transcript's
+    title block, falling back to the file name (e.g. "AAPL_Q3_2024.pdf").
+    Missing fields are None.
+    """
+    head = text[:_METADATA_SCAN_CHARS]
+    name = os.path.splitext(os.path.basename(filename))[0].replace("_", " ") if filename else ""
+
+    quarter = None
+    for source in (head, name):
+        match = _QUARTER.search(source)
+        if match:
+            number = match.group(1) or _ORDINALS[match.group(2).lower()]
+            year = match.group(3)
+            quarter = f"Q{number} {'20' + year if len(year) == 2 else year}"
+            break
+
+    ticker = next((m.group(1) for m in _TICKER.finditer(head) if m.group(1) not in _NOT_TICKERS), None)
+    if ticker is None and name:
+        match = _FILENAME_TICKER.match(name)
+        ticker = match.group(1) if match and match.group(1) not in _NOT_TICKERS else None
+
+    call_date = None
+    match = _DATE.search(head)
+    if match:
+        call_date = f"{match.group(3)}-{_MONTHS.index(match.group(1).lower()) + 1:02d}-{int(match.group(2)):02d}"
+    return {"ticker": ticker, "quarter": quarter, "call_date": call_date}
+
+
+def _query_terms(query: str) -> list:
+    # (term, is_prefix) for every word or "quoted phrase"; a trailing * marks a prefix
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(query):
+        prefix = not phrase and word.endswith("*") and len(word.rstrip("*")) > 0
+        term = phrase or (word.rstrip("*") if prefix else word)
+        if term.strip():
+            terms.append((term, prefix))
+    return terms
+
+
+def _match_expression(terms) -> str:
+    # Quoting every term keeps FTS5 operators and punctuation in user input
+    # ("Q&A", "10-K", "AND") from being parsed as query syntax
+    return " ".join('"' + term.replace('"', '""') + '"' + ("*" if prefix else "") for term, prefix in terms)
+
+
+class TranscriptCorpus:
+    """
+    Persistent SQLite store of analysed transcripts, keyed by the PDF's content
+    hash: the cleaned extract_text_from_pdf result, the structured summary and
+    metadata (ticker, quarter, call date). Speaker-turn passages are indexed with
+    FTS5, so keyword searches across every stored quarter take milliseconds, and
+    a stored transcript can be reopened without extraction or an LLM call.
+    Falls back to substring search where SQLite was built without FTS5.
+    """
+    def __init__(self, db_path=None):
+        self.db_path = db_path or CORPUS_DB_PATH
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    doc_id TEXT PRIMARY KEY,
+                    ticker TEXT,
+                    quarter TEXT,
+                    call_date TEXT,
+                    title TEXT,
+                    text_hash TEXT NOT NULL,
+                    extraction TEXT NOT NULL,
+                    summary TEXT,
+                    summary_key TEXT,
+                    added_at REAL NOT NULL,
+                    extraction_version TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(transcripts)")}
+            if "extraction_version" not in columns:
+                # Rows from before versions were recorded count as another version
+                conn.execute("ALTER TABLE transcripts ADD COLUMN extraction_version TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS transcripts_summary_key ON transcripts (summary_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS transcripts_ticker ON transcripts (ticker, quarter)")
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5(text, doc_id UNINDEXED, position UNINDEXED, tokenize='porter unicode61')")
+                self.fts = True
+            except sqlite3.OperationalError:
+                print("Warning: SQLite has no FTS5 support; corpus search falls back to substring matching.")
+                conn.execute("CREATE TABLE IF NOT EXISTS passages (text TEXT, doc_id TEXT, position INTEGER)")
+                conn.execute("CREATE INDEX IF NOT EXISTS passages_doc ON passages (doc_id)")
+                self.fts = False
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps this safe across threads and processes
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, doc_id, extraction: dict, summary=None, summary_key=None, ticker=None, quarter=None, call_date=None, title=None):
+        """
+        Stores or updates a transcript. Fields left as None keep their stored
+        values, and passages are only re-indexed when the text changed. The
+        extraction is recorded as coming from the current EXTRACTION_VERSION.
+        """
+        text_hash = content_hash(extraction["text"].encode("utf-8"))
+        with self._connect() as conn:
+            row = conn.execute("SELECT text_hash FROM transcripts WHERE doc_id = ?", (doc_id,)).fetchone()
+            conn.execute(
+                """
+                INSERT INTO transcripts (doc_id, ticker, quarter, call_date, title, text_hash, extraction, summary, summary_key, added_at, extraction_version)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (doc_id) DO UPDATE SET
+                    ticker = COALESCE(excluded.ticker, ticker),
+                    quarter = COALESCE(excluded.quarter, quarter),
+                    call_date = COALESCE(excluded.call_date, call_date),
+                    title = COALESCE(excluded.title, title),
+                    text_hash = excluded.text_hash,
+                    extraction = excluded.extraction,
+                    extraction_version = excluded.extraction_version,
+                    summary = COALESCE(excluded.summary, summary),
+                    summary_key = COALESCE(excluded.summary_key, summary_key)
+                """,
+                (doc_id, ticker.upper() if ticker else None, quarter, call_date, title, text_hash,
+                 json.dumps(extraction), summary, summary_key, time.time(), EXTRACTION_VERSION),
+            )
+            if row is None or row["text_hash"] != text_hash:
+                conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+                conn.executemany(
+                    "INSERT INTO passages (text, doc_id, position) VALUES (?, ?, ?)",
+                    ((passage, doc_id, position) for position, passage in enumerate(split_passages(extraction["text"]))),
+                )
+
+    def get(self, doc_id):
+        """
+        Returns the stored transcript (metadata, 'extraction' dict and 'summary' JSON string), or None.
+        'extraction_version' tells whether the extraction is current (see EXTRACTION_VERSION).
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM transcripts WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record["extraction"] = json.loads(record["extraction"])
+        return record
+
+    def summary_for(self, summary_key):
+        """
+        Returns the stored summary produced under this SummaryCache key (same text, model and prompt version), or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT summary FROM transcripts WHERE summary_key = ? AND summary IS NOT NULL LIMIT 1", (summary_key,)).fetchone()
+        return row["summary"] if row else None
+
+    def list_transcripts(self, ticker=None) -> list:
+        """
+        Metadata of every stored transcript (optionally one ticker's), most recent call first.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT doc_id, ticker, quarter, call_date, title, summary IS NOT NULL AS has_summary, added_at
+                FROM transcripts WHERE (? IS NULL OR ticker = ?)
+                ORDER BY call_date IS NULL, call_date DESC, added_at DESC
+                """,
+                (ticker, ticker),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(self, query: str, ticker=None, quarter=None, limit: int = CORPUS_SEARCH_LIMIT) -> list:
+        """
+        Keyword search over every stored transcript's speaker-turn passages.
+        All words must match; "quoted phrases" match exactly and a trailing *
+        matches a prefix. Returns the best matches first, each with its
+        transcript's metadata, passage position and a highlighted snippet.
+        """
+        terms = _query_terms(query)
+        if not terms:
+            return []
+        filters = (ticker.upper() if ticker else None, ticker.upper() if ticker else None, quarter, quarter, limit)
+        with self._connect() as conn:
+            if self.fts:
+                rows = conn.execute(
+                    """
+                    SELECT t.doc_id, t.ticker, t.quarter, t.call_date, t.title, p.position,
+                           snippet(passages, 0, '**', '**', '…', 24) AS snippet, bm25(passages) AS score
+                    FROM passages AS p JOIN transcripts AS t ON t.doc_id = p.doc_id
+                    WHERE passages MATCH ? AND (? IS NULL OR t.ticker = ?) AND (? IS NULL OR t.quarter = ?)
+                    ORDER BY score LIMIT ?
+                    """,
+                    (_match_expression(terms),) + filters,
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    f"""
+                    SELECT t.doc_id, t.ticker, t.quarter, t.call_date, t.title, p.position,
+                           substr(p.text, 1, 200) AS snippet, 0 AS score
+                    FROM passages AS p JOIN transcripts AS t ON t.doc_id = p.doc_id
+                    WHERE {" AND ".join("p.text LIKE ?" for _ in terms)} AND (? IS NULL OR t.ticker = ?) AND (? IS NULL OR t.quarter = ?)
+                    ORDER BY t.call_date DESC, p.position LIMIT ?
+                    """,
+                    tuple(f"%{term}%" for term, _ in terms) + filters,
+                ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, doc_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM passages WHERE doc_id = ?", (doc_id,))
+            conn.execute("DELETE FROM transcripts WHERE doc_id = ?", (doc_id,))
+
+    def stats(self) -> dict:
+        with self._connect() as conn:
+            transcripts = conn.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+            passages = conn.execute("SELECT COUNT(*) FROM passages").fetchone()[0]
+        return {"transcripts": transcripts, "passages": passages, "fts": self.fts}
+
+
+_corpus = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> TranscriptCorpus:
+    """
+    Returns the process-wide transcript corpus.
+    """
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            _corpus = TranscriptCorpus()
+        return _corpus
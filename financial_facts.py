@@ -0,0 +1,100 @@
+import os
+import re
+
+from chunking import SENTENCE_PATTERN, SPEAKER_TURN_PATTERN, count_tokens, split_speaker_turns
+
+# Size cap for the fact table added to the consolidation prompt
+FACT_TABLE_MAX_TOKENS = int(os.getenv("FACT_TABLE_MAX_TOKENS", "800"))
+# Sentence context kept per fact
+FACT_CONTEXT_CHARS = int(os.getenv("FACT_CONTEXT_CHARS", "240"))
+
+_NUMBER = r"\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?"
+_SCALE = r"(?:[ \t]?(?:trillion|billion|million|thousand|crore|lakh|bn|mn|tn|[bmk])\b)?"
+_CURRENCY = rf"(?:[$€£¥₹]|\b(?:USD|EUR|GBP|INR|JPY|Rs\.?)[ \t]?)(?:{_NUMBER}){_SCALE}"
+_PERCENT = rf"(?:{_NUMBER})[ \t]?(?:%|percent\b|per[ \t]cent\b)"
+_BASIS_POINTS = rf"(?:{_NUMBER})[ \t]?(?:basis[ \t]points?|bps|bp)\b"
+_FIGURE = rf"{_CURRENCY}|{_PERCENT}|{_BASIS_POINTS}"
+
+# "$4.1 billion to $4.3 billion", "between 5% and 7%", "5 to 7%"
+RANGE_PATTERN = re.compile(
+    rf"(?:between[ \t]+)?(?:{_FIGURE}|{_NUMBER}{_SCALE})[ \t]*(?:to|and|-|–|—)[ \t]*(?:{_FIGURE})",
+    re.IGNORECASE,
+)
+FIGURE_PATTERN = re.compile(_FIGURE, re.IGNORECASE)
+
+# Checked in this order; the first match names the fact's category
+CATEGORY_PATTERNS = [
+    ("Guidance", re.compile(r"guidance|outlook|\bexpect|\bforecast|\banticipate|\bproject(?:ed|ing)?\b|full[- ]year|next quarter|fiscal (?:year )?20\d\d|\btarget", re.IGNORECASE)),
+    ("EPS", re.compile(r"\bEPS\b|earnings per (?:diluted )?share|per (?:diluted )?share", re.IGNORECASE)),
+    ("Margin", re.compile(r"\bmargins?\b", re.IGNORECASE)),
+    ("Revenue", re.compile(r"\brevenues?\b|\bsales\b|top[- ]line|\bbookings\b", re.IGNORECASE)),
+    ("Growth", re.compile(r"\b(?:grew|growth|increased?|decreased?|declined?|rose|fell|up|down)\b|year[- ]over[- ]year|\byoy\b", re.IGNORECASE)),
+    ("Capital", re.compile(r"capex|capital (?:expenditure|allocation|return)|buyback|repurchase|dividend|free cash flow|\bdebt\b", re.IGNORECASE)),
+]
+CATEGORY_ORDER = [name for name, _ in CATEGORY_PATTERNS] + ["Other"]
+
+
+def _categorize(sentence: str, has_range: bool) -> str:
+    for name, pattern in CATEGORY_PATTERNS:
+        if pattern.search(sentence):
+            return name
+    return "Guidance" if has_range else "Other"
+
+
+def _speaker(turn: str) -> str:
+    label = SPEAKER_TURN_PATTERN.match(turn)
+    return label.group().rstrip(":").strip() if label else None
+
+
+def extract_facts(text: str) -> list:
+    """
+    Scans cleaned transcript text for sentences carrying financial figures
+    (currency amounts, percentages, basis points, guidance ranges) and returns
+    one fact per sentence, in transcript order:
+    {"category", "figures", "sentence", "speaker"}.
+    """
+    facts = []
+    seen = set()
+    for turn in split_speaker_turns(text):
+        speaker = _speaker(turn)
+        for sentence in SENTENCE_PATTERN.split(turn):
+            if not FIGURE_PATTERN.search(sentence):
+                continue
+            sentence = " ".join(sentence.split())
+            if speaker and sentence.startswith(speaker):
+                sentence = sentence[len(speaker):].lstrip(" :")
+            if sentence in seen:
+                continue
+            seen.add(sentence)
+            ranges = [" ".join(match.split()) for match in RANGE_PATTERN.findall(sentence)]
+            figures = ranges or [" ".join(match.split()) for match in FIGURE_PATTERN.findall(sentence)]
+            if len(sentence) > FACT_CONTEXT_CHARS:
+                sentence = sentence[:FACT_CONTEXT_CHARS].rsplit(" ", 1)[0] + " …"
+            facts.append({
+                "category": _categorize(sentence, bool(ranges)),
+                "figures": figures,
+                "sentence": sentence,
+                "speaker": speaker,
+            })
+    return facts
+
+
+def format_fact_table(facts: list, max_tokens: int = FACT_TABLE_MAX_TOKENS) -> str:
+    """
+    Renders facts as a compact table grouped by category (guidance and EPS first),
+    dropping the lowest-priority facts once max_tokens is reached.
+    """
+    lines = []
+    used = 0
+    for category in CATEGORY_ORDER:
+        for fact in facts:
+            if fact["category"] != category:
+                continue
+            speaker = f" {fact['speaker']}:" if fact["speaker"] else ""
+            line = f"- [{category}]{speaker} {fact['sentence']}"
+            tokens = count_tokens(line)
+            if used + tokens > max_tokens:
+                return "\n".join(lines)
+            lines.append(line)
+            used += tokens
+    return "\n".join(lines)
@@ -0,0 +1,242 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Optional JSON-lines file receiving one record per finished span
+TRACE_PATH = os.getenv("TRACE_PATH") or None
+# Port for the Prometheus text endpoint (0 disables it)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Numeric span attributes that are also exported as per-stage counters
+COUNTED_ATTRIBUTES = ("bytes", "pages", "ocr_pages", "chunks", "prompt_tokens", "completion_tokens", "retries", "sleep_seconds", "coalesced", "lock_wait_seconds")
+DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+_current_span = contextvars.ContextVar("callmosaic_span", default=None)
+_current_trace = contextvars.ContextVar("callmosaic_trace", default=None)
+
+
+def _new_record(name, parent, start, attributes) -> dict:
+    return {
+        "name": name,
+        "trace_id": parent["trace_id"] if parent else uuid.uuid4().hex[:16],
+        "span_id": uuid.uuid4().hex[:16],
+        "parent_id": parent["span_id"] if parent else None,
+        "start": start,
+        **attributes,
+    }
+
+
+class Tracer:
+    """
+    Records timed spans for the pipeline stages. Each finished span is appended
+    to the JSON-lines trace file (if configured), to the span list of any
+    enclosing collect() block, and to the per-stage aggregates served as
+    Prometheus metrics.
+
+    Spans nest through contextvars, so work handed to a thread pool keeps its
+    parent as long as the task runs in a copied context (see wrap()).
+    """
+    def __init__(self, trace_path=TRACE_PATH):
+        self.trace_path = trace_path
+        self._lock = threading.Lock()
+        self._counts = defaultdict(int)
+        self._errors = defaultdict(int)
+        self._seconds = defaultdict(float)
+        self._buckets = defaultdict(lambda: [0] * len(DURATION_BUCKETS))
+        self._totals = defaultdict(float)  # (stage, attribute) -> sum
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Times the enclosed block. Yields the span record; callers may add attributes
+        to it, or to the innermost open span from anywhere via add()/annotate().
+        """
+        parent = _current_span.get()
+        record = _new_record(name, parent, time.time(), attributes)
+        token = _current_span.set(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # A generator span finished in a different context than it started in
+                _current_span.set(parent)
+            self._finish(record)
+
+    def record(self, name, seconds, **attributes) -> dict:
+        """
+        Records a span whose duration was measured elsewhere, e.g. app start-up time
+        that begins before the tracer can be imported.
+        """
+        record = _new_record(name, _current_span.get(), time.time() - seconds, attributes)
+        record["seconds"] = seconds
+        self._finish(record)
+        return record
+
+    def _finish(self, record):
+        name = record["name"]
+        with self._lock:
+            self._counts[name] += 1
+            self._seconds[name] += record["seconds"]
+            if "error" in record:
+                self._errors[name] += 1
+            buckets = self._buckets[name]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if record["seconds"] <= bound:
+                    buckets[i] += 1
+            for attribute in COUNTED_ATTRIBUTES:
+                value = record.get(attribute)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._totals[(name, attribute)] += value
+            if self.trace_path:
+                with open(self.trace_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        collected = _current_trace.get()
+        if collected is not None:
+            collected.append(record)
+
+    def update(self, record, increments=None, **attributes):
+        """
+        Adds increments to and sets attributes on an open span record. Worker
+        threads share their parent's record, so changes are made under the lock
+        _finish holds while it reads and writes out records.
+        """
+        with self._lock:
+            for attribute, amount in (increments or {}).items():
+                record[attribute] = record.get(attribute, 0) + amount
+            record.update(attributes)
+
+    @contextmanager
+    def collect(self):
+        """
+        Collects every span finished inside the block (including in wrapped worker
+        threads) into the yielded list, e.g. for the Streamlit timing panel.
+        """
+        spans = []
+        token = _current_trace.set(spans)
+        try:
+            yield spans
+        finally:
+            _current_trace.reset(token)
+
+    @staticmethod
+    def wrap(fn):
+        """
+        Binds fn to a copy of the caller's context so spans it opens on a pool
+        thread attach to the caller's current span and collect() block.
+        """
+        context = contextvars.copy_context()
+        return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+    def metrics_text(self) -> str:
+        """
+        Renders the aggregates in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP callmosaic_stage_seconds Time spent per pipeline stage.",
+            "# TYPE callmosaic_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name in sorted(self._counts):
+                for bound, count in zip(DURATION_BUCKETS, self._buckets[name]):
+                    lines.append(f'callmosaic_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'callmosaic_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {self._counts[name]}')
+                lines.append(f'callmosaic_stage_seconds_sum{{stage="{name}"}} {self._seconds[name]:.6f}')
+                lines.append(f'callmosaic_stage_seconds_count{{stage="{name}"}} {self._counts[name]}')
+            lines.append("# HELP callmosaic_stage_errors_total Spans that ended with an exception.")
+            lines.append("# TYPE callmosaic_stage_errors_total counter")
+            for name in sorted(self._counts):
+                lines.append(f'callmosaic_stage_errors_total{{stage="{name}"}} {self._errors[name]}')
+            for attribute in COUNTED_ATTRIBUTES:
+                stages = sorted(name for name, attr in self._totals if attr == attribute)
+                if not stages:
+                    continue
+                lines.append(f"# TYPE callmosaic_{attribute}_total counter")
+                for name in stages:
+                    lines.append(f'callmosaic_{attribute}_total{{stage="{name}"}} {self._totals[(name, attribute)]:g}')
+        return "\n".join(lines) + "\n"
+
+
+def add(attribute, amount):
+    """
+    Adds amount to a numeric attribute of the innermost open span, if any.
+    """
+    record = _current_span.get()
+    if record is not None:
+        get_tracer().update(record, {attribute: amount})
+
+
+def annotate(**attributes):
+    """
+    Sets attributes on the innermost open span, if any.
+    """
+    record = _current_span.get()
+    if record is not None:
+        get_tracer().update(record, **attributes)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Returns the process-wide tracer shared by every backend instance and Streamlit session.
+    """
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+        return _tracer
+
+
+def span(name, **attributes):
+    return get_tracer().span(name, **attributes)
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host="0.0.0.0"):
+    """
+    Serves GET /metrics from a daemon thread. Safe to call on every Streamlit
+    rerun: only the first call in a process starts a server. Returns the server,
+    or None when disabled.
+    """
+    global _metrics_server
+    with _tracer_lock:
+        if _metrics_server is not None or not port:
+            return _metrics_server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0].rstrip("/") not in ("", "/metrics"):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                payload = get_tracer().metrics_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        _metrics_server = ThreadingHTTPServer((host, port), Handler)
+        _metrics_server.daemon_threads = True
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        return _metrics_server
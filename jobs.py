@@ -0,0 +1,229 @@
+import os
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict, deque
+
+# Background workers shared by every Streamlit session in the process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Finished jobs kept for pickup after reruns; the oldest are dropped first
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_current_job = contextvars.ContextVar("callmosaic_job", default=None)
+
+
+class Job:
+    """
+    One unit of background work plus everything a session needs to poll it.
+    """
+    def __init__(self, fn, args, kwargs, owner, key):
+        self.id = uuid.uuid4().hex
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.owner = owner
+        self.key = key
+        self.status = QUEUED
+        self.stage = "Queued"
+        self.done = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.output = []  # Partial output (e.g. streamed JSON deltas) reported while running
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def snapshot(self) -> dict:
+        return {
+            "id": self.id,
+            "owner": self.owner,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "result": self.result,
+            "error": self.error,
+            "output": "".join(self.output),
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """
+    Bounded pool of worker threads that runs submitted callables outside the
+    Streamlit script thread, so reruns and page refreshes don't cancel work.
+    Queued jobs are dispatched round-robin across owners (e.g. one per session),
+    so a user with ten queued transcripts doesn't starve everyone else.
+    Submitting with a key that matches a queued or running job returns that job
+    instead of starting a duplicate.
+    """
+    def __init__(self, max_workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.max_workers = max(1, max_workers)
+        self.history = history
+        self._jobs = OrderedDict()
+        self._queues = OrderedDict()  # owner -> deque of jobs; dict order is the rotation
+        self._active_keys = {}
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, fn, *args, owner=None, key=None, **kwargs) -> str:
+        """
+        Queues fn(*args, **kwargs) and returns the job id.
+        """
+        with self._cond:
+            if key is not None and key in self._active_keys:
+                return self._active_keys[key]
+            job = Job(fn, args, kwargs, owner, key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._active_keys[key] = job.id
+            self._queues.setdefault(owner, deque()).append(job)
+            self._ensure_workers()
+            self._cond.notify()
+            return job.id
+
+    def get(self, job_id):
+        """
+        Returns a snapshot dict of the job, or None if it is unknown or expired.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def find(self, key):
+        """
+        Returns the id of the queued or running job submitted with key, or None.
+        Lets a session that lost its job ids (e.g. after a browser refresh) pick
+        an in-flight job back up from the content it was started for.
+        """
+        with self._cond:
+            return self._active_keys.get(key)
+
+    def cancel(self, job_id) -> bool:
+        """
+        Cancels a job that hasn't started yet. Running jobs are left to finish.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return False
+            self._queues[job.owner].remove(job)
+            if not self._queues[job.owner]:
+                del self._queues[job.owner]
+            self._finish(job, CANCELLED)
+            return True
+
+    def wait(self, job_id, timeout=None):
+        """
+        Blocks until the job finishes (or timeout) and returns its snapshot.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None or job.status in FINISHED:
+                    return job.snapshot() if job else None
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return job.snapshot()
+                self._cond.wait(remaining)
+
+    def stats(self) -> dict:
+        with self._cond:
+            counts = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {"workers": self.max_workers, **counts}
+
+    def _ensure_workers(self):
+        if len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._worker, daemon=True, name=f"job-worker-{len(self._threads)}")
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self):
+        # Take the head of the first owner's queue and move that owner to the back
+        owner, queue = next(iter(self._queues.items()))
+        del self._queues[owner]
+        job = queue.popleft()
+        if queue:
+            self._queues[owner] = queue
+        return job
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queues:
+                    self._cond.wait()
+                job = self._next_job()
+                job.status = RUNNING
+                job.stage = "Running"
+                job.started_at = time.time()
+
+            token = _current_job.set(job)
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                with self._cond:
+                    job.error = f"{type(e).__name__}: {e}"
+                    self._finish(job, FAILED)
+            else:
+                with self._cond:
+                    job.result = result
+                    self._finish(job, DONE)
+            finally:
+                _current_job.reset(token)
+
+    def _finish(self, job, status):
+        job.status = status
+        job.stage = status.capitalize()
+        job.finished_at = time.time()
+        if job.key is not None and self._active_keys.get(job.key) == job.id:
+            del self._active_keys[job.key]
+        finished = [job_id for job_id, j in self._jobs.items() if j.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+        self._cond.notify_all()
+
+
+def report_progress(stage, done=None, total=None):
+    """
+    Updates the stage (and optional "done of total" counter) of the job running
+    in the current context. A no-op outside a job, so pipeline code can call it
+    unconditionally.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.stage, job.done, job.total = stage, done, total
+
+
+def report_output(text):
+    """
+    Appends partial output to the job running in the current context, e.g. streamed
+    summary JSON that a polling session can render before the job finishes.
+    """
+    job = _current_job.get()
+    if job is not None:
+        job.output.append(text)
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    """
+    Returns the process-wide job manager shared by every Streamlit session.
+    """
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            _job_manager = JobManager()
+        return _job_manager
@@ -0,0 +1,181 @@
+import re
+import json
+import difflib
+
+# The structured summary's keys and the JSON type each value must have
+SUMMARY_SCHEMA = {
+    "Management Tone": str,
+    "Business Performance Overview": str,
+    "Revenue and Margin Discussion": str,
+    "Cost & Operational Commentary": str,
+    "Key Positives": list,
+    "Key Risks / Challenges": list,
+    "Forward Guidance & Outlook": str,
+    "Strategic / Growth Initiatives": list,
+    "Capital Allocation / Capex Commentary": str,
+    "Q&A Insights": str,
+    "Executive One-Page Summary Paragraph": str,
+}
+
+_FENCE = re.compile(r"^\s*```[\w-]*\s*|\s*```\s*$")
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+_KEY_CHARS = re.compile(r"[^a-z0-9]+")
+
+
+def _close_json(text: str) -> list:
+    """
+    Drops trailing commas and closes whatever a truncated response left open
+    (a string, arrays, objects). Returns the candidate repairs in order of
+    preference: everything up to the cut, then only the members completed
+    before the last comma (for a cut inside a key or right after a colon).
+    """
+    out = []
+    stack = []
+    cut = None
+    in_string = escape = False
+    pending_comma = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch.isspace():
+            continue
+        if ch == ",":
+            if not pending_comma:
+                cut = ("".join(out), list(stack))
+            pending_comma = True
+            continue
+        if pending_comma and ch not in "}]":
+            out.append(",")
+        pending_comma = False
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if not stack:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                break  # Anything after the outermost object closes is noise
+            continue
+        out.append(ch)
+
+    repaired = "".join(out)
+    if in_string:
+        repaired = (repaired[:-1] if escape else repaired) + '"'
+    candidates = [repaired + "".join(reversed(stack))]
+    if cut is not None:
+        candidates.append(cut[0] + "".join(reversed(cut[1])))
+    return candidates
+
+
+def parse_lenient(text) -> dict:
+    """
+    Parses model output as a JSON object, repairing common defects: code fences
+    and chatter around the object, trailing commas, and truncation (unclosed
+    strings, arrays and objects). Returns None when no object can be recovered.
+    """
+    if not isinstance(text, str):
+        return None
+    text = _FENCE.sub("", text.strip())
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    for candidate in [text] + _close_json(text):
+        try:
+            data = json.loads(candidate)
+        except ValueError:
+            continue
+        return data if isinstance(data, dict) else None
+    return None
+
+
+def _key_form(key: str) -> str:
+    return _KEY_CHARS.sub(" ", key.lower()).strip()
+
+
+_SCHEMA_FORMS = {_key_form(key): key for key in SUMMARY_SCHEMA}
+
+
+def canonical_key(key: str):
+    """
+    Maps a key as the model spelled it ("Key Risks/Challenges", "management_tone")
+    to its schema name, or None if it matches no schema key closely enough.
+    """
+    if key in SUMMARY_SCHEMA:
+        return key
+    form = _key_form(key)
+    if form in _SCHEMA_FORMS:
+        return _SCHEMA_FORMS[form]
+    close = difflib.get_close_matches(form, list(_SCHEMA_FORMS), n=1, cutoff=0.8)
+    return _SCHEMA_FORMS[close[0]] if close else None
+
+
+def _coerce(value, expected):
+    # Values already of the right type are kept exactly as written; blank ones count as missing
+    if expected is list:
+        if isinstance(value, list):
+            items = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in value]
+            return [item for item in items if item.strip()]
+        if isinstance(value, str):
+            lines = [_BULLET.sub("", line).strip() for line in value.splitlines()]
+            return [line for line in lines if line]
+        return None
+    if isinstance(value, str):
+        return value if value.strip() else None
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return " ".join(item.strip() for item in value).strip()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return None
+
+
+def validate_summary(data: dict) -> tuple:
+    """
+    Renames misspelled keys to their schema names and coerces values to the
+    schema's types where that is unambiguous (e.g. a bulleted string into a
+    list). Returns (summary in schema order, keys still missing or invalid);
+    keys outside the schema are kept at the end.
+    """
+    renamed = {}
+    extras = {}
+    for key, value in (data or {}).items():
+        name = canonical_key(key)
+        if name is None:
+            extras[key] = value
+        elif name not in renamed or key == name:
+            renamed[name] = value
+
+    summary = {}
+    problems = []
+    for key, expected in SUMMARY_SCHEMA.items():
+        value = _coerce(renamed[key], expected) if key in renamed else None
+        if not value:
+            problems.append(key)
+            continue
+        summary[key] = value
+    summary.update(extras)
+    return summary, problems
+
+
+def repair_summary(text) -> tuple:
+    """
+    parse_lenient followed by validate_summary. Returns (None, all keys) when the
+    text holds no summary at all, such as an error message.
+    """
+    data = parse_lenient(text)
+    if data is None:
+        return None, list(SUMMARY_SCHEMA)
+    summary, problems = validate_summary(data)
+    if len(problems) == len(SUMMARY_SCHEMA):
+        return None, problems
+    return summary, problems
@@ -0,0 +1,78 @@
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Parses a streamed JSON object and reports each top-level key as soon as its
+    value is complete, without waiting for the closing brace.
+
+        parser = IncrementalJSONParser()
+        for delta in backend.generate_summary_stream(text):
+            for key, value in parser.feed(delta):
+                render(key, value)
+
+    Anything before the first "{" (e.g. a code fence) is ignored.
+    """
+    def __init__(self):
+        self.text = []
+        self._member = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._started = False
+        self.done = False
+
+    def feed(self, delta: str) -> list:
+        """
+        Consumes the next piece of text and returns the (key, value) pairs it completed.
+        """
+        self.text.append(delta)
+        completed = []
+        member = self._member
+        for ch in delta:
+            if self.done:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                member.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(completed)
+                    self.done = True
+                    continue
+            elif ch == "," and self._depth == 1:
+                self._emit(completed)
+                continue
+            member.append(ch)
+        return completed
+
+    def _emit(self, completed):
+        member = "".join(self._member).strip()
+        self._member.clear()
+        if not member:
+            return
+        try:
+            completed.extend(json.loads("{" + member + "}").items())
+        except ValueError:
+            pass  # Malformed member; the full text is still available via getvalue()
+
+    def getvalue(self) -> str:
+        return "".join(self.text)
@@ -0,0 +1,208 @@
+import os
+import re
+from collections import Counter
+from chunking import SPEAKER_TURN_PATTERN
+from utils import clean_text, count_tokens
+
+# Lines this close to the top/bottom of a page are header/footer candidates
+HEADER_FOOTER_SCAN_LINES = int(os.getenv("HEADER_FOOTER_SCAN_LINES", "4"))
+# Fraction of pages a header/footer line must appear on to be dropped
+REPEATED_LINE_MIN_FRACTION = float(os.getenv("REPEATED_LINE_MIN_FRACTION", "0.5"))
+# Lines without a page number, date or header wording must repeat on nearly every page
+REPEATED_PLAIN_LINE_MIN_FRACTION = float(os.getenv("REPEATED_PLAIN_LINE_MIN_FRACTION", "0.9"))
+# Pipelined extraction learns running headers/footers from this many leading pages
+STREAM_HEADER_SAMPLE_PAGES = int(os.getenv("STREAM_HEADER_SAMPLE_PAGES", "5"))
+
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+# Running header/footer wording; matched against _line_key output, where digits are "#"
+_HEADER_SHAPE = re.compile(r"#|\bpage\b|transcript|earnings call|conference call|confidential|copyright|©|rights reserved")
+# "Sarah Chen - Chief Executive Officer": a speaker line without the trailing colon
+_SPEAKER_TITLE_LINE = re.compile(r"^(?:[A-Z][\w.'’-]*[ \t]+){0,3}[A-Z][\w.'’-]*[ \t]*[,–—-]{1,2}[ \t]*[^\n]{1,80}$")
+
+# Sentences that carry no analytical content but appear in nearly every call
+BOILERPLATE_KEYWORDS = re.compile(
+    r"press(?:ing)? (?:star|\*) ?(?:one|two|zero|1|2|0)"
+    r"|listen[- ]only mode"
+    r"|(?:call|conference|event|webcast) is being recorded"
+    r"|forward[- ]looking statements?"
+    r"|safe harbor"
+    r"|(?:could|may|might) (?:cause actual results to )?differ materially"
+    r"|form 10-[kq]\b"
+    r"|reconciliations? (?:of|to|between) (?:these |the |our )?(?:non-gaap|gaap)"
+    r"|all rights reserved"
+    r"|copyright|©",
+    re.IGNORECASE,
+)
+# Punctuation only ends a sentence before whitespace and not after a digit, so
+# "40.1%" or "in 2024. Revenue" never split mid-figure.
+_SENTENCE_BREAK = re.compile(r"(?<!\d)[.!?](?=\s)|\n(?=\s*\n)")
+# Most characters removed on either side of a boilerplate keyword
+BOILERPLATE_MAX_CHARS = 400
+
+
+def remove_boilerplate(text: str) -> tuple:
+    """
+    Drops every sentence containing a BOILERPLATE_KEYWORDS match. Keywords are
+    found first and only their sentences are delimited, so the cost is linear in
+    the text length. A removed sentence never reaches back past the start of its
+    speaker turn or forward past the end of its line, since operator lines often
+    lack final punctuation, and is capped at BOILERPLATE_MAX_CHARS either side of
+    the keyword. A speaker label opening the sentence is kept when the turn
+    continues on the same line. Returns (text, sentences removed).
+    """
+    spans = []
+    for match in BOILERPLATE_KEYWORDS.finditer(text):
+        if spans and match.start() < spans[-1][1]:
+            continue  # Same sentence as the previous keyword
+        start = max(spans[-1][1] if spans else 0, match.start() - BOILERPLATE_MAX_CHARS)
+        for label in SPEAKER_TURN_PATTERN.finditer(text, start, match.start()):
+            start = label.start()
+        for boundary in _SENTENCE_BREAK.finditer(text, start, match.start()):
+            start = boundary.end() if boundary.group() != "\n" else boundary.start() + 1
+        limit = min(len(text), match.end() + BOILERPLATE_MAX_CHARS)
+        line_end = text.find("\n", match.end(), limit)
+        limit = limit if line_end < 0 else line_end
+        # One character past the limit lets "." see the line break that follows it
+        end = _SENTENCE_BREAK.search(text, match.end(), limit + 1)
+        end = limit if end is None else (end.end() if end.group() != "\n" else end.start())
+        label = SPEAKER_TURN_PATTERN.search(text, start, match.start())
+        if label and not text[start:label.start()].strip():
+            line_end = text.find("\n", end)
+            if text[end:len(text) if line_end < 0 else line_end].strip():
+                start = label.end()
+        if text.startswith("\n", end) and (start == 0 or text[start - 1] == "\n"):
+            end += 1  # The whole line went; don't leave a blank one behind
+        spans.append((start, end))
+    if not spans:
+        return text, 0
+    kept = []
+    position = 0
+    for start, end in spans:
+        kept.append(text[position:start])
+        position = end
+    kept.append(text[position:])
+    return "".join(kept), len(spans)
+
+
+def _line_key(line: str) -> str:
+    # Page numbers and dates inside headers change per page; ignore them when comparing
+    return _SPACES.sub(" ", _DIGITS.sub("#", line.lower())).strip()
+
+
+def _is_speaker_line(line: str, key: str) -> bool:
+    line = line.strip()
+    if SPEAKER_TURN_PATTERN.match(line):
+        return True
+    # "ACME Corp - Q3 2024 Earnings Call" has the same shape but is a running header
+    return bool(_SPEAKER_TITLE_LINE.match(line)) and not _HEADER_SHAPE.search(key)
+
+
+def find_repeated_lines(page_texts: list) -> set:
+    """
+    Returns the normalized keys of header/footer lines that repeat across pages.
+    Needs at least three pages to tell a running header from ordinary text.
+    Speaker lines are never returned, since split_speaker_turns relies on them;
+    lines without a header shape (page number, date, header wording) must repeat
+    on REPEATED_PLAIN_LINE_MIN_FRACTION of pages instead of REPEATED_LINE_MIN_FRACTION.
+    """
+    if len(page_texts) < 3:
+        return set()
+    counts = Counter()
+    for page_text in page_texts:
+        lines = [line for line in page_text.splitlines() if line.strip()]
+        edges = lines[:HEADER_FOOTER_SCAN_LINES] + lines[-HEADER_FOOTER_SCAN_LINES:]
+        # Single words are more likely speaker labels ("Operator") than running headers
+        counts.update({
+            key for key, line in zip(map(_line_key, edges), edges)
+            if len(key.split()) >= 2 and not _is_speaker_line(line, key)
+        })
+    threshold = max(2, int(len(page_texts) * REPEATED_LINE_MIN_FRACTION + 0.5))
+    plain_threshold = max(threshold, int(len(page_texts) * REPEATED_PLAIN_LINE_MIN_FRACTION + 0.5))
+    return {
+        key for key, count in counts.items()
+        if count >= (threshold if _HEADER_SHAPE.search(key) else plain_threshold)
+    }
+
+
+def _strip_page_edges(page_text: str, repeated: set) -> tuple:
+    lines = page_text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    edges = set(content[:HEADER_FOOTER_SCAN_LINES] + content[-HEADER_FOOTER_SCAN_LINES:])
+    kept = []
+    removed = 0
+    for i, line in enumerate(lines):
+        if i in edges and _line_key(line) in repeated:
+            removed += 1
+            continue
+        kept.append(line)
+    return "\n".join(kept), removed
+
+
+def normalize_pages(page_texts: list) -> dict:
+    """
+    Turns per-page extraction output into LLM-ready text: drops running headers
+    and footers found by frequency across pages, strips boilerplate sentences
+    (safe harbor, operator instructions, copyright), then runs clean_text.
+    Returns the text plus how many tokens the normalization saved.
+    """
+    raw_text = "\n".join(page_texts)
+    repeated = find_repeated_lines(page_texts)
+
+    pages = []
+    lines_removed = 0
+    for page_text in page_texts:
+        page_text, removed = _strip_page_edges(page_text, repeated) if repeated else (page_text, 0)
+        pages.append(page_text)
+        lines_removed += removed
+
+    text, boilerplate_removed = remove_boilerplate("\n".join(pages))
+    text = clean_text(text)
+
+    raw_tokens = count_tokens(raw_text)
+    tokens = count_tokens(text)
+    return {
+        "text": text,
+        "raw_tokens": raw_tokens,
+        "tokens": tokens,
+        "tokens_saved": max(0, raw_tokens - tokens),
+        "repeated_lines_removed": lines_removed,
+        "boilerplate_sentences_removed": boilerplate_removed,
+    }
+
+
+class StreamingNormalizer:
+    """
+    Page-at-a-time counterpart of normalize_pages for pipelined extraction.
+    Running headers and footers are learned from the first sample_pages pages,
+    which are held back until then; every later page is cleaned as soon as it
+    arrives. The output can differ slightly from normalize_pages over the whole
+    document (e.g. a header that only starts halfway through is kept), so it
+    feeds the map stage only and the stored extraction still uses normalize_pages.
+    """
+    def __init__(self, sample_pages=STREAM_HEADER_SAMPLE_PAGES):
+        self.sample_pages = max(1, sample_pages)
+        self._held = []
+        self._repeated = None
+
+    def add_page(self, page_text: str) -> str:
+        """
+        Returns the cleaned text released by this page (empty while sampling).
+        """
+        if self._repeated is not None:
+            return self._clean([page_text])
+        self._held.append(page_text)
+        return self._release() if len(self._held) >= self.sample_pages else ""
+
+    def finish(self) -> str:
+        return self._release() if self._repeated is None else ""
+
+    def _release(self) -> str:
+        self._repeated = find_repeated_lines(self._held)
+        pages, self._held = self._held, []
+        return self._clean(pages)
+
+    def _clean(self, pages) -> str:
+        if self._repeated:
+            pages = [_strip_page_edges(page_text, self._repeated)[0] for page_text in pages]
+        return clean_text(remove_boilerplate("\n".join(pages))[0])
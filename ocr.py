@@ -0,0 +1,155 @@
+import os
+import io
+import time
+import importlib
+import importlib.util
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+# Pages whose embedded text is shorter than this (ignoring whitespace) are treated as image-only
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+# Rendered pages held in memory at once, waiting for or being OCR'd (0 = two per worker)
+OCR_WINDOW = int(os.getenv("OCR_WINDOW", "0")) or 2 * OCR_WORKERS
+
+_PRINTABLE_EXTRA = set(".,;:!?%$€£¥&()[]{}'\"-–—/+*=@#’“”•…")
+
+
+# pytesseract pulls in pandas when installed, so both modules are imported on first OCR
+_LAZY_IMPORTS = {"pytesseract": ("pytesseract", None), "Image": ("PIL.Image", None)}
+_available = None
+
+
+def __getattr__(name):
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        value = importlib.import_module(_LAZY_IMPORTS[name][0])
+    except ImportError:
+        value = None
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
+def ocr_available() -> bool:
+    global _available
+    if "pytesseract" in globals() or "Image" in globals():
+        return _lazy("pytesseract") is not None and _lazy("Image") is not None
+    if _available is None:
+        # Checked without importing, so a text-only upload never loads the OCR stack
+        missing = [module for module in ("pytesseract", "PIL") if importlib.util.find_spec(module) is None]
+        if missing:
+            print(f"Warning: OCR dependencies not found: {', '.join(missing)}")
+        _available = not missing
+    return _available
+
+
+def needs_ocr(page_text: str) -> bool:
+    """
+    True when a page's embedded text is missing or garbage (e.g. a broken font
+    mapping that yields replacement characters or symbol soup).
+    """
+    stripped = "".join(page_text.split())
+    if len(stripped) < OCR_MIN_PAGE_CHARS:
+        return True
+    readable = sum(1 for ch in stripped if ch.isalnum() or ch in _PRINTABLE_EXTRA)
+    return stripped.count("�") / len(stripped) > 0.05 or readable / len(stripped) < 0.6
+
+
+def rasterize_page(page, dpi=OCR_DPI) -> bytes:
+    """
+    Renders a PyMuPDF page to PNG bytes at the given DPI (no poppler round-trip).
+    """
+    return page.get_pixmap(dpi=dpi).tobytes("png")
+
+
+def ocr_png(png_bytes: bytes) -> tuple:
+    """
+    OCRs one rendered page. Returns (text, seconds). Top-level so it can run in a worker process.
+    """
+    start = time.perf_counter()
+    text = _lazy("pytesseract").image_to_string(_lazy("Image").open(io.BytesIO(png_bytes)))
+    return text, time.perf_counter() - start
+
+
+class PageOCR:
+    """
+    Rasterizes pages one at a time in this process and OCRs them on a process
+    pool. Callers keep at most `window` submitted pages unfinished (see
+    ocr_pages), so however long the document, only that many rendered pages
+    are ever in memory. The pool is started only once a second page needs OCR,
+    so a text PDF with a single scanned page never pays for worker start-up.
+    """
+    def __init__(self, dpi=OCR_DPI, workers=None, window=OCR_WINDOW):
+        self.dpi = dpi
+        self.workers = max(1, workers or OCR_WORKERS)
+        self.window = max(1, window)
+        self._pool = None
+        self._submitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def submit(self, page) -> Future:
+        """
+        Renders page now and returns a future for (text, seconds), where seconds
+        covers rasterization plus OCR. Errors surface from future.result().
+        """
+        future = Future()
+        start = time.perf_counter()
+        try:
+            png_bytes = rasterize_page(page, self.dpi)
+            self._submitted += 1
+            raster = time.perf_counter() - start
+            if self.workers == 1 or self._submitted == 1:
+                text, seconds = ocr_png(png_bytes)
+                future.set_result((text, seconds + raster))
+                return future
+        except Exception as e:
+            future.set_exception(e)
+            return future
+
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+
+        def finished(inner):
+            try:
+                text, seconds = inner.result()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result((text, seconds + raster))
+
+        self._pool.submit(ocr_png, png_bytes).add_done_callback(finished)
+        return future
+
+
+def ocr_pages(pages, dpi=OCR_DPI, workers=None) -> list:
+    """
+    Rasterizes and OCRs the given PyMuPDF pages, in parallel across processes when
+    there is more than one, with at most OCR_WINDOW rendered pages in memory.
+    Returns a list of (text, seconds) in input order; seconds covers
+    rasterization plus OCR for that page.
+    """
+    results = []
+    pending = deque()
+    with PageOCR(dpi, workers) as ocr:
+        for page in pages:
+            pending.append(ocr.submit(page))
+            if len(pending) >= ocr.window:
+                results.append(pending.popleft().result())
+        results.extend(future.result() for future in pending)
+    return results
@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Extra Groq models tried (same account) when the primary is throttled or failing, comma-separated
+LLM_FALLBACK_MODELS = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+# Optional local OpenAI-compatible endpoint, e.g. http://localhost:11434/v1 (Ollama) or a vLLM server
+LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL") or None
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "llama3.1")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "local")
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() == "true"
+# Hedge after a provider's p95 latency, but never sooner than this and only once it has enough samples
+LLM_HEDGE_MIN_SECONDS = float(os.getenv("LLM_HEDGE_MIN_SECONDS", "2"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+# How long a provider is deprioritised after a 429/5xx/connection error
+LLM_PROVIDER_COOLDOWN_SECONDS = float(os.getenv("LLM_PROVIDER_COOLDOWN_SECONDS", "30"))
+# A provider whose median latency is this many times the fastest one's is tried after the others
+LLM_SLOW_PROVIDER_FACTOR = float(os.getenv("LLM_SLOW_PROVIDER_FACTOR", "2"))
+
+
+def _to_namespace(value):
+    if isinstance(value, dict):
+        return SimpleNamespace(**{k: _to_namespace(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return [_to_namespace(v) for v in value]
+    return value
+
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class ProviderError(Exception):
+    """
+    HTTP error from an OpenAICompatibleClient, shaped like the Groq SDK's APIStatusError.
+    """
+    def __init__(self, status_code, message, response=None):
+        super().__init__(f"Error code: {status_code} - {message}")
+        self.status_code = status_code
+        self.response = response
+
+
+class OpenAICompatibleClient:
+    """
+    Minimal client for any server exposing POST {base_url}/chat/completions
+    (vLLM, Ollama, llama.cpp, LM Studio, ...). Mirrors the slice of the Groq SDK
+    the backend uses: client.chat.completions.create(**kwargs), with stream=True support.
+    """
+    def __init__(self, base_url, api_key="local", timeout=120.0, http_client=None):
+        import httpx  # Only needed when a local endpoint is configured; keeps it out of start-up
+
+        self.base_url = base_url.rstrip("/")
+        self._http = http_client or httpx.Client(timeout=timeout, headers={"Authorization": f"Bearer {api_key}"})
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        url = f"{self.base_url}/chat/completions"
+        if kwargs.get("stream"):
+            return self._stream(url, kwargs)
+        response = self._http.post(url, json=kwargs)
+        if response.status_code >= 400:
+            raise ProviderError(response.status_code, response.text[:500], response)
+        return _to_namespace(response.json())
+
+    def _stream(self, url, kwargs):
+        # Open the connection eagerly so HTTP errors surface before the first chunk is consumed
+        request = self._http.build_request("POST", url, json=kwargs)
+        response = self._http.send(request, stream=True)
+        if response.status_code >= 400:
+            response.read()
+            response.close()
+            raise ProviderError(response.status_code, response.text[:500], response)
+
+        def chunks():
+            try:
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    yield _to_namespace(json.loads(data))
+            finally:
+                response.close()
+        return chunks()
+
+
+class LLMProvider:
+    """
+    One client + model pair, with rolling latency and error statistics used for routing.
+    A model of None means "use whatever model the caller asked for".
+    """
+    def __init__(self, name, client, model=None, window=100):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.requests = 0
+        self.errors = 0
+        self.cooldown_until = 0.0
+        self._latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)  # True for success
+        self._lock = threading.Lock()
+
+    def create(self, kwargs):
+        if self.model:
+            kwargs = {**kwargs, "model": self.model}
+        start = time.perf_counter()
+        try:
+            result = self.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            self._record(False, None, e)
+            raise
+        self._record(True, time.perf_counter() - start, None)
+        return result
+
+    def _record(self, ok, latency, error):
+        with self._lock:
+            self.requests += 1
+            self._outcomes.append(ok)
+            if ok:
+                self._latencies.append(latency)
+            else:
+                self.errors += 1
+                if is_failover_error(error):
+                    self.cooldown_until = time.time() + LLM_PROVIDER_COOLDOWN_SECONDS
+
+    def latency_samples(self) -> list:
+        """
+        Snapshot of the recent successful latencies, taken under the lock that guards _record.
+        """
+        with self._lock:
+            return list(self._latencies)
+
+    def latency_percentile(self, q):
+        return _percentile(self.latency_samples(), q)
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return 1.0 - sum(self._outcomes) / len(self._outcomes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests, errors = self.requests, self.errors
+        return {
+            "model": self.model,
+            "requests": requests,
+            "errors": errors,
+            "error_rate": self.error_rate(),
+            "p50_seconds": self.latency_percentile(0.5),
+            "p95_seconds": self.latency_percentile(0.95),
+            "cooling_down": self.cooldown_until > time.time(),
+        }
+
+
+def is_failover_error(error) -> bool:
+    """
+    Errors worth trying another provider for: throttling, server faults and connection problems.
+    Client errors such as 400/413 would fail the same way everywhere.
+    """
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # httpx errors can only occur once something has imported httpx
+        httpx = sys.modules.get("httpx")
+        if httpx is not None and isinstance(error, httpx.TransportError):
+            return True
+        return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    return status == 429 or status >= 500
+
+
+class ProviderRouter:
+    """
+    Sends each request to the best available provider (not cooling down, lowest
+    error rate, not markedly slower than the fastest, then configured order) and
+    fails over to the next on 429/5xx. It also hedges: if the first attempt is
+    still running after that provider's p95 latency, a duplicate goes to the next
+    available provider and whichever answers first wins. There is no hedge
+    without another provider, since a duplicate on the same one only doubles
+    the spend against its quota.
+    """
+    def __init__(self, providers, hedge=LLM_HEDGE, can_hedge=None, release_hedge=None):
+        self.providers = list(providers)
+        self.hedge = hedge
+        # Called with the request kwargs before hedging; returning False skips the hedge (e.g. no spare quota)
+        self.can_hedge = can_hedge or (lambda kwargs: True)
+        # Called once a hedged request is settled, to give back what can_hedge reserved
+        self.release_hedge = release_hedge or (lambda kwargs: None)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+    def ranked(self) -> list:
+        now = time.time()
+        medians = {p.name: p.latency_percentile(0.5) for p in self.providers}
+        known = [m for m in medians.values() if m is not None]
+        fastest = min(known) if known else None
+
+        def score(indexed):
+            index, provider = indexed
+            median = medians[provider.name]
+            slow = fastest is not None and median is not None and median > fastest * LLM_SLOW_PROVIDER_FACTOR
+            return (provider.cooldown_until > now, round(provider.error_rate(), 1), slow, index)
+        return [provider for _, provider in sorted(enumerate(self.providers), key=score)]
+
+    def _hedge_delay(self, provider):
+        samples = provider.latency_samples() if self.hedge else []
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(LLM_HEDGE_MIN_SECONDS, _percentile(samples, 0.95))
+
+    def create(self, kwargs):
+        return self.create_with_provider(kwargs)[0]
+
+    def create_with_provider(self, kwargs) -> tuple:
+        """
+        Like create, but returns (result, provider that answered), so callers can
+        tell an answer from a fallback model apart from one by the requested model.
+        """
+        candidates = self.ranked()
+        last_error = None
+        for position, provider in enumerate(candidates):
+            if position > 0:
+                self.failovers += 1
+            try:
+                if kwargs.get("stream"):
+                    return provider.create(kwargs), provider
+                return self._create_hedged(provider, candidates[position + 1:], kwargs)
+            except Exception as e:
+                if not is_failover_error(e):
+                    raise
+                last_error = e
+        raise last_error
+
+    def _create_hedged(self, provider, alternates, kwargs):
+        delay = self._hedge_delay(provider)
+        if delay is None or not alternates:
+            return provider.create(kwargs), provider
+
+        primary = self._pool.submit(provider.create, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        backup_provider = next((p for p in alternates if p.cooldown_until <= time.time()), None)
+        if done or backup_provider is None or not self.can_hedge(kwargs):
+            return primary.result(), provider
+
+        backup = self._pool.submit(backup_provider.create, kwargs)
+        self.hedged += 1
+        try:
+            pending = {primary, backup}
+            last_error = None
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self.hedge_wins += 1
+                            return future.result(), backup_provider
+                        return future.result(), provider
+                    last_error = future.exception()
+            raise last_error
+        finally:
+            # The caller reconciles one request's usage; the other attempt's reservation goes back
+            self.release_hedge(kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "providers": {p.name: p.stats() for p in self.providers},
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+        }
+
+
+def build_providers(groq_client) -> list:
+    """
+    Primary Groq client first (using the backend's model), then any fallback Groq
+    models, then the local OpenAI-compatible endpoint if configured.
+    """
+    providers = [LLMProvider("groq", groq_client)]
+    for model in LLM_FALLBACK_MODELS:
+        providers.append(LLMProvider(f"groq:{model}", groq_client, model))
+    if LOCAL_LLM_URL:
+        providers.append(LLMProvider(f"local:{LOCAL_LLM_MODEL}", OpenAICompatibleClient(LOCAL_LLM_URL, LOCAL_LLM_API_KEY), LOCAL_LLM_MODEL))
+    return providers
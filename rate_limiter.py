@@ -0,0 +1,200 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Groq 'on_demand' tier defaults; override per account in .env
+GROQ_TOKENS_PER_MINUTE = int(os.getenv("GROQ_TOKENS_PER_MINUTE", "6000"))
+GROQ_REQUESTS_PER_MINUTE = int(os.getenv("GROQ_REQUESTS_PER_MINUTE", "30"))
+# Optional SQLite file used to share one budget between processes (e.g. several Streamlit workers)
+RATE_LIMIT_STATE_PATH = os.getenv("RATE_LIMIT_STATE_PATH") or None
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value) -> float:
+    """
+    Parses provider reset/retry values such as "7.66s", "2m59.56s", "120ms" or "3" into seconds.
+    Returns None if the value can't be understood.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class RateLimiter:
+    """
+    Token-bucket scheduler for LLM calls that tracks both tokens-per-minute and
+    requests-per-minute. Callers block in acquire() only as long as the budget
+    requires, and the buckets are corrected from the provider's rate-limit headers
+    (remaining quota, reset times and Retry-After) after every response.
+
+    With state_path set, the bucket state lives in a SQLite file so several
+    processes on the same host draw from one budget.
+    """
+    def __init__(self, tokens_per_minute=GROQ_TOKENS_PER_MINUTE, requests_per_minute=GROQ_REQUESTS_PER_MINUTE, state_path=None, clock=time.time, sleep=time.sleep):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.state_path = state_path
+        self.clock = clock
+        self.sleep = sleep
+        self.total_wait = 0.0
+        self._lock = threading.Lock()
+        now = self.clock()
+        self._state = {
+            "tokens": float(tokens_per_minute),
+            "requests": float(requests_per_minute),
+            "updated_at": now,
+            "blocked_until": 0.0,
+        }
+        if self.state_path:
+            with sqlite3.connect(self.state_path, timeout=30) as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_state (id INTEGER PRIMARY KEY CHECK (id = 0), state TEXT NOT NULL)")
+                conn.execute("INSERT OR IGNORE INTO rate_limit_state (id, state) VALUES (0, ?)", (json.dumps(self._state),))
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Yields the mutable bucket state under an exclusive lock and persists it afterwards.
+        """
+        with self._lock:
+            if not self.state_path:
+                yield self._state
+                return
+
+            conn = sqlite3.connect(self.state_path, timeout=30, isolation_level=None)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                state = json.loads(conn.execute("SELECT state FROM rate_limit_state WHERE id = 0").fetchone()[0])
+                try:
+                    yield state
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("UPDATE rate_limit_state SET state = ? WHERE id = 0", (json.dumps(state),))
+                conn.execute("COMMIT")
+            finally:
+                conn.close()
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated_at"])
+        state["tokens"] = min(float(self.tokens_per_minute), state["tokens"] + elapsed * self.tokens_per_minute / 60.0)
+        state["requests"] = min(float(self.requests_per_minute), state["requests"] + elapsed * self.requests_per_minute / 60.0)
+        state["updated_at"] = now
+
+    def acquire(self, tokens: int) -> float:
+        """
+        Blocks until a request costing `tokens` fits in the budget, then reserves it.
+        Returns the number of seconds spent waiting.
+        """
+        # A single request larger than the whole bucket could never be admitted otherwise
+        tokens = min(float(tokens), float(self.tokens_per_minute))
+        waited = 0.0
+        while True:
+            with self._transaction() as state:
+                now = self.clock()
+                self._refill(state, now)
+                wait = state["blocked_until"] - now
+                if wait <= 0:
+                    token_deficit = tokens - state["tokens"]
+                    request_deficit = 1.0 - state["requests"]
+                    wait = max(
+                        token_deficit * 60.0 / self.tokens_per_minute,
+                        request_deficit * 60.0 / self.requests_per_minute,
+                    )
+                if wait <= 0:
+                    state["tokens"] -= tokens
+                    state["requests"] -= 1.0
+                    self.total_wait += waited
+                    return waited
+            self.sleep(wait)
+            waited += wait
+
+    def try_acquire(self, tokens: int) -> bool:
+        """
+        Reserves the budget only if it is available right now; never waits.
+        """
+        tokens = min(float(tokens), float(self.tokens_per_minute))
+        with self._transaction() as state:
+            now = self.clock()
+            self._refill(state, now)
+            if state["blocked_until"] > now or state["tokens"] < tokens or state["requests"] < 1.0:
+                return False
+            state["tokens"] -= tokens
+            state["requests"] -= 1.0
+            return True
+
+    def refund(self, tokens: float):
+        """
+        Returns over-reserved tokens (estimate minus actual usage) to the bucket.
+        A negative value charges an under-estimate.
+        """
+        with self._transaction() as state:
+            state["tokens"] = min(float(self.tokens_per_minute), state["tokens"] + tokens)
+
+    def update_from_headers(self, headers):
+        """
+        Reconciles the local buckets with the provider's view of the remaining quota.
+        Understands the x-ratelimit-* headers sent by Groq/OpenAI and Retry-After on 429s.
+        """
+        if not headers:
+            return
+        lowered = {str(k).lower(): v for k, v in headers.items()}
+
+        with self._transaction() as state:
+            now = self.clock()
+            self._refill(state, now)
+
+            remaining_tokens = lowered.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens is not None:
+                try:
+                    state["tokens"] = min(state["tokens"], float(remaining_tokens))
+                except ValueError:
+                    pass
+                if state["tokens"] <= 0:
+                    reset = parse_duration(lowered.get("x-ratelimit-reset-tokens"))
+                    if reset:
+                        state["blocked_until"] = max(state["blocked_until"], now + reset)
+
+            remaining_requests = lowered.get("x-ratelimit-remaining-requests")
+            if remaining_requests is not None:
+                try:
+                    exhausted = float(remaining_requests) <= 0
+                except ValueError:
+                    exhausted = False
+                if exhausted:
+                    reset = parse_duration(lowered.get("x-ratelimit-reset-requests"))
+                    if reset:
+                        state["blocked_until"] = max(state["blocked_until"], now + reset)
+
+            retry_after = parse_duration(lowered.get("retry-after"))
+            if retry_after is not None:
+                state["blocked_until"] = max(state["blocked_until"], now + retry_after)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Returns the process-wide rate limiter shared by every backend instance and Streamlit session.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(state_path=RATE_LIMIT_STATE_PATH)
+        return _rate_limiter
@@ -0,0 +1,221 @@
+"""
+Report rendering (PDF, HTML, Markdown) for structured call summaries.
+
+    python reports.py reports/ --output-dir rendered/ --formats pdf html md
+
+Style sheets are built once per process and rendered reports are cached by a
+hash of the summary content, so Streamlit reruns never rebuild the same file.
+The CLI re-renders every summary JSON in a directory (e.g. batch.py output)
+across a process pool, for regenerating a season's reports after a template change.
+"""
+import os
+import sys
+import json
+import html
+import argparse
+import threading
+from io import BytesIO
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+from cache import content_hash
+from instrumentation import span
+
+REPORT_CACHE_ENTRIES = int(os.getenv("REPORT_CACHE_ENTRIES", "64"))
+
+REPORT_TITLE = "Earnings Call Summary"
+KEYS_ORDER = [
+    "Management Tone",
+    "Executive One-Page Summary Paragraph", # Moved up for visibility
+    "Business Performance Overview",
+    "Revenue and Margin Discussion",
+    "Cost & Operational Commentary",
+    "Key Positives",
+    "Key Risks / Challenges",
+    "Forward Guidance & Outlook",
+    "Strategic / Growth Initiatives",
+    "Capital Allocation / Capex Commentary",
+    "Q&A Insights"
+]
+EXTENSIONS = {"pdf": "pdf", "html": "html", "md": "md"}
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: Helvetica, Arial, sans-serif; max-width: 800px; margin: 40px auto; color: #0e1117; }}
+h1 {{ text-align: center; }}
+h2 {{ font-size: 1.1rem; color: #003366; margin-bottom: 4px; }}
+p, li {{ font-size: 0.95rem; line-height: 1.4; }}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+{sections}
+</body>
+</html>
+"""
+
+_styles = None
+_styles_lock = threading.Lock()
+
+
+def get_styles():
+    """
+    Returns the report style sheet, built on first use and shared afterwards.
+    """
+    global _styles
+    with _styles_lock:
+        if _styles is None:
+            # ReportLab is imported on first render, keeping it out of app startup
+            from reportlab.lib import colors
+            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+            styles = getSampleStyleSheet()
+            styles.add(ParagraphStyle(name='SectionHeader', fontSize=12, leading=14, spaceAfter=6, textColor=colors.HexColor("#003366"), fontName='Helvetica-Bold'))
+            styles.add(ParagraphStyle(name='NormalCustom', fontSize=10, leading=12, spaceAfter=10))
+            _styles = styles
+        return _styles
+
+
+def _sections(summary_data):
+    for key in KEYS_ORDER:
+        if key in summary_data:
+            yield key, summary_data[key]
+
+
+def render_pdf(summary_data: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
+    styles = get_styles()
+
+    story = [Paragraph(REPORT_TITLE, styles['Title']), Spacer(1, 12)]
+    for title, content in _sections(summary_data):
+        story.append(Paragraph(escape(title), styles['SectionHeader']))
+        if isinstance(content, list):
+            for item in content:
+                story.append(Paragraph(f"• {escape(str(item))}", styles['NormalCustom']))
+        else:
+            story.append(Paragraph(escape(str(content)), styles['NormalCustom']))
+        story.append(Spacer(1, 12))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def render_html(summary_data: dict) -> bytes:
+    parts = []
+    for title, content in _sections(summary_data):
+        parts.append(f"<h2>{html.escape(title)}</h2>")
+        if isinstance(content, list):
+            parts.append("<ul>" + "".join(f"<li>{html.escape(str(item))}</li>" for item in content) + "</ul>")
+        else:
+            parts.append(f"<p>{html.escape(str(content))}</p>")
+    return HTML_TEMPLATE.format(title=REPORT_TITLE, sections="\n".join(parts)).encode("utf-8")
+
+
+def render_markdown(summary_data: dict) -> bytes:
+    parts = [f"# {REPORT_TITLE}"]
+    for title, content in _sections(summary_data):
+        parts.append(f"## {title}")
+        if isinstance(content, list):
+            parts.append("\n".join(f"- {item}" for item in content))
+        else:
+            parts.append(str(content))
+    return ("\n\n".join(parts) + "\n").encode("utf-8")
+
+
+RENDERERS = {"pdf": render_pdf, "html": render_html, "md": render_markdown}
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def render_report(summary_data: dict, fmt: str = "pdf") -> bytes:
+    """
+    Renders a summary in one of RENDERERS' formats, serving repeat requests for
+    the same content from a small in-process LRU.
+    """
+    key = (content_hash(json.dumps(summary_data, sort_keys=True).encode("utf-8")), fmt)
+    with _rendered_lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    with span("render_report", format=fmt) as record:
+        data = RENDERERS[fmt](summary_data)
+        record["bytes"] = len(data)
+
+    with _rendered_lock:
+        _rendered[key] = data
+        while len(_rendered) > REPORT_CACHE_ENTRIES:
+            _rendered.popitem(last=False)
+    return data
+
+
+def _render_files(job):
+    summary_data, stem, output_dir, formats = job
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{stem}.{EXTENSIONS[fmt]}")
+        with open(path, "wb") as f:
+            f.write(RENDERERS[fmt](summary_data))
+        paths.append(path)
+    return paths
+
+
+def render_reports(summaries, output_dir, formats=("pdf", "html", "md"), workers=None) -> list:
+    """
+    Writes every (stem, summary_data) pair in every format to output_dir using a
+    process pool (ReportLab rendering is CPU-bound). Returns the written paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(summary_data, stem, output_dir, tuple(formats)) for stem, summary_data in summaries]
+    if not jobs:
+        return []
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    if workers == 1:
+        results = map(_render_files, jobs)
+        return [path for paths in results for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [path for paths in pool.map(_render_files, jobs) for path in paths]
+
+
+def load_summaries(source_dir) -> list:
+    """
+    Reads (stem, summary_data) pairs from the *.json files in source_dir. Accepts
+    batch.py output (summary under a "summary" key) as well as bare summaries.
+    """
+    summaries = []
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith(".json") or name == "journal.jsonl":
+            continue
+        with open(os.path.join(source_dir, name), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        summary_data = data.get("summary", data) if isinstance(data, dict) else None
+        if isinstance(summary_data, dict):
+            summaries.append((os.path.splitext(name)[0], summary_data))
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render summary JSON files as PDF, HTML and Markdown reports.")
+    parser.add_argument("source_dir", help="Directory of summary JSON files (e.g. batch.py output)")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--formats", nargs="+", choices=sorted(RENDERERS), default=["pdf", "html", "md"])
+    parser.add_argument("--workers", type=int, default=None, help="Render processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    summaries = load_summaries(args.source_dir)
+    paths = render_reports(summaries, args.output_dir, args.formats, args.workers)
+    print(f"Rendered {len(paths)} files for {len(summaries)} summaries into {args.output_dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict, defaultdict
+
+from cache import content_hash
+from chunking import SPEAKER_TURN_PATTERN, count_tokens, split_speaker_turns, _split_oversized
+
+# Long speaker turns are split into passages of about this size
+RETRIEVAL_PASSAGE_TOKENS = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "300"))
+# Passages retrieved per question, and the hard cap on their combined size in the prompt
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "6"))
+RETRIEVAL_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_CONTEXT_TOKENS", "1800"))
+# Transcript indexes kept in memory (each is small next to the transcript itself)
+RETRIEVAL_INDEX_ENTRIES = int(os.getenv("RETRIEVAL_INDEX_ENTRIES", "32"))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r"[a-z0-9]+(?:[.'][a-z0-9]+)*")
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does for from had has have he her
+his how i if in into is it its just me more most my no not of on or our out over so some than that the their them
+then there these they this those to up us was we were what when where which while who why will with would you your
+""".split())
+
+
+def _stem(word: str) -> str:
+    # Just enough to match "margins"/"margin" and "companies"/"company"
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    return [_stem(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def split_passages(text: str, max_tokens: int = RETRIEVAL_PASSAGE_TOKENS) -> list:
+    """
+    Splits a transcript into speaker-turn passages. A turn longer than max_tokens
+    is split at sentence ends, and each piece keeps the speaker label so a
+    retrieved passage still says who was talking.
+    """
+    passages = []
+    for turn in split_speaker_turns(text):
+        if count_tokens(turn) <= max_tokens:
+            passages.append(turn)
+            continue
+        label = SPEAKER_TURN_PATTERN.match(turn)
+        pieces = _split_oversized(turn, max_tokens)
+        passages.append(pieces[0])
+        passages.extend(f"{label.group()} {piece}" if label else piece for piece in pieces[1:])
+    return passages
+
+
+class BM25Index:
+    """
+    In-memory inverted index over transcript passages with Okapi BM25 scoring.
+    Building it is a single pass over the text, and queries only touch the
+    postings of their own terms.
+    """
+    def __init__(self, passages, k1=BM25_K1, b=BM25_B):
+        self.passages = list(passages)
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(passage index, term frequency)]
+        self.lengths = []
+        for index, passage in enumerate(self.passages):
+            terms = tokenize(passage)
+            self.lengths.append(len(terms))
+            for term, frequency in Counter(terms).items():
+                self.postings[term].append((index, frequency))
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    @classmethod
+    def from_text(cls, text, max_tokens=RETRIEVAL_PASSAGE_TOKENS):
+        return cls(split_passages(text, max_tokens))
+
+    def _idf(self, term) -> float:
+        n = len(self.passages)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> list:
+        """
+        Returns up to k (score, passage index, passage) tuples, best first.
+        """
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for index, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.average_length or 1))
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+        return [(score, index, self.passages[index]) for index, score in best]
+
+
+def select_context(results, max_tokens: int = RETRIEVAL_CONTEXT_TOKENS) -> list:
+    """
+    Keeps the best-scoring passages that fit the token budget, returned in
+    transcript order so the model reads them as they were said.
+    """
+    chosen = []
+    used = 0
+    for score, index, passage in results:
+        tokens = count_tokens(passage)
+        if used + tokens > max_tokens:
+            continue
+        chosen.append((index, passage))
+        used += tokens
+    return [passage for _, passage in sorted(chosen)]
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_index(text: str) -> BM25Index:
+    """
+    Returns the index for a transcript, building it on first use and keeping the
+    most recently used ones in memory, keyed by a hash of the text.
+    """
+    key = content_hash(text.encode("utf-8"))
+    with _indexes_lock:
+        if key in _indexes:
+            _indexes.move_to_end(key)
+            return _indexes[key]
+    index = BM25Index.from_text(text)
+    with _indexes_lock:
+        _indexes[key] = index
+        while len(_indexes) > RETRIEVAL_INDEX_ENTRIES:
+            _indexes.popitem(last=False)
+    return index
@@ -0,0 +1,123 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is unavailable
+    fcntl = None
+
+from cache import content_hash
+from instrumentation import add
+
+# Optional directory of lock files that also coalesces identical work across
+# processes on this host (e.g. several Streamlit servers sharing one cache directory)
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR") or None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical work. The first do() call for a key runs fn;
+    callers arriving with the same key while it runs block until it finishes
+    and receive the same result (or exception). Nothing is kept afterwards:
+    results are reused through the caches fn itself reads and writes.
+
+    With lock_dir set, the running call also holds an exclusive file lock for
+    its key, so a process doing the same work waits for it and then (re-checking
+    the shared caches inside fn) normally finds the result already stored.
+    Coalesced calls are counted per key prefix (see stats()) and added to the
+    current span as "coalesced".
+    """
+    def __init__(self, lock_dir=SINGLEFLIGHT_LOCK_DIR):
+        self.lock_dir = lock_dir
+        if lock_dir and fcntl is None:
+            print("Warning: file locks are unavailable on this platform; coalescing within this process only.")
+            self.lock_dir = None
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"calls": 0, "coalesced": 0})
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Returns fn(*args, **kwargs), sharing one execution among concurrent callers with the same key.
+        """
+        kind = key.split(":", 1)[0]
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._counts[kind]["calls" if leader else "coalesced"] += 1
+
+        if not leader:
+            add("coalesced", 1)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with self.process_lock(key):
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @contextmanager
+    def process_lock(self, key):
+        """
+        Holds the cross-process lock for key (a no-op without lock_dir). Time spent
+        waiting for another process is added to the current span.
+        """
+        if not self.lock_dir:
+            yield
+            return
+        path = os.path.join(self.lock_dir, f"{content_hash(key.encode('utf-8'))[:32]}.lock")
+        with open(path, "a+b") as f:
+            start = time.perf_counter()
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            waited = time.perf_counter() - start
+            if waited > 0.01:
+                add("coalesced", 1)
+                add("lock_wait_seconds", waited)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        """
+        Per key prefix: calls that ran and calls that were coalesced into them.
+        """
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self._counts.items()}
+
+
+_singleflight = None
+_singleflight_lock = threading.Lock()
+
+
+def get_singleflight() -> SingleFlight:
+    """
+    Returns the process-wide single-flight group shared by every backend and Streamlit session.
+    """
+    global _singleflight
+    with _singleflight_lock:
+        if _singleflight is None:
+            _singleflight = SingleFlight()
+        return _singleflight
@@ -1,13 +1,49 @@
 import os
 import io
+import json
+import time
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cache
+import corpus
+from cache import ExtractionCache, SummaryCache
+from corpus import TranscriptCorpus
+from rate_limiter import RateLimiter, parse_duration
 from utils import clean_text, create_pdf_report
+import backend as backend_module
 from backend import CallMosaicBackend
+from chunking import count_tokens
 from reportlab.pdfgen import canvas
 import unittest
 from unittest.mock import MagicMock, patch
+from json_repair import SUMMARY_SCHEMA
 
-class TestCallMosaic(unittest.TestCase):
+# A summary with every key valid; only complete summaries are cached
+COMPLETE_SUMMARY = {key: ["item"] if expected is list else "text" for key, expected in SUMMARY_SCHEMA.items()}
+
+class IsolatedCacheTestCase(unittest.TestCase):
+    """
+    Points the process-wide extraction cache, summary cache and transcript corpus
+    at a throwaway directory, so every backend built in a test starts empty and
+    nothing is written to the repository's .cache.
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        cache_patch = patch.object(cache, "_extraction_cache", ExtractionCache(cache_dir=self.cache_dir.name))
+        cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+        summary_cache_patch = patch.object(cache, "_summary_cache", SummaryCache(db_path=os.path.join(self.cache_dir.name, "summaries.sqlite3")))
+        summary_cache_patch.start()
+        self.addCleanup(summary_cache_patch.stop)
+        corpus_patch = patch.object(corpus, "_corpus", TranscriptCorpus(db_path=os.path.join(self.cache_dir.name, "corpus.sqlite3")))
+        corpus_patch.start()
+        self.addCleanup(corpus_patch.stop)
+        self.addCleanup(self.cache_dir.cleanup)
+
+class TestCallMosaic(IsolatedCacheTestCase):
     def setUp(self):
+        super().setUp()
         # Create a dummy PDF in memory
         self.pdf_buffer = io.BytesIO()
         c = canvas.Canvas(self.pdf_buffer)
@@ -57,10 +93,10 @@ class TestCallMosaic(unittest.TestCase):
 
     @patch("backend.Groq")
     @patch("os.getenv")
-    @patch("backend.convert_from_bytes")
-    @patch("backend.pytesseract")
+    @patch("ocr.Image")
+    @patch("ocr.pytesseract")
     @patch("backend.fitz.open")
-    def test_backend_ocr_fallback(self, mock_fitz, mock_pytesseract, mock_pdf2image, mock_getenv, mock_groq):
+    def test_backend_ocr_fallback(self, mock_fitz, mock_pytesseract, mock_image, mock_getenv, mock_groq):
         # Test 2: Scanned PDF
         mock_getenv.return_value = "fake_key"
         backend = CallMosaicBackend()
@@ -71,16 +107,161 @@ class TestCallMosaic(unittest.TestCase):
         mock_page.get_text.return_value = "" # Empty text
         mock_doc.page_count = 1
         mock_doc.__iter__.return_value = [mock_page]
+        mock_doc.__getitem__.side_effect = [mock_page].__getitem__
         mock_fitz.return_value = mock_doc
         
         # Mock OCR result
-        mock_pdf2image.return_value = ["dummy_image"]
+        mock_page.get_pixmap.return_value.tobytes.return_value = b"dummy_png"
         mock_pytesseract.image_to_string.return_value = "Scanned Text Content Recovered Which Is Now Long Enough To Pass The Threshold Of Fifty Characters."
         
         result = backend.extract_text_from_pdf(self.pdf_buffer)
         self.assertIn("Scanned Text Content Recovered", result["text"])
         self.assertFalse(result.get("is_scanned", True)) # Should be False if OCR worked
 
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    @patch("ocr.ocr_png")
+    @patch("backend.fitz.open")
+    def test_backend_ocr_only_image_pages(self, mock_fitz, mock_ocr_png, mock_getenv, mock_groq):
+        # Text transcript with a scanned appendix page in the middle
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+
+        pages = [MagicMock(), MagicMock(), MagicMock()]
+        pages[0].get_text.return_value = "Operator: Good morning and welcome to the call. " * 3
+        pages[1].get_text.return_value = "  7 "
+        pages[2].get_text.return_value = "CFO: Gross margin expanded by 120 basis points. " * 3
+        mock_doc = MagicMock()
+        mock_doc.page_count = 3
+        mock_doc.__iter__.return_value = pages
+        mock_doc.__getitem__.side_effect = pages.__getitem__
+        mock_fitz.return_value = mock_doc
+        mock_ocr_png.return_value = ("Slide: Revenue bridge by segment and region", 0.5)
+
+        with patch("backend.ocr_available", return_value=True):
+            result = backend.extract_text_from_pdf(self.pdf_buffer)
+        mock_ocr_png.assert_called_once()
+        pages[1].get_pixmap.assert_called_once()
+        pages[0].get_pixmap.assert_not_called()
+        text = result["text"]
+        self.assertLess(text.index("Good morning"), text.index("Revenue bridge"))
+        self.assertLess(text.index("Revenue bridge"), text.index("Gross margin"))
+        self.assertEqual(result["ocr_page_count"], 1)
+        self.assertEqual([t["method"] for t in result["page_timings"]], ["text", "ocr", "text"])
+        self.assertGreaterEqual(result["page_timings"][1]["seconds"], 0.5)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_streaming_ingestion_bounds_rendered_pages(self, mock_getenv, mock_groq):
+        from concurrent.futures import Future
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        outstanding = []
+        peak = [0]
+
+        class LazyFuture(Future):
+            def result(self, timeout=None):
+                if not self.done():
+                    outstanding.remove(self)
+                    self.set_result(("Recovered slide text with enough characters to count as a page", 0.1))
+                return super().result(timeout)
+
+        class FakeOCR:
+            window = 2
+            def __init__(self, *args, **kwargs):
+                pass
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc_info):
+                pass
+            def submit(self, page):
+                future = LazyFuture()
+                outstanding.append(future)
+                peak[0] = max(peak[0], len(outstanding))
+                return future
+
+        pages = [MagicMock() for _ in range(12)]
+        for i, page in enumerate(pages):
+            page.get_text.return_value = "" if i % 3 else f"Operator: native text on page {i} of the call. " * 2
+        mock_doc = MagicMock()
+        mock_doc.page_count = len(pages)
+        mock_doc.__iter__.return_value = pages
+
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(self.pdf_buffer.getvalue())
+        self.addCleanup(os.remove, f.name)
+        with patch("backend.PageOCR", FakeOCR), patch("backend.ocr_available", return_value=True), \
+                patch("backend.fitz.open", return_value=mock_doc) as mock_open:
+            emitted = [(page["page"], page["method"]) for page in backend.iter_pages(f.name)]
+            # A path is memory-mapped rather than read into a bytes copy
+            self.assertIsInstance(mock_open.call_args.kwargs["stream"], memoryview)
+            result = backend.extract_text_from_pdf(f.name)
+
+        self.assertEqual([n for n, _ in emitted], list(range(1, 13)))
+        self.assertEqual([m for _, m in emitted].count("ocr"), 8)
+        self.assertLessEqual(peak[0], FakeOCR.window)
+        self.assertEqual(result["ocr_page_count"], 8)
+        mock_doc.close.assert_called()
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    @patch("backend.fitz.open")
+    def test_pipelined_summary_starts_map_before_extraction_ends(self, mock_fitz, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        events = []
+        pages = []
+        for n in range(12):
+            page = MagicMock()
+            words = ["cloud", "retail", "freight", "devices", "payments", "energy", "media", "travel", "pharma", "mining", "auto", "chips"]
+            body = "\n".join(
+                f"Jane Doe - Analyst {n}.{i}: Our {words[(n + i) % 12]} and {words[(n * 5 + i) % 12]} business grew {n + i}% on strong {words[i % 12]} demand. " * 3
+                for i in range(8)
+            )
+            def get_text(body=body, n=n):
+                events.append(("page", n))
+                return body
+            page.get_text.side_effect = get_text
+            pages.append(page)
+        mock_doc = MagicMock()
+        mock_doc.page_count = len(pages)
+        mock_doc.__iter__.return_value = pages
+        mock_fitz.return_value = mock_doc
+
+        def fake_llm(system_prompt, user_prompt, json_mode=True):
+            events.append(("llm", "json" if json_mode else "text"))
+            return json.dumps({**COMPLETE_SUMMARY, "Management Tone": "Optimistic"}) if json_mode else "section summary"
+        backend._call_llm = MagicMock(side_effect=fake_llm)
+
+        with patch("backend.SINGLE_PASS_TOKEN_LIMIT", 300), patch.object(backend, "_chunk_token_budget", return_value=400):
+            result = backend.summarize_pdf(self.pdf_buffer)
+
+        self.assertEqual(json.loads(result["summary"]), {**COMPLETE_SUMMARY, "Management Tone": "Optimistic"})
+        self.assertEqual(result["extraction"]["page_count"], 12)
+        first_map = events.index(("llm", "text"))
+        self.assertLess(first_map, events.index(("page", 11)))
+        self.assertEqual(events[-1], ("llm", "json"))
+        # The stored results are the same ones the two-step path would use
+        calls = backend._call_llm.call_count
+        self.assertEqual(backend.generate_summary(result["extraction"]["text"]), result["summary"])
+        self.assertEqual(backend.summarize_pdf(self.pdf_buffer), result)
+        self.assertEqual(backend._call_llm.call_count, calls)
+
+        # Extraction evicted: the PDF is parsed again, but its stored summary is found first, so nothing is mapped
+        backend.extraction_cache.clear()
+        with patch("backend.SINGLE_PASS_TOKEN_LIMIT", 300), patch.object(backend, "_chunk_token_budget", return_value=400):
+            again = backend.summarize_pdf(self.pdf_buffer)
+        self.assertEqual((again["summary"], again["extraction"]["text"]), (result["summary"], result["extraction"]["text"]))
+        self.assertEqual(backend._call_llm.call_count, calls)
+        self.assertEqual(events[-1], ("page", 11))
+
+    def test_ocr_needs_ocr_detection(self):
+        from ocr import needs_ocr
+        self.assertTrue(needs_ocr(""))
+        self.assertTrue(needs_ocr("12\n"))
+        self.assertTrue(needs_ocr("\ufffd\ufffd\ufffd" * 10 + "abc"))
+        self.assertFalse(needs_ocr("Revenue grew 12% year over year to $4.2 billion."))
+
 
     @patch("backend.Groq")
     @patch("os.getenv")
@@ -96,5 +277,1110 @@ class TestCallMosaic(unittest.TestCase):
         summary = backend.generate_summary("Some transcript text")
         self.assertIn("Positive", summary)
 
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    @patch("backend.fitz.open")
+    def test_backend_extraction_cache_hit(self, mock_fitz_open, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+
+        mock_doc = MagicMock()
+        mock_page = MagicMock()
+        mock_page.get_text.return_value = "Earnings Call Transcript. " * 10
+        mock_doc.page_count = 1
+        mock_doc.__iter__.return_value = [mock_page]
+        mock_fitz_open.return_value = mock_doc
+
+        first = backend.extract_text_from_pdf(self.pdf_buffer)
+        self.pdf_buffer.seek(0)
+        second = backend.extract_text_from_pdf(self.pdf_buffer)
+        self.assertEqual(first, second)
+        self.assertEqual(mock_fitz_open.call_count, 1)
+
+        # A fresh process (empty memory tier) is served from disk
+        fresh = ExtractionCache(cache_dir=self.cache_dir.name)
+        self.assertEqual(fresh.get(ExtractionCache.key_for(self.pdf_buffer.getvalue())), first)
+
+    def test_extraction_cache_eviction(self):
+        store = ExtractionCache(cache_dir=self.cache_dir.name, max_memory_entries=2, max_disk_bytes=250)
+        for i in range(4):
+            store.put(f"k{i}", {"text": "x" * 50, "page_count": i})
+        self.assertEqual(list(store._memory), ["k2", "k3"])
+        self.assertLessEqual(len(os.listdir(store.cache_dir)), 3)
+        self.assertIsNotNone(store.get("k3"))
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_backend_summary_cache(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+
+        mock_completion = MagicMock()
+        mock_completion.choices[0].message.content = json.dumps({**COMPLETE_SUMMARY, "Management Tone": "Positive"})
+        backend.client.chat.completions.create.return_value = mock_completion
+
+        first = backend.generate_summary("Some transcript text")
+        second = backend.generate_summary("Some transcript text")
+        self.assertEqual(first, second)
+        self.assertEqual(backend.client.chat.completions.create.call_count, 1)
+        self.assertEqual(backend.summary_cache.stats()["hits"], 1)
+
+        # Bypass forces a fresh call; a different model is a different key
+        backend.generate_summary("Some transcript text", use_cache=False)
+        backend.model = "other-model"
+        backend.generate_summary("Some transcript text")
+        self.assertEqual(backend.client.chat.completions.create.call_count, 3)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_fallback_model_answers_are_not_cached(self, mock_getenv, mock_groq):
+        from providers import LLMProvider, ProviderError, ProviderRouter
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        completion = MagicMock()
+        completion.choices[0].message.content = json.dumps(COMPLETE_SUMMARY)
+        completion.usage = None
+        backend.client.chat.completions.create.side_effect = ProviderError(429, "rate_limit_exceeded")
+        fallback_client = MagicMock()
+        fallback_client.chat.completions.create.return_value = completion
+        backend.router = ProviderRouter([LLMProvider("groq", backend.client), LLMProvider("groq:small", fallback_client, "small-model")], hedge=False)
+
+        with patch("backend.LLM_MAX_RATE_LIMIT_RETRIES", 0):
+            self.assertEqual(json.loads(backend.generate_summary("Some transcript text")), COMPLETE_SUMMARY)
+            backend.answer_question("Speaker: Revenue grew.", "How did revenue do?")
+        self.assertEqual(fallback_client.chat.completions.create.call_count, 2)
+        # Keyed by self.model, so neither answer from "small-model" was stored
+        self.assertEqual(backend.summary_cache.stats()["entries"], 0)
+        self.assertEqual(backend.summary_cache.stats("answer")["entries"], 0)
+
+        backend.client.chat.completions.create.side_effect = None
+        backend.client.chat.completions.create.return_value = completion
+        backend.router = ProviderRouter([LLMProvider("groq", backend.client)], hedge=False)
+        backend.generate_summary("Some transcript text")
+        self.assertEqual(backend.summary_cache.stats()["entries"], 1)
+
+    def test_summary_cache_ttl_and_size_eviction(self):
+        store = SummaryCache(db_path=os.path.join(self.cache_dir.name, "ttl.sqlite3"), ttl_seconds=60, max_entries=2)
+        for i in range(3):
+            store.put(f"k{i}", "{}", "model", "v1")
+        self.assertIsNone(store.get("k0"))
+        self.assertEqual(store.get("k2"), "{}")
+
+        store.ttl_seconds = -1  # Everything is now expired
+        self.assertIsNone(store.get("k2"))
+        self.assertEqual(store.stats(), {"hits": 1, "misses": 2, "entries": 1})
+
+    def test_summary_cache_kinds_have_separate_limits_and_counts(self):
+        store = SummaryCache(db_path=os.path.join(self.cache_dir.name, "kinds.sqlite3"), max_entries=2, max_memo_entries=3)
+        store.put("final", "{}", "model", "v1")
+        for i in range(10):
+            store.put(f"memo{i}", "chunk", "model", "v1", kind="memo")
+        self.assertEqual(store.get("final"), "{}")  # Not evicted by the memos
+        self.assertIsNone(store.get("memo0", kind="memo"))
+        self.assertEqual(store.get("memo9", kind="memo"), "chunk")
+        self.assertIsNone(store.get("memo9"))  # Kinds don't answer for each other
+        self.assertEqual(store.stats(), {"hits": 1, "misses": 1, "entries": 1})
+        self.assertEqual(store.stats("memo"), {"hits": 1, "misses": 1, "entries": 3})
+
+    @patch("backend.time.sleep")
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_backend_concurrent_map_keeps_order_and_retries(self, mock_getenv, mock_groq, mock_sleep):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        calls = {}
+        lock = threading.Lock()
+
+        def fake_llm(system_prompt, user_prompt, json_mode=True):
+            part = user_prompt.split("(Part ")[1].split("/")[0]
+            with lock:
+                calls[part] = calls.get(part, 0) + 1
+                attempt = calls[part]
+            if part == "2" and attempt == 1:
+                raise RuntimeError("transient")
+            time.sleep(0.05 * (5 - int(part)))  # Later parts finish first
+            return f"summary {part}"
+
+        with patch.object(backend, "_call_llm", side_effect=fake_llm):
+            results = backend._map_chunks([f"chunk {i}" for i in range(4)], "system")
+
+        self.assertEqual(results, ["summary 1", "summary 2", "summary 3", "summary 4"])
+        self.assertEqual(calls, {"1": 1, "2": 2, "3": 1, "4": 1})
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_backend_tree_reduce_bounds_every_request(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        prompts = []
+        lock = threading.Lock()
+
+        def fake_llm(system_prompt, user_prompt, json_mode=True):
+            with lock:
+                prompts.append(user_prompt)
+            return "Merged: revenue up 12%, margins stable, guidance reiterated for the year."
+
+        summaries = [f"Section {i}: " + "revenue grew in every region " * 20 for i in range(16)]
+        with patch.object(backend, "_reduce_token_budget", return_value=400), \
+                patch.object(backend, "_call_llm", side_effect=fake_llm):
+            reduced = backend._reduce_summaries(summaries, "system")
+
+        self.assertLess(len(reduced), len(summaries))
+        self.assertLessEqual(count_tokens("\n\n".join(reduced)), 400)
+        # No merge request carried more than the budget, and no summary was dropped
+        self.assertTrue(all(count_tokens(p) <= 400 + count_tokens(backend_module.REDUCE_PROMPT_TEMPLATE) for p in prompts))
+        self.assertEqual(sum(p.count("Section ") for p in prompts), 16)
+
+    @patch("backend.time.sleep")
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_failed_merges_pass_inputs_up_and_failed_chunks_are_not_stored(self, mock_getenv, mock_groq, mock_sleep):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+
+        summaries = [f"Section {i}: " + "revenue grew in every region " * 20 for i in range(4)]
+        with patch.object(backend, "_reduce_token_budget", return_value=400), \
+                patch.object(backend, "_call_llm", side_effect=RuntimeError("merge down")):
+            reduced = backend._reduce_summaries(summaries, "system")
+        # Every merge failed: nothing is lost or replaced by an error placeholder
+        self.assertEqual("\n\n".join(reduced), "\n\n".join(summaries))
+        self.assertEqual(backend.summary_cache.stats("memo")["entries"], 0)
+
+        transcript = "\n".join(f"Speaker {i % 3}: Remark {i} on segment trends and the outlook." for i in range(400))
+        calls = []
+
+        def fake_llm(system_prompt, user_prompt, json_mode=True):
+            calls.append(user_prompt)
+            if "(Part 1/" in user_prompt:
+                raise RuntimeError("chunk down")
+            return json.dumps(COMPLETE_SUMMARY) if json_mode else "chunk summary"
+
+        with patch.object(backend, "_call_llm", side_effect=fake_llm):
+            summary = backend.generate_summary(transcript)
+            self.assertEqual(json.loads(summary), COMPLETE_SUMMARY)
+            self.assertIn("[Error summarizing chunk 1:", calls[-1])
+            # Consolidated over a failed chunk: neither cached nor archived, so the next request retries
+            backend.archive_transcript("partial", {"text": transcript, "page_count": 1, "word_count": 1, "is_scanned": False, "ocr_page_count": 0}, summary)
+            self.assertIsNone(backend.corpus.get("partial")["summary"])
+            first_calls = len(calls)
+            backend.generate_summary(transcript)
+            self.assertGreater(len(calls), first_calls)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_revised_transcript_only_resummarizes_changed_chunks(self, mock_getenv, mock_groq):
+        from chunking import chunk_transcript
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        turns = [f"Speaker {i % 3}: Remark {i} on segment trends, pricing and the outlook for region {i}." for i in range(120)]
+        revised = list(turns)
+        revised[60] = "Speaker 0: Corrected remark on segment trends, pricing and the outlook for region sixty."
+        calls = []
+        lock = threading.Lock()
+
+        def fake_llm(system_prompt, user_prompt, json_mode=True):
+            with lock:
+                calls.append(user_prompt)
+            return "summary"
+
+        with patch.object(backend, "_call_llm", side_effect=fake_llm):
+            first_chunks = chunk_transcript("\n".join(turns), 300)
+            backend._map_chunks(first_chunks, "system")
+            first_calls = len(calls)
+            revised_chunks = chunk_transcript("\n".join(revised), 300)
+            backend._map_chunks(revised_chunks, "system")
+
+        self.assertEqual(first_calls, len(first_chunks))
+        changed = len(set(revised_chunks) - set(first_chunks))
+        self.assertLessEqual(changed, 2)
+        self.assertEqual(len(calls) - first_calls, changed)
+        self.assertTrue(any("Corrected remark" in prompt for prompt in calls[first_calls:]))
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_backend_summary_stream(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+
+        payload = json.dumps({**COMPLETE_SUMMARY, "Management Tone": "Optimistic", "Key Positives": ["Growth"]})
+        chunks = []
+        for i in range(0, len(payload), 7):
+            chunk = MagicMock()
+            chunk.choices[0].delta.content = payload[i:i + 7]
+            chunk.x_groq = None
+            chunk.usage = None
+            chunks.append(chunk)
+        backend.client.chat.completions.create.return_value = iter(chunks)
+
+        deltas = list(backend.generate_summary_stream("Some transcript text"))
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual("".join(deltas), payload)
+        self.assertTrue(backend.client.chat.completions.create.call_args.kwargs["stream"])
+        # The completed stream is cached like a blocking call
+        self.assertEqual(list(backend.generate_summary_stream("Some transcript text")), [payload])
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def test_emits_keys_as_they_complete(self):
+        from json_stream import IncrementalJSONParser
+        text = '```json\n{"Management Tone": "Cautious, but \\"stable\\" {ish}", "Key Risks / Challenges": ["FX, rates", {"a": [1, 2]}], "Q&A Insights": "None"}\n```'
+        parser = IncrementalJSONParser()
+        seen = []
+        for i, ch in enumerate(text):
+            for key, value in parser.feed(ch):
+                seen.append((key, i))
+
+        self.assertEqual([key for key, _ in seen], ["Management Tone", "Key Risks / Challenges", "Q&A Insights"])
+        # The first key is available long before the stream finishes
+        self.assertLess(seen[0][1], text.index("Key Risks"))
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.getvalue(), text)
+
+class TestJSONRepair(IsolatedCacheTestCase):
+    def test_repairs_fences_commas_truncation_and_key_spelling(self):
+        from json_repair import SUMMARY_SCHEMA, parse_lenient, repair_summary
+        self.assertEqual(parse_lenient('```json\n{"a": [1, 2,], "b": "x",}\n```'), {"a": [1, 2], "b": "x"})
+        self.assertEqual(parse_lenient('{"a": ["x", "y'), {"a": ["x", "y"]})
+        self.assertEqual(parse_lenient('{"a": "x", "b": '), {"a": "x"})
+        self.assertIsNone(parse_lenient("Error generating summary: Error code: 429 - {'error': 'rate limit'}"))
+
+        full = {key: ["item"] if expected is list else "text" for key, expected in SUMMARY_SCHEMA.items()}
+        raw = json.dumps({"management_tone": "Cautious", "Key Risks/Challenges": "- FX\n- Supply", "Q&A Insight": "Demand"})
+        raw = raw[:-1] + ', "Key Positives": ["Margins'
+        data, problems = repair_summary(raw)
+        self.assertEqual(data["Management Tone"], "Cautious")
+        self.assertEqual(data["Key Risks / Challenges"], ["FX", "Supply"])
+        self.assertEqual(data["Q&A Insights"], "Demand")
+        self.assertEqual(data["Key Positives"], ["Margins"])
+        self.assertEqual(len(problems), len(full) - 4)
+        self.assertEqual(repair_summary(json.dumps(full)), (full, []))
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_finalize_summary_requests_only_the_broken_keys(self, mock_getenv, mock_groq):
+        from json_repair import SUMMARY_SCHEMA
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        backend.summary_cache = MagicMock()
+        transcript = "CFO: Capex will be about $2 billion, and we repurchased shares. " + "Operator: next question. " * 400
+        summary = {key: ["item"] if expected is list else "text" for key, expected in SUMMARY_SCHEMA.items()}
+        del summary["Capital Allocation / Capex Commentary"]
+        summary["Key Positives"] = 42
+        backend._call_llm = MagicMock(return_value='{"Capital Allocation / Capex Commentary": "Capex about $2B.", "Key Positives": ["Buybacks"], "Management Tone": "Ignored"}')
+
+        data = json.loads(backend.finalize_summary(transcript, json.dumps(summary)))
+        self.assertEqual(list(data), list(SUMMARY_SCHEMA))
+        self.assertEqual(data["Capital Allocation / Capex Commentary"], "Capex about $2B.")
+        self.assertEqual(data["Key Positives"], ["Buybacks"])
+        self.assertEqual(data["Management Tone"], "text")
+        self.assertEqual(backend._call_llm.call_count, 1)
+        prompt = backend._call_llm.call_args[0][1]
+        self.assertIn('"Key Positives"', prompt)
+        self.assertNotIn('"Q&A Insights"', prompt)
+        self.assertLess(count_tokens(prompt), count_tokens(transcript) / 2)
+        backend.summary_cache.put.assert_called_once()
+
+        # Error messages hold no summary: returned unchanged, without a request
+        self.assertEqual(backend.finalize_summary(transcript, "Error generating summary: boom"), "Error generating summary: boom")
+        self.assertEqual(backend._call_llm.call_count, 1)
+
+        # Too many broken keys for one repair request: returned as is but never cached
+        backend.summary_cache.put.reset_mock()
+        partial = json.loads(backend.finalize_summary(transcript, json.dumps({"Management Tone": "Neutral"})))
+        self.assertEqual(partial, {"Management Tone": "Neutral"})
+        self.assertEqual(backend._call_llm.call_count, 1)
+        backend.summary_cache.put.assert_not_called()
+
+class TestNormalize(unittest.TestCase):
+    def test_clean_text_single_pass_matches_old_rules(self):
+        self.assertEqual(clean_text("a\n12\nb"), "a\nb")
+        self.assertEqual(clean_text("a\n\nPage 1 of 2\n\n\nb"), "a\n\nb")
+        self.assertEqual(clean_text("see Page 3 of 9  here\t now"), "see here now")
+        self.assertEqual(clean_text("Revenue of 12 million"), "Revenue of 12 million")
+
+    def test_repeated_headers_and_boilerplate_are_removed(self):
+        from normalize import normalize_pages
+        segments = ["Cloud", "Devices", "Services", "Retail", "Energy"]
+        topics = ["working capital", "the order book", "pricing", "freight costs", "hiring", "FX", "inventory", "capex"]
+        pages = []
+        for n in range(1, 6):
+            segment = segments[n - 1]
+            pages.append(
+                f"ACME Corp Q3 2024 Earnings Call\nCorrected Transcript {n}/5\n"
+                f"CEO: Revenue in {segment} grew {10 + n}% to ${n}.2 billion.\n"
+                f"Analyst - Big Bank: How are margins trending in {segment}?\n"
+                + "".join(f"CFO: In {segment}, {topic} was {'better' if i % 2 else 'worse'} than planned.\n" for i, topic in enumerate(topics)) +
+                f"Copyright 2024 Transcript Vendor. All rights reserved.\nPage {n} of 5\n"
+            )
+        pages[0] = ("Operator: Good morning. At this time all participants are in a\nlisten-only mode. "
+                    "To ask a question, please press star one on your telephone keypad.\n") + pages[0]
+        pages[1] += "CFO: Today's remarks include forward-looking statements that are subject to risks.\n"
+
+        result = normalize_pages(pages)
+        text = result["text"]
+        self.assertNotIn("ACME Corp Q3 2024 Earnings Call", text)
+        self.assertNotIn("Corrected Transcript", text)
+        self.assertNotIn("listen-only", text)
+        self.assertNotIn("press star one", text)
+        self.assertNotIn("forward-looking", text)
+        self.assertNotIn("All rights reserved", text)
+        self.assertIn("Operator: Good morning.", text)
+        for n in range(1, 6):
+            self.assertIn(f"grew {10 + n}%", text)
+        self.assertEqual(text.count("How are margins trending in"), 5)
+        self.assertGreater(result["tokens_saved"], 0)
+        self.assertEqual(result["repeated_lines_removed"], 20)
+
+    def test_boilerplate_removal_keeps_decimals_and_speaker_labels(self):
+        from normalize import remove_boilerplate
+        text, removed = remove_boilerplate("CFO: Gross margin was 40.1% this quarter. Results could differ materially.\nCEO: Thanks.")
+        self.assertEqual(removed, 1)
+        self.assertIn("Gross margin was 40.1% this quarter.", text)
+        text, _ = remove_boilerplate("Operator: This call is being recorded. Hello.")
+        self.assertEqual(text, "Operator: Hello.")
+        # A turn that is nothing but boilerplate goes away with its label
+        text, _ = remove_boilerplate("CEO: Hi.\nCFO: Forward-looking statements apply.\nCEO: Bye.")
+        self.assertEqual(text, "CEO: Hi.\nCEO: Bye.")
+
+    def test_unpunctuated_boilerplate_stops_at_the_line_and_speaker_turn(self):
+        from normalize import remove_boilerplate
+        text, _ = remove_boilerplate(
+            "Operator: Our first question comes from John Smith. Please press star one\n"
+            "John Smith - Analyst, Big Bank: Can you talk about margins in China\n"
+            "Jane Doe - CFO: China margin rose 140 bps to 32.5%.\n"
+        )
+        self.assertEqual(text, (
+            "Operator: Our first question comes from John Smith.\n"
+            "John Smith - Analyst, Big Bank: Can you talk about margins in China\n"
+            "Jane Doe - CFO: China margin rose 140 bps to 32.5%.\n"
+        ))
+        text, _ = remove_boilerplate(
+            "John Roe - CEO: Revenue was $4.2 billion\n"
+            "Operator: Today's call may contain forward-looking statements\n"
+            "Jane Doe - CFO: Margins were 32.5%\n"
+        )
+        self.assertEqual(text, "John Roe - CEO: Revenue was $4.2 billion\nJane Doe - CFO: Margins were 32.5%\n")
+
+    def test_speaker_lines_are_not_treated_as_running_headers(self):
+        from normalize import find_repeated_lines
+        segments = ["Cloud", "Devices", "Services", "Retail", "Energy", "Health"]
+        pages = [
+            f"Sarah Chen - Chief Executive Officer\n{segment} demand held up well.\nCallMosaic Inc Q3 2024 Earnings Call\nPage {n} of 6"
+            for n, segment in enumerate(segments, 1)
+        ]
+        pages[0] = "Operations were steady this quarter\n" + pages[0]
+        pages[1] = "Operations were steady this quarter\n" + pages[1]
+        pages[2] = "Operations were steady this quarter\n" + pages[2]
+        repeated = find_repeated_lines(pages)
+        self.assertEqual(repeated, {"callmosaic inc q# # earnings call", "page # of #"})
+
+class TestInstrumentation(IsolatedCacheTestCase):
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_spans_nest_across_map_threads_and_export_metrics(self, mock_getenv, mock_groq):
+        from instrumentation import Tracer
+        import instrumentation
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        backend.rate_limiter = RateLimiter(tokens_per_minute=1_000_000, requests_per_minute=1000)
+        backend.summary_cache = MagicMock()
+        backend.summary_cache.get.return_value = None  # No memoized chunk summaries
+        completion = MagicMock()
+        completion.choices[0].message.content = "section summary"
+        completion.usage.prompt_tokens = 120
+        completion.usage.completion_tokens = 30
+        completion.usage.total_tokens = 150
+        backend.client.chat.completions.create.return_value = completion
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tracer = Tracer(trace_path=os.path.join(tmp, "trace.jsonl"))
+            with patch.object(instrumentation, "_tracer", tracer), tracer.collect() as spans:
+                with tracer.span("analysis") as root:
+                    backend._map_chunks(["chunk one", "chunk two", "chunk three"], "system")
+            with open(tracer.trace_path) as f:
+                records = [json.loads(line) for line in f]
+
+        calls = [r for r in spans if r["name"] == "llm_call"]
+        self.assertEqual(len(calls), 3)
+        self.assertTrue(all(r["parent_id"] == root["span_id"] and r["trace_id"] == root["trace_id"] for r in calls))
+        self.assertEqual(calls[0]["prompt_tokens"], 120)
+        self.assertEqual(len(records), 4)
+        metrics = tracer.metrics_text()
+        self.assertIn('callmosaic_stage_seconds_count{stage="llm_call"} 3', metrics)
+        self.assertIn('callmosaic_prompt_tokens_total{stage="llm_call"} 360', metrics)
+
+    def test_worker_threads_add_to_the_parent_span_without_losing_updates(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from instrumentation import Tracer, add
+        import instrumentation
+        tracer = Tracer()
+
+        def work():
+            for _ in range(2000):
+                add("retries", 1)
+
+        with patch.object(instrumentation, "_tracer", tracer), tracer.span("map") as record:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                for future in [pool.submit(Tracer.wrap(work)) for _ in range(8)]:
+                    future.result()
+        self.assertEqual(record["retries"], 16000)
+
+class TestJobManager(unittest.TestCase):
+    def test_round_robin_across_owners_progress_and_failures(self):
+        from jobs import JobManager, report_progress, report_output
+        manager = JobManager(max_workers=1)
+        gate = threading.Event()
+        order = []
+
+        def work(name):
+            report_progress("Working", 1, 2)
+            report_output(name)
+            order.append(name)
+            return name.upper()
+
+        blocker = manager.submit(gate.wait, owner="a")
+        while manager.get(blocker)["status"] != "running":
+            time.sleep(0.01)
+        ids = [manager.submit(work, f"a{i}", owner="a") for i in range(1, 4)]
+        ids.append(manager.submit(work, "b1", owner="b"))
+        duplicate = manager.submit(work, "b2", owner="b", key="same")
+        self.assertEqual(manager.submit(work, "b3", owner="b", key="same"), duplicate)
+        # A new session (e.g. after a browser refresh) finds the in-flight job by its key
+        self.assertEqual(manager.find("same"), duplicate)
+        failing = manager.submit(lambda: 1 / 0, owner="c")
+        self.assertEqual(manager.get(ids[0])["status"], "queued")
+        gate.set()
+
+        for job_id in [blocker, failing, duplicate] + ids:
+            manager.wait(job_id, timeout=5)
+        # Owners take turns instead of a's backlog running first
+        self.assertEqual(order, ["a1", "b1", "a2", "b2", "a3"])
+        job = manager.get(ids[0])
+        self.assertEqual((job["status"], job["result"], job["output"], job["done"], job["total"]), ("done", "A1", "a1", 1, 2))
+        self.assertEqual(manager.get(failing)["status"], "failed")
+        self.assertIn("ZeroDivisionError", manager.get(failing)["error"])
+        self.assertIsNone(manager.find("same"))
+
+class TestReports(unittest.TestCase):
+    def test_render_formats_cache_and_batch_export(self):
+        import reports
+        summary = {"Management Tone": "Optimistic", "Key Positives": ["R&D <up>", "Margins"], "Q&A Insights": "Demand held."}
+        with patch.object(reports, "render_pdf", wraps=reports.render_pdf) as render_pdf, \
+                patch.dict(reports.RENDERERS, {"pdf": render_pdf}):
+            first = reports.render_report(summary, "pdf")
+            self.assertEqual(reports.render_report(dict(summary), "pdf"), first)
+            self.assertEqual(render_pdf.call_count, 1)
+        self.assertTrue(first.startswith(b"%PDF"))
+        self.assertIn(b"<li>R&amp;D &lt;up&gt;</li>", reports.render_report(summary, "html"))
+        self.assertIn(b"- Margins", reports.render_report(summary, "md"))
+        self.assertIs(reports.get_styles(), reports.get_styles())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "acme.json"), "w") as f:
+                json.dump({"source": "acme.pdf", "summary": summary}, f)
+            with open(os.path.join(tmp, "beta.json"), "w") as f:
+                json.dump(summary, f)
+            out = os.path.join(tmp, "out")
+            paths = reports.render_reports(reports.load_summaries(tmp), out, workers=2)
+            self.assertEqual(sorted(os.listdir(out)), ["acme.html", "acme.md", "acme.pdf", "beta.html", "beta.md", "beta.pdf"])
+            self.assertEqual(len(paths), 6)
+
+class TestStartup(IsolatedCacheTestCase):
+    def test_heavy_dependencies_load_on_first_use(self):
+        import subprocess, sys
+        script = (
+            "import sys, json, backend, utils, reports\n"
+            "before = [m for m in ('fitz', 'groq', 'httpx', 'pytesseract', 'reportlab') if m in sys.modules]\n"
+            "backend.TranscriptExtractor()  # What batch workers build: no API key or client needed\n"
+            "extractor = 'groq' in sys.modules\n"
+            "backend.fitz, backend.Groq\n"
+            "print(json.dumps([before, extractor, 'fitz' in sys.modules, 'groq' in sys.modules]))"
+        )
+        root = os.path.dirname(os.path.abspath(__file__))
+        env = {key: value for key, value in os.environ.items() if key != "GROQ_API_KEY"}
+        with tempfile.TemporaryDirectory() as cache_dir:
+            env["CALLMOSAIC_CACHE_DIR"] = cache_dir
+            output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=root, env=env).stdout
+        self.assertEqual(json.loads(output.strip().splitlines()[-1]), [[], False, True, True])
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_shared_backend_is_built_once(self, mock_getenv, mock_groq):
+        import backend as backend_module
+        mock_getenv.return_value = "fake_key"
+        with patch.object(backend_module, "_backend", None):
+            first = backend_module.get_backend()
+            self.assertIs(backend_module.get_backend(), first)
+        self.assertEqual(mock_groq.call_count, 1)
+
+class TestChunking(unittest.TestCase):
+    def setUp(self):
+        remarks = "\n".join(
+            f"Jane Doe - Chief Financial Officer: Revenue in segment {i} grew 12% to $1.{i} billion. Margins were stable."
+            for i in range(30)
+        )
+        qa = "\n".join(
+            f"Analyst {chr(65 + i)}, Big Bank: What about pricing in region {i}?\nJohn Roe: Pricing held up well there."
+            for i in range(20)
+        )
+        self.transcript = f"Operator: Welcome to the call.\n{remarks}\nOperator: We will now begin the question-and-answer session.\n{qa}"
+
+    def test_estimator_counts_numbers_and_punctuation(self):
+        from chunking import estimate_tokens
+        self.assertEqual(estimate_tokens("Revenue grew 12%"), 4)
+        self.assertEqual(estimate_tokens("$1,234,567"), 6)
+        self.assertGreater(estimate_tokens("internationalization"), 1)
+
+    def test_chunks_follow_speaker_turns_and_qa_boundary(self):
+        from chunking import chunk_transcript, count_tokens, split_speaker_turns
+        turns = split_speaker_turns(self.transcript)
+        chunks = chunk_transcript(self.transcript, max_tokens=300)
+
+        self.assertGreater(len(chunks), 2)
+        for chunk in chunks:
+            self.assertLessEqual(count_tokens(chunk), 300)
+            # Every chunk is a run of whole speaker turns
+            for turn in split_speaker_turns(chunk):
+                self.assertIn(turn, turns)
+        qa_chunks = [i for i, chunk in enumerate(chunks) if "question-and-answer" in chunk]
+        self.assertEqual(len(qa_chunks), 1)
+        self.assertTrue(chunks[qa_chunks[0]].startswith("Operator: We will now begin"))
+
+    def test_oversized_turn_is_split_under_budget(self):
+        from chunking import chunk_transcript, count_tokens
+        text = "CEO: " + "We delivered record results this quarter. " * 200
+        chunks = chunk_transcript(text, max_tokens=250)
+        self.assertTrue(all(count_tokens(chunk) <= 250 for chunk in chunks))
+        self.assertEqual(" ".join(" ".join(chunks).split()), " ".join(text.split()))
+
+    def test_content_defined_chunks_cost_few_extra_map_calls(self):
+        from benchmarks.synthetic import generate_transcript
+        from chunking import chunk_transcript
+        for pages in (20, 60):
+            text = generate_transcript(pages)
+            packed = len(chunk_transcript(text, content_defined=False))
+            content_defined = len(chunk_transcript(text, content_defined=True))
+            self.assertLessEqual(content_defined, packed * 1.15 + 1)
+
+class TestRetrieval(IsolatedCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        turns = [f"Analyst {i}, Big Bank: How is demand in region {i} trending?\nJohn Roe - CEO: Region {i} was steady with pricing flat." for i in range(20)]
+        turns.insert(7, "Jane Doe - CFO: China margins compressed 150 basis points on higher input costs, and we expect recovery in the second half.")
+        self.text = "\n".join(turns)
+
+    def test_bm25_ranks_relevant_turn_first(self):
+        from retrieval import BM25Index, select_context
+        index = BM25Index.from_text(self.text)
+        results = index.search("What did they say about China margins?", k=3)
+        self.assertIn("China margins compressed", results[0][2])
+        self.assertGreater(results[0][0], results[1][0] if len(results) > 1 else 0)
+        self.assertEqual(index.search("cryptocurrency"), [])
+        self.assertEqual(len(select_context(results, max_tokens=40)), 1)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_answer_question_sends_only_top_passages(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        with tempfile.TemporaryDirectory() as tmp:
+            backend.summary_cache = SummaryCache(db_path=os.path.join(tmp, "qa.sqlite3"))
+            with patch.object(backend, "_call_llm", return_value="Down 150bp.") as call:
+                first = backend.answer_question(self.text, "China margins?", top_k=2)
+                second = backend.answer_question(self.text, "China margins?", top_k=2)
+        self.assertEqual(first["answer"], "Down 150bp.")
+        self.assertEqual(second["answer"], "Down 150bp.")
+        self.assertEqual(call.call_count, 1)
+        prompt = call.call_args.args[1]
+        self.assertIn("China margins compressed", prompt)
+        self.assertLess(count_tokens(prompt), count_tokens(self.text) / 4)
+
+class TestFinancialFacts(IsolatedCacheTestCase):
+    def test_extracts_categorized_figures_with_context(self):
+        from financial_facts import extract_facts, format_fact_table
+        text = (
+            "Jane Doe - CFO: Revenue grew 12% year over year to $4.2 billion. Gross margin was 42.5%, up 150 basis points. "
+            "Diluted EPS was $1.23. For the full year we now expect revenue between $16.8 billion and $17.2 billion. "
+            "The weather was nice.\nJohn Roe - CEO: China declined 3%."
+        )
+        facts = extract_facts(text)
+        self.assertEqual([f["category"] for f in facts], ["Revenue", "Margin", "EPS", "Guidance", "Growth"])
+        self.assertEqual(facts[3]["figures"], ["between $16.8 billion and $17.2 billion"])
+        self.assertEqual(facts[1]["figures"], ["42.5%", "150 basis points"])
+        self.assertEqual(facts[4]["speaker"], "John Roe - CEO")
+        table = format_fact_table(facts)
+        self.assertTrue(table.startswith("- [Guidance] Jane Doe - CFO: For the full year"))
+        self.assertNotIn("weather", table)
+        self.assertEqual(len(format_fact_table(facts, max_tokens=40).splitlines()), 1)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_consolidation_prompt_carries_fact_table(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        text = "Jane Doe - CFO: We expect capex of $2.5 billion next year.\n" + "\n".join(f"John Roe: Point {i} about strategy." for i in range(5))
+        with patch.object(backend, "_map_chunks", return_value=["summary without numbers"]):
+            prompt = backend._consolidation_prompt(text, "system")
+        self.assertIn("- [Guidance] Jane Doe - CFO: We expect capex of $2.5 billion next year.", prompt)
+
+class TestComparison(IsolatedCacheTestCase):
+    def test_compact_documents_keep_prompt_size_flat(self):
+        from comparison import COMPARE_CONTEXT_TOKENS, format_documents
+        summary = {
+            "Management Tone": "Optimistic",
+            "Forward Guidance & Outlook": "Raised full-year revenue guidance to $4.1 billion to $4.3 billion. " * 20,
+            "Key Positives": [f"Positive {i} " * 30 for i in range(8)],
+            "Q&A Insights": "Not carried into the comparison.",
+        }
+        few = format_documents([(f"Q{i}", summary) for i in range(2)])
+        many = format_documents([(f"Q{i}", summary) for i in range(12)])
+        self.assertNotIn("Q&A Insights", few)
+        self.assertEqual(json.loads(few.splitlines()[0])["Document"], "Q0")
+        self.assertEqual(len(json.loads(few.splitlines()[0])["Key Positives"]), 3)
+        self.assertLessEqual(count_tokens(many), COMPARE_CONTEXT_TOKENS * 1.2)
+        self.assertLess(count_tokens(many), count_tokens(few) * 3)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_compare_transcripts_summarizes_in_parallel_then_compares_once(self, mock_getenv, mock_groq):
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        backend.summary_cache = MagicMock()
+        backend.summary_cache.get.return_value = None
+        texts = {b"a": "Alpha call transcript text", b"b": "Beta call transcript text", b"c": ""}
+        backend.extract_text_from_pdf = lambda buffer, on_page=None: {"text": texts[bytes(buffer)], "page_count": 1, "word_count": 4, "is_scanned": False}
+        backend.generate_summary = MagicMock(side_effect=lambda text, use_cache=True: json.dumps({"Management Tone": text.split()[0]}))
+        backend._call_llm = MagicMock(return_value='{"Overall Comparison": "Beta was more cautious."}')
+
+        result = backend.compare_transcripts([io.BytesIO(b"a"), io.BytesIO(b"b"), io.BytesIO(b"c")], ["Q1", "Q2", "Q3"])
+        self.assertEqual(json.loads(result["comparison"]), {"Overall Comparison": "Beta was more cautious."})
+        self.assertEqual([d["label"] for d in result["documents"]], ["Q1", "Q2", "Q3"])
+        self.assertEqual(result["documents"][0]["summary"], {"Management Tone": "Alpha"})
+        self.assertIsNotNone(result["documents"][2]["error"])
+        self.assertEqual(backend._call_llm.call_count, 1)
+        prompt = backend._call_llm.call_args[0][1]
+        self.assertIn('"Document": "Q2", "Management Tone": "Beta"', prompt)
+        self.assertNotIn("call transcript text", prompt)
+
+        # A missing label would otherwise silently drop a transcript
+        with self.assertRaises(ValueError):
+            backend.compare_transcripts([io.BytesIO(b"a"), io.BytesIO(b"b")], ["Q1"])
+        self.assertEqual(backend._call_llm.call_count, 1)
+
+class TestSingleFlight(IsolatedCacheTestCase):
+    def test_concurrent_identical_calls_share_one_run(self):
+        from singleflight import SingleFlight
+        flight = SingleFlight(lock_dir=None)
+        release = threading.Event()
+        runs = []
+
+        def work(value):
+            runs.append(value)
+            release.wait(5)
+            return {"value": value}
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do("summary:abc", work, 1))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flight.stats().get("summary", {}).get("coalesced", 0) < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(runs, [1])
+        self.assertEqual(results, [{"value": 1}] * 5)
+        self.assertEqual(flight.stats()["summary"], {"calls": 1, "coalesced": 4})
+
+        # Errors reach every waiter, and nothing is remembered once the call finishes
+        with self.assertRaises(ZeroDivisionError):
+            flight.do("summary:abc", lambda: 1 / 0)
+        self.assertEqual(flight.do("summary:abc", work, 2), {"value": 2})
+
+    def test_file_lock_serializes_processes(self):
+        from singleflight import SingleFlight
+        with tempfile.TemporaryDirectory() as tmp:
+            # Two groups stand in for two processes sharing a lock directory and a cache
+            first, second = SingleFlight(lock_dir=tmp), SingleFlight(lock_dir=tmp)
+            shared_cache = {}
+            started, release = threading.Event(), threading.Event()
+            computed = []
+
+            def compute(name):
+                if "doc" in shared_cache:
+                    return shared_cache["doc"]
+                started.set()
+                release.wait(5)
+                computed.append(name)
+                shared_cache["doc"] = name
+                return name
+
+            leader = threading.Thread(target=first.do, args=("extract:doc", compute, "first"))
+            leader.start()
+            started.wait(5)
+            result = []
+            follower = threading.Thread(target=lambda: result.append(second.do("extract:doc", compute, "second")))
+            follower.start()
+            time.sleep(0.1)
+            self.assertEqual(result, [])  # Still waiting on the other group's lock
+            release.set()
+            leader.join()
+            follower.join()
+            self.assertEqual(computed, ["first"])
+            self.assertEqual(result, ["first"])
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_backend_coalesces_concurrent_summaries(self, mock_getenv, mock_groq):
+        from singleflight import SingleFlight
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        backend.singleflight = SingleFlight(lock_dir=None)
+        backend.summary_cache = MagicMock()
+        backend.summary_cache.get.return_value = None
+        release = threading.Event()
+
+        summary = json.dumps({**COMPLETE_SUMMARY, "Management Tone": "Neutral"})
+
+        def slow_summary(text, use_cache=True):
+            release.wait(5)
+            return summary
+        backend._generate_summary = MagicMock(side_effect=slow_summary)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(backend.generate_summary("same transcript"))) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        while backend.singleflight.stats().get("summary", {}).get("coalesced", 0) < 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(backend._generate_summary.call_count, 1)
+        self.assertEqual(results, [summary] * 3)
+        backend.summary_cache.put.assert_called_once()
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_forced_refresh_does_not_join_a_cached_run(self, mock_getenv, mock_groq):
+        from singleflight import SingleFlight
+        mock_getenv.return_value = "fake_key"
+        backend = CallMosaicBackend()
+        backend.singleflight = SingleFlight(lock_dir=None)
+        backend.summary_cache = MagicMock()
+        backend.summary_cache.get.return_value = None
+        release = threading.Event()
+        runs = []
+
+        def slow_summary(text, use_cache=True):
+            runs.append(use_cache)
+            release.wait(5)
+            return '{"Management Tone": "Neutral"}'
+        backend._generate_summary = MagicMock(side_effect=slow_summary)
+
+        cached_run = threading.Thread(target=backend.generate_summary, args=("same transcript",))
+        cached_run.start()
+        while not runs:
+            time.sleep(0.01)
+        forced_run = threading.Thread(target=backend.generate_summary, args=("same transcript", False))
+        forced_run.start()
+        while len(runs) < 2:
+            time.sleep(0.01)
+        release.set()
+        cached_run.join()
+        forced_run.join()
+        self.assertEqual(sorted(runs), [False, True])
+        self.assertEqual(backend.singleflight.stats()["summary"], {"calls": 2, "coalesced": 0})
+
+class TestCorpus(IsolatedCacheTestCase):
+    def test_search_across_quarters_with_filters(self):
+        from corpus import guess_metadata
+        self.assertEqual(
+            guess_metadata("Acme Corp (NYSE: ACME) (GAAP)\nThird Quarter Fiscal 2024 Earnings Call\nOctober 24, 2024"),
+            {"ticker": "ACME", "quarter": "Q3 2024", "call_date": "2024-10-24"},
+        )
+        self.assertEqual(guess_metadata("No title block", "ACME_Q1_25.pdf")["quarter"], "Q1 2025")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = TranscriptCorpus(db_path=os.path.join(tmp, "corpus.sqlite3"))
+            for quarter, region in (("Q1 2024", "China"), ("Q2 2024", "Europe")):
+                text = f"Jane Doe - CFO: Gross margins in {region} expanded on pricing.\nJohn Roe - Analyst: What about Q&A on capex?"
+                store.add(quarter, {"text": text, "page_count": 1}, ticker="acme", quarter=quarter, call_date=quarter[-4:] + "-0" + quarter[1])
+            store.add("other", {"text": "Sam Poe - CEO: Margins in China were stable.", "page_count": 1}, ticker="BETA")
+
+            hits = store.search("china margin*")
+            self.assertEqual({hit["doc_id"] for hit in hits}, {"Q1 2024", "other"})
+            self.assertIn("**China**", hits[0]["snippet"])
+            self.assertEqual([hit["doc_id"] for hit in store.search("margins", ticker="ACME", quarter="Q2 2024")], ["Q2 2024"])
+            self.assertEqual(len(store.search('"Q&A" capex OR')), 0)  # Operators in user input are plain words
+            self.assertEqual([t["doc_id"] for t in store.list_transcripts("ACME")], ["Q2 2024", "Q1 2024"])
+
+            # Re-adding keeps metadata and the passage index
+            store.add("other", {"text": "Sam Poe - CEO: Margins in China were stable.", "page_count": 1}, summary="{}")
+            self.assertEqual(store.get("other")["ticker"], "BETA")
+            self.assertEqual(store.stats()["passages"], 5)
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_reopening_an_archived_transcript_skips_extraction_and_llm(self, mock_getenv, mock_groq):
+        from json_repair import SUMMARY_SCHEMA
+        mock_getenv.return_value = "fake_key"
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = CallMosaicBackend()
+            backend.extraction_cache = ExtractionCache(cache_dir=tmp)
+            backend.summary_cache = SummaryCache(db_path=os.path.join(tmp, "s.sqlite3"))
+            backend.corpus = TranscriptCorpus(db_path=os.path.join(tmp, "corpus.sqlite3"))
+            pdf = b"%PDF-1.4 archived transcript"
+            extraction = {"text": "Jane Doe - CFO: Revenue grew 12%.", "page_count": 3, "word_count": 6, "is_scanned": False, "ocr_page_count": 0}
+            summary = json.dumps({key: ["x"] if expected is list else "x" for key, expected in SUMMARY_SCHEMA.items()})
+            backend.archive_transcript(cache.content_hash(pdf), extraction, summary, ticker="ACME", quarter="Q3 2024")
+            backend.archive_transcript("failed", extraction, "Error generating summary: boom")
+            self.assertIsNone(backend.corpus.get("failed")["summary"])
+
+            # Caches expired or cleared: the corpus still answers both lookups
+            backend.extraction_cache.clear()
+            backend.summary_cache.clear()
+            backend._call_llm = MagicMock()
+            with patch("backend._lazy") as lazy:
+                result = backend.extract_text_from_pdf(io.BytesIO(pdf))
+                self.assertEqual(result["page_count"], 3)
+                self.assertEqual(backend.generate_summary(result["text"]), summary)
+                self.assertEqual("".join(backend.generate_summary_stream(result["text"])), summary)
+            lazy.assert_not_called()
+            backend._call_llm.assert_not_called()
+
+    @patch("backend.Groq")
+    @patch("os.getenv")
+    def test_archived_extraction_from_another_version_is_redone(self, mock_getenv, mock_groq):
+        import sqlite3
+        mock_getenv.return_value = "fake_key"
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = CallMosaicBackend()
+            backend.extraction_cache = ExtractionCache(cache_dir=tmp)
+            backend.corpus = TranscriptCorpus(db_path=os.path.join(tmp, "corpus.sqlite3"))
+            pdf = b"%PDF-1.4 archived transcript"
+            # Rows stored before ocr_page_count existed still load
+            stale = {"text": "Jane Doe - CFO: Revenue grew 12%.", "page_count": 3, "word_count": 6, "is_scanned": False}
+            backend.archive_transcript(cache.content_hash(pdf), stale)
+            self.assertEqual(backend.extract_text_from_pdf(io.BytesIO(pdf))["page_count"], 3)
+
+            backend.extraction_cache.clear()
+            with sqlite3.connect(backend.corpus.db_path) as conn:
+                conn.execute("UPDATE transcripts SET extraction_version = 'old'")
+            fresh = {**stale, "page_count": 4, "ocr_page_count": 0}
+            backend._extract = MagicMock(return_value=fresh)
+            backend._iter_buffer_pages = MagicMock(return_value=iter([]))
+            self.assertEqual(backend.extract_text_from_pdf(io.BytesIO(pdf))["page_count"], 4)
+            backend._extract.assert_called_once()
+
+class TestBatch(unittest.TestCase):
+    def test_load_inputs_expands_directories_and_manifests(self):
+        from batch import load_inputs
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "q3"))
+            for name in ["q3/a.pdf", "q3/b.PDF", "q3/notes.txt", "c.pdf"]:
+                open(os.path.join(tmp, name), "wb").close()
+            with open(os.path.join(tmp, "manifest.txt"), "w") as f:
+                f.write("# earnings season\nc.pdf\nq3/a.pdf\n")
+
+            paths = load_inputs([os.path.join(tmp, "q3"), os.path.join(tmp, "manifest.txt")])
+            names = [os.path.relpath(p, tmp) for p in paths]
+            self.assertEqual(names, [os.path.join("q3", "a.pdf"), os.path.join("q3", "b.PDF"), "c.pdf"])
+
+    def test_journal_resumes_completed_files(self):
+        from batch import JobJournal
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "journal.jsonl")
+            journal = JobJournal(path)
+            journal.record({"sha256": "aaa", "path": "a.pdf", "status": "done"})
+            journal.record({"sha256": "bbb", "path": "b.pdf", "status": "failed"})
+            with open(path, "a") as f:
+                f.write('{"sha256": "ccc", "sta')  # Torn write from a crash
+
+            resumed = JobJournal(path)
+            self.assertTrue(resumed.is_done("aaa"))
+            self.assertFalse(resumed.is_done("bbb"))
+            self.assertFalse(resumed.is_done("ccc"))
+
+class TestBenchmarkHarness(IsolatedCacheTestCase):
+    def test_synthetic_pdfs_and_mock_server_end_to_end(self):
+        import fitz
+        from benchmarks.synthetic import generate_pdf
+        from benchmarks.mock_llm_server import MockLLMServer, SUMMARY_KEYS
+
+        text_pdf = generate_pdf(3, seed=1)
+        scanned_pdf = generate_pdf(2, scanned=True, seed=1)
+        self.assertEqual(fitz.open(stream=text_pdf, filetype="pdf").page_count, 3)
+        scanned = fitz.open(stream=scanned_pdf, filetype="pdf")
+        self.assertEqual(scanned.page_count, 2)
+        self.assertEqual(scanned[0].get_text().strip(), "")
+
+        with tempfile.TemporaryDirectory() as tmp, MockLLMServer(latency=0.0) as server:
+            with patch.dict(os.environ, {"GROQ_API_KEY": "bench", "GROQ_BASE_URL": server.url}):
+                backend = CallMosaicBackend()
+            backend.extraction_cache = ExtractionCache(cache_dir=tmp)
+            backend.summary_cache = SummaryCache(db_path=os.path.join(tmp, "s.sqlite3"))
+            backend.rate_limiter = RateLimiter(tokens_per_minute=10_000_000, requests_per_minute=100_000)
+
+            extraction = backend.extract_text_from_pdf(io.BytesIO(text_pdf))
+            self.assertIn("question-and-answer", extraction["text"])
+            summary = json.loads(backend.generate_summary(extraction["text"]))
+            self.assertEqual(list(summary), SUMMARY_KEYS)
+            streamed = "".join(backend.generate_summary_stream(extraction["text"], use_cache=False))
+            self.assertEqual(json.loads(streamed), summary)
+            self.assertGreater(backend.tokens_used, 0)
+
+class TestProviders(unittest.TestCase):
+    def _provider(self, name, behaviour):
+        from providers import LLMProvider
+        client = MagicMock()
+        client.chat.completions.create.side_effect = behaviour
+        return LLMProvider(name, client, model=name)
+
+    def test_failover_on_rate_limit(self):
+        from providers import ProviderRouter, ProviderError
+        throttled = self._provider("primary", ProviderError(429, "rate_limit_exceeded"))
+        backup = self._provider("backup", lambda **kwargs: f"answer from {kwargs['model']}")
+        router = ProviderRouter([throttled, backup], hedge=False)
+
+        self.assertEqual(router.create({"model": "x", "messages": []}), "answer from backup")
+        self.assertEqual(router.failovers, 1)
+        # The throttled provider cools down and is tried last from now on
+        self.assertEqual([p.name for p in router.ranked()], ["backup", "primary"])
+        self.assertIs(router.create_with_provider({"model": "x", "messages": []})[1], backup)
+
+        bad_request = self._provider("strict", ProviderError(400, "bad request"))
+        with self.assertRaises(ProviderError):
+            ProviderRouter([bad_request, backup], hedge=False).create({"messages": []})
+
+    def test_hedge_after_p95_takes_first_answer(self):
+        import providers
+        from providers import ProviderRouter
+        def slow(**kwargs):
+            time.sleep(1.0)
+            return "slow"
+        primary = self._provider("primary", slow)
+        backup = self._provider("backup", lambda **kwargs: "fast")
+        primary._latencies.extend([0.05] * 10)
+
+        released = []
+        router = ProviderRouter([primary, backup], hedge=True, release_hedge=released.append)
+        with patch.object(providers, "LLM_HEDGE_MIN_SECONDS", 0.05):
+            start = time.monotonic()
+            self.assertEqual(router.create({"messages": []}), "fast")
+        self.assertLess(time.monotonic() - start, 0.9)
+        self.assertEqual((router.hedged, router.hedge_wins), (1, 1))
+        self.assertEqual(released, [{"messages": []}])  # The hedge's reservation is given back
+
+        # A lone provider is never hedged against itself
+        primary = self._provider("primary", slow)
+        primary._latencies.extend([0.05] * 10)
+        router = ProviderRouter([primary], hedge=True, can_hedge=MagicMock(return_value=True))
+        with patch.object(providers, "LLM_HEDGE_MIN_SECONDS", 0.05):
+            self.assertEqual(router.create({"messages": []}), "slow")
+        self.assertEqual(router.hedged, 0)
+        router.can_hedge.assert_not_called()
+        self.assertEqual(primary.requests, 1)
+
+        # No spare quota means no hedge
+        primary = self._provider("primary", slow)
+        primary._latencies.extend([0.05] * 10)
+        router = ProviderRouter([primary, self._provider("backup", lambda **kwargs: "fast")], hedge=True, can_hedge=lambda kwargs: False)
+        with patch.object(providers, "LLM_HEDGE_MIN_SECONDS", 0.05):
+            self.assertEqual(router.create({"messages": []}), "slow")
+        self.assertEqual(router.hedged, 0)
+
+    def test_openai_compatible_client_against_mock_server(self):
+        from providers import OpenAICompatibleClient
+        from benchmarks.mock_llm_server import MockLLMServer
+        with MockLLMServer() as server:
+            client = OpenAICompatibleClient(f"{server.url}/v1")
+            completion = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}])
+            self.assertIn("Mock section summary", completion.choices[0].message.content)
+            self.assertGreater(completion.usage.total_tokens, 0)
+
+            stream = client.chat.completions.create(model="m", messages=[{"role": "user", "content": "hi"}], response_format={"type": "json_object"}, stream=True)
+            text = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+            self.assertIn("Management Tone", json.loads(text))
+
+class StubGroqHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible endpoint: answers 429 with Retry-After first, then succeeds.
+    """
+    responses = []
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, headers = self.responses.pop(0)
+        body = {"error": {"message": "rate_limit_exceeded", "type": "tokens"}}
+        if status == 200:
+            body = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": "stub",
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": '{"Management Tone": "Neutral"}'}}],
+                "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50},
+            }
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestRateLimiter(IsolatedCacheTestCase):
+    def test_parse_duration(self):
+        self.assertAlmostEqual(parse_duration("2m59.56s"), 179.56)
+        self.assertAlmostEqual(parse_duration("120ms"), 0.12)
+        self.assertEqual(parse_duration("3"), 3.0)
+        self.assertIsNone(parse_duration("soon"))
+
+    def test_token_bucket_waits_only_for_deficit(self):
+        now = [1000.0]
+        sleeps = []
+        def fake_sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+        limiter = RateLimiter(tokens_per_minute=6000, requests_per_minute=100, clock=lambda: now[0], sleep=fake_sleep)
+
+        self.assertEqual(limiter.acquire(4000), 0.0)
+        # 2000 left; 3000 more needs 1000 tokens of refill at 100 tokens/s
+        self.assertAlmostEqual(limiter.acquire(3000), 10.0)
+        limiter.update_from_headers({"retry-after": "7"})
+        self.assertAlmostEqual(limiter.acquire(1), 7.0)
+
+    def test_shared_state_across_instances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "limits.sqlite3")
+            now = [1000.0]
+            sleeps = []
+            first = RateLimiter(tokens_per_minute=600, requests_per_minute=100, state_path=path, clock=lambda: now[0], sleep=sleeps.append)
+            second = RateLimiter(tokens_per_minute=600, requests_per_minute=100, state_path=path, clock=lambda: now[0], sleep=lambda s: now.__setitem__(0, now[0] + s))
+            first.acquire(600)
+            self.assertAlmostEqual(second.acquire(60), 6.0)
+
+    @patch.dict(os.environ, {"GROQ_API_KEY": "fake_key"})
+    def test_backend_honours_retry_after_from_stub_server(self):
+        StubGroqHandler.responses = [
+            (429, {"retry-after": "0.2"}),
+            (200, {"x-ratelimit-remaining-tokens": "5950", "x-ratelimit-reset-tokens": "0.5s"}),
+        ]
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroqHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+
+        with patch.dict(os.environ, {"GROQ_BASE_URL": f"http://127.0.0.1:{server.server_port}"}):
+            backend = CallMosaicBackend()
+        backend.rate_limiter = RateLimiter(tokens_per_minute=6000, requests_per_minute=30)
+
+        start = time.monotonic()
+        content = backend._call_llm("system", "user", json_mode=True)
+        self.assertEqual(json.loads(content), {"Management Tone": "Neutral"})
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertGreater(backend.rate_limiter.total_wait, 0.1)
+        self.assertEqual(StubGroqHandler.responses, [])
+
 if __name__ == '__main__':
     unittest.main()